@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+行分类器微基准测试
+用仓库中约12万行的 dist/cn_domains.txt 生成 dnsmasq、Clash payload 和普通文本三种格式，
+对比逐行 .upper()/re.split/回退正则 的旧写法与共享行分类器的每秒处理行数，
+以及 is_valid_domain 每次调用都编译正则的旧实现与当前实现的调用速度
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import extract_domains
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# 以下为改写前的逐行处理逻辑，仅作对照
+LEGACY_DOMAIN_PATTERN = re.compile(r'^[a-zA-Z0-9][-a-zA-Z0-9]*(\.[a-zA-Z0-9][-a-zA-Z0-9]*)+$')
+LEGACY_CLASH_DOMAIN_PATTERN = re.compile(r'.*(?:DOMAIN|domain)[,:][ ]*([a-zA-Z0-9][-a-zA-Z0-9]*(\.[a-zA-Z0-9][-a-zA-Z0-9]*)+)')
+LEGACY_CLASH_DOMAIN_SUFFIX_PATTERN = re.compile(r'.*(?:DOMAIN-SUFFIX|domain-suffix)[,:][ ]*([a-zA-Z0-9][-a-zA-Z0-9]*(\.[a-zA-Z0-9][-a-zA-Z0-9]*)+)')
+LEGACY_DNSMASQ_PATTERN = re.compile(r'server=/([^/]+)/')
+LEGACY_URL_PATTERN = re.compile(r'https?://([a-zA-Z0-9][-a-zA-Z0-9]*(\.[a-zA-Z0-9][-a-zA-Z0-9]*)+)')
+
+def legacy_is_valid_domain(domain: str) -> bool:
+    if not domain or len(domain) > 253:
+        return False
+    if domain.startswith('.'):
+        domain = domain[1:]
+    if domain.endswith('.'):
+        return False
+    if '..' in domain:
+        return False
+    ipv4_pattern = re.compile(r'^(\d{1,3}\.){3}\d{1,3}$')
+    if ipv4_pattern.match(domain):
+        return False
+    return bool(LEGACY_DOMAIN_PATTERN.match(domain))
+
+def legacy_dnsmasq(content: str) -> set:
+    domains = set()
+    for line in content.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            match = LEGACY_DNSMASQ_PATTERN.match(line)
+            if match:
+                domain = match.group(1)
+                if legacy_is_valid_domain(domain):
+                    domains.add(domain)
+            elif legacy_is_valid_domain(line):
+                domains.add(line)
+    return domains
+
+def legacy_yaml_lines(content: str) -> set:
+    domains = set()
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if 'DOMAIN,' in line.upper() or 'DOMAIN:' in line.upper():
+            parts = re.split(r'[,:]', line, 1)
+            if len(parts) > 1 and legacy_is_valid_domain(parts[1].strip()):
+                domains.add(parts[1].strip())
+        elif 'DOMAIN-SUFFIX,' in line.upper() or 'DOMAIN-SUFFIX:' in line.upper():
+            parts = re.split(r'[,:]', line, 1)
+            if len(parts) > 1 and legacy_is_valid_domain(parts[1].strip()):
+                domains.add(parts[1].strip())
+        elif legacy_is_valid_domain(line):
+            domains.add(line)
+        elif line.startswith('.') and legacy_is_valid_domain(line[1:]):
+            domains.add(line[1:])
+        else:
+            for pattern in (LEGACY_CLASH_DOMAIN_PATTERN, LEGACY_CLASH_DOMAIN_SUFFIX_PATTERN, LEGACY_URL_PATTERN):
+                match = pattern.match(line) if pattern is not LEGACY_URL_PATTERN else pattern.search(line)
+                if match:
+                    if legacy_is_valid_domain(match.group(1)):
+                        domains.add(match.group(1))
+                    break
+    return domains
+
+def legacy_plain(content: str) -> set:
+    domains = set()
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if legacy_is_valid_domain(line):
+            domains.add(line)
+        else:
+            match = LEGACY_URL_PATTERN.search(line)
+            if match and legacy_is_valid_domain(match.group(1)):
+                domains.add(match.group(1))
+    return domains
+
+def best_of(func, arg, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='行分类器微基准测试')
+    parser.add_argument('--list', default=os.path.join(ROOT, 'dist', 'cn_domains.txt'), help='用于生成测试数据的域名列表')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with open(args.list, 'r', encoding='utf-8') as f:
+        domains = [line.strip() for line in f if line.strip()]
+    count = len(domains)
+    samples = [
+        ('dnsmasq', ''.join(f"server=/{d}/114.114.114.114\n" for d in domains), legacy_dnsmasq, extract_domains.extract_domains_from_dnsmasq),
+        ('Clash payload', ''.join(f"  - DOMAIN-SUFFIX,{d}\n" for d in domains), legacy_yaml_lines, lambda c: set(extract_domains._iter_classified(c, 'yaml'))),
+        ('普通文本', ''.join(f"{d}\n" for d in domains), legacy_plain, extract_domains.extract_domains_from_plain_text),
+    ]
+
+    print(f"测试数据: {args.list}（{count} 行）")
+    for name, content, legacy, current in samples:
+        legacy_time = best_of(legacy, content, args.repeat)
+        current_time = best_of(current, content, args.repeat)
+        same = legacy(content) == current(content)
+        print(f"{name}: 旧写法 {count / legacy_time:>10,.0f} 行/秒，分类器 {count / current_time:>10,.0f} 行/秒，"
+              f"提速 {legacy_time / current_time:.1f}x，结果{'一致' if same else '不一致'}")
+
+    legacy_time = best_of(lambda items: [legacy_is_valid_domain(d) for d in items], domains, args.repeat)
+    current_time = best_of(lambda items: [extract_domains.is_valid_domain(d) for d in items], domains, args.repeat)
+    print(f"is_valid_domain: 旧实现 {count / legacy_time:>10,.0f} 次/秒，当前 {count / current_time:>10,.0f} 次/秒，"
+          f"提速 {legacy_time / current_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+紧凑域名集合基准测试
+读取 dist/ 中的国内外域名列表，比较普通 set 和 DomainSet 保存同样域名时的内存占用（tracemalloc），
+以及成员判断、并集、差集和冲突处理（resolve_conflicts 的输入为 set 或 DomainSet）的耗时
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+import tracemalloc
+from typing import Any, Callable, List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import conflicts
+from domain_set import DomainSet
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+def read_domains(path: str) -> List[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def allocated(build: Callable[[], Any]) -> Tuple[Any, int]:
+    """返回 (构造结果, 结果本身占用的字节数)"""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+def best_of(func: Callable[[], Any], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='紧凑域名集合基准测试')
+    parser.add_argument('--dist', default=os.path.join(ROOT, 'dist'), help='包含 cn_domains.txt 和 foreign_domains.txt 的目录')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    cn_list = read_domains(os.path.join(args.dist, 'cn_domains.txt'))
+    foreign_list = read_domains(os.path.join(args.dist, 'foreign_domains.txt'))
+    print(f"国内域名 {len(cn_list)} 个，国外域名 {len(foreign_list)} 个")
+
+    # 复制字符串，避免与列表共享对象而低估 set 的占用
+    cn_set, set_bytes = allocated(lambda: {domain.encode().decode() for domain in cn_list})
+    cn_compact, compact_bytes = allocated(lambda: DomainSet(cn_list))
+    print(f"内存: set {set_bytes / 1024 / 1024:.1f} MB，DomainSet {compact_bytes / 1024 / 1024:.1f} MB"
+          f"（{set_bytes / max(compact_bytes, 1):.1f} 倍）")
+
+    probes = cn_list[::10] + [f"missing{i}.example" for i in range(len(cn_list) // 10)]
+    for name, domains in (('set', cn_set), ('DomainSet', cn_compact)):
+        seconds = best_of(lambda: [probe in domains for probe in probes], args.repeat)
+        print(f"{name:<10} 成员判断 {seconds / len(probes) * 1e9:7.0f} ns/次")
+
+    foreign_set, foreign_compact = set(foreign_list), DomainSet(foreign_list)
+    for name, a, b in (('set', cn_set, foreign_set), ('DomainSet', cn_compact, foreign_compact)):
+        union = best_of(lambda: a | b, args.repeat)
+        difference = best_of(lambda: a - b, args.repeat)
+        resolve = best_of(lambda: conflicts.resolve_conflicts(a, b), args.repeat)
+        print(f"{name:<10} 并集 {union:.3f} 秒，差集 {difference:.3f} 秒，冲突处理 {resolve:.3f} 秒")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+产物输出基准测试
+用 dist/ 中的国内外域名列表，对比“各生成函数分别排序、在内存中拼接完整文件后一次写出”的旧写法
+与 artifact_writer 单次排序、逐行流式写出的耗时和 Python 堆内存峰值（tracemalloc）
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import artifact_writer
+import conflicts
+import upstream_format
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CN_DNS = ["https://doh.pub/dns-query", "https://dns.alidns.com/dns-query"]
+FOREIGN_DNS = ["https://1.1.1.1/dns-query", "https://8.8.8.8/dns-query"]
+
+def legacy_mode_config(text, domains, upstreams, default_upstreams, other_upstreams, custom_domain_dns, overrides, grouped, max_line_length):
+    """旧写法：排序后先拼出全部行，再 '\\n'.join 成完整字符串"""
+    pruned = artifact_writer.find_pruned(domains, upstreams, other_upstreams, custom_domain_dns, overrides)
+    config_lines = [f"# AdGuard Home DNS 分流配置 - {text.title}", f"# {text.description}", "", *default_upstreams, ""]
+    for domain, dns_list in sorted(custom_domain_dns.items()):
+        config_lines.append(f"[/{domain}/]{' '.join(dns_list)}")
+    kept = [domain for domain in sorted(domains) if domain not in pruned]
+    config_lines.extend(artifact_writer.rule_lines(kept, ' '.join(upstreams), grouped, max_line_length))
+    config_lines.extend(artifact_writer.rule_lines(sorted(overrides), ' '.join(other_upstreams), grouped, max_line_length))
+    config = '\n'.join(config_lines)
+    if grouped:
+        flat = legacy_mode_config(text, domains, upstreams, default_upstreams, other_upstreams, custom_domain_dns, overrides, False, max_line_length)
+        assert upstream_format.routes_equivalent(flat.split('\n'), config.split('\n'))
+    return config
+
+def legacy_emit(output_dir, resolution, custom_domain_dns, grouped, max_line_length):
+    whitelist = legacy_mode_config(artifact_writer.WHITELIST, resolution.cn_domains, CN_DNS, FOREIGN_DNS, FOREIGN_DNS,
+                                   custom_domain_dns, resolution.whitelist_overrides, grouped, max_line_length)
+    blacklist = legacy_mode_config(artifact_writer.BLACKLIST, resolution.foreign_domains, FOREIGN_DNS, CN_DNS, CN_DNS,
+                                   custom_domain_dns, resolution.blacklist_overrides, grouped, max_line_length)
+    with open(os.path.join(output_dir, 'whitelist_mode.txt'), 'w', encoding='utf-8') as f:
+        f.write(whitelist)
+    with open(os.path.join(output_dir, 'blacklist_mode.txt'), 'w', encoding='utf-8') as f:
+        f.write(blacklist)
+    for name, domains in (('cn_domains.txt', resolution.cn_domains), ('foreign_domains.txt', resolution.foreign_domains)):
+        with open(os.path.join(output_dir, name), 'w', encoding='utf-8') as f:
+            for domain in sorted(domains):
+                f.write(f"{domain}\n")
+
+def streaming_emit(output_dir, resolution, custom_domain_dns, grouped, max_line_length):
+    artifact_writer.write_artifacts(output_dir, resolution.cn_domains, resolution.foreign_domains, CN_DNS, FOREIGN_DNS,
+                                    custom_domain_dns, resolution.whitelist_overrides, resolution.blacklist_overrides,
+                                    True, grouped, max_line_length, sort_order='alphabetical', compression=())
+
+def measure(func, repeat: int, *args):
+    """返回 (最快耗时, 内存峰值)，内存峰值单独跑一次测量，避免 tracemalloc 影响计时"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def main():
+    parser = argparse.ArgumentParser(description='产物输出基准测试')
+    parser.add_argument('--dist', default=os.path.join(ROOT, 'dist'), help='包含 cn_domains.txt 和 foreign_domains.txt 的目录')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with open(os.path.join(args.dist, 'cn_domains.txt'), 'r', encoding='utf-8') as f:
+        cn_domains = {line.strip() for line in f if line.strip()}
+    with open(os.path.join(args.dist, 'foreign_domains.txt'), 'r', encoding='utf-8') as f:
+        foreign_domains = {line.strip() for line in f if line.strip()}
+    custom_domain_dns = {'tieba.baidu.com': ['https://223.5.5.5/dns-query'], 'wpad.lan': ['192.168.1.1']}
+    resolution = conflicts.resolve_conflicts(cn_domains, foreign_domains, custom_domain_dns.keys())
+
+    print(f"国内域名 {len(resolution.cn_domains)} 个，国外域名 {len(resolution.foreign_domains)} 个")
+    with tempfile.TemporaryDirectory() as output_dir:
+        for grouped in (False, True):
+            mode = '分组输出' if grouped else '逐域名输出'
+            legacy_time, legacy_peak = measure(legacy_emit, args.repeat, output_dir, resolution, custom_domain_dns, grouped,
+                                               upstream_format.DEFAULT_MAX_LINE_LENGTH)
+            new_time, new_peak = measure(streaming_emit, args.repeat, output_dir, resolution, custom_domain_dns, grouped,
+                                         upstream_format.DEFAULT_MAX_LINE_LENGTH)
+            print(f"{mode}: 旧写法 {legacy_time:.2f} 秒 / 峰值 {legacy_peak / 1024 / 1024:.1f} MB，"
+                  f"流式输出 {new_time:.2f} 秒 / 峰值 {new_peak / 1024 / 1024:.1f} MB")
+
+if __name__ == "__main__":
+    main()
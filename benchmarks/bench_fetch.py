@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+并发下载基准测试
+启动一个本地HTTP替身服务器，每个源带有不同的响应延迟，
+对比逐个下载与并发下载的总耗时
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import extract_domains
+
+class DelayedHandler(BaseHTTPRequestHandler):
+    """按路径中的毫秒数延迟响应：/delay/<ms>/<name>"""
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        delay_ms = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+        time.sleep(delay_ms / 1000)
+        body = ''.join(f"example{i}.{parts[-1]}.com\n" for i in range(1000)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description='对比逐个下载与并发下载的耗时')
+    parser.add_argument('--delays', default='200,300,400,500,600,700,800,1000', help='每个源的延迟（毫秒），逗号分隔')
+    parser.add_argument('--workers', type=int, default=extract_domains.DEFAULT_WORKERS, help='并发线程数')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), DelayedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    delays = [int(d) for d in args.delays.split(',') if d]
+    urls = [f"{base}/delay/{d}/source{i}" for i, d in enumerate(delays)]
+
+    try:
+        start = time.perf_counter()
+        for url in urls:
+            extract_domains.download_file(url)
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        extract_domains.download_files(((url, extract_domains.DEFAULT_TIMEOUT) for url in urls), args.workers)
+        concurrent = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    print(f"源数量: {len(urls)}，最慢单源: {max(delays)} ms，延迟总和: {sum(delays)} ms")
+    print(f"逐个下载: {sequential * 1000:.0f} ms")
+    print(f"并发下载（{args.workers} 线程）: {concurrent * 1000:.0f} ms")
+    print(f"加速比: {sequential / concurrent:.2f}x")
+
+if __name__ == "__main__":
+    main()
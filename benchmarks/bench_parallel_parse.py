@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多进程解析基准测试
+用 benchmarks/fixtures/parsers/ 中的样例和按固定种子生成的大型 dnsmasq 国内域名列表，
+比较主进程顺序解析与不同进程数下 parallel_parse.parse_contents 的耗时和加速比，
+并检查各源解析结果与顺序解析完全相同
+
+用法：
+    python benchmarks/bench_parallel_parse.py                    # 进程数 1、2、4……直到可用 CPU 数
+    python benchmarks/bench_parallel_parse.py --workers 2 8 --large-lines 2000000
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+from typing import List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import extract_domains
+import parallel_parse
+from bench_parsers import load_fixtures
+
+def default_workers() -> List[int]:
+    cpus = parallel_parse.available_cpus()
+    counts, n = [], 1
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+    return counts + [cpus]
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程解析基准测试')
+    parser.add_argument('--workers', type=int, nargs='+', help='要测量的进程数（默认 1、2、4……直到可用 CPU 数）')
+    parser.add_argument('--large-lines', type=int, default=1000000, help='合成国内域名列表的行数，0 表示跳过')
+    parser.add_argument('--runs', type=int, default=3, help='每项重复次数，取最快一次')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    tasks = [(name, content, fmt) for name, fmt, content in load_fixtures(args.large_lines)]
+    total_bytes = sum(len(content) for _, content, _ in tasks)
+    print(f"{len(tasks)} 个源，共 {total_bytes / 1024 / 1024:.1f} MB，可用 CPU {parallel_parse.available_cpus()} 个")
+
+    best = float('inf')
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        expected = {name: extract_domains.FORMAT_PARSERS[fmt][0](content) for name, content, fmt in tasks}
+        best = min(best, time.perf_counter() - start)
+    sequential = best
+    print(f"  顺序解析          {sequential:7.3f} 秒")
+
+    for workers in args.workers or default_workers():
+        best = float('inf')
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            results = parallel_parse.parse_contents(tasks, workers)
+            best = min(best, time.perf_counter() - start)
+        mismatched = [name for name, domains in expected.items() if results[name][0] != domains]
+        status = '结果一致' if not mismatched else f"结果不一致：{', '.join(mismatched)}"
+        print(f"  {workers:>3} 个进程        {best:7.3f} 秒  加速 {sequential / best:5.2f}x  {status}")
+        if mismatched:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
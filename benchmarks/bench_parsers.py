@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+域名源解析基准测试
+对 benchmarks/fixtures/parsers/ 中固定的各格式样例（Clash YAML、blackmatrix7 YAML/Domain.txt、dnsmasq、
+Base64 GFWList、AdBlock、普通文本），以及按固定种子生成的 100 万行 dnsmasq 格式国内域名列表，
+分别测量对应格式解析函数和 extract_domains_from_file 自动识别分派的每秒处理行数与 Python 堆内存峰值（tracemalloc），
+结果可保存为 JSON，并与 benchmarks/baselines/parsers.json 中的基线比较，性能下降或内存增长超过容差时标记为退化
+
+每秒行数和内存峰值的绝对值取决于机器，基线中只比较它们相对于同一进程内参考解析（逐行 strip 后放入集合）的比值，
+因此在任何机器上都可以与仓库中的基线比较；Python 版本与基线不同时这些比值也不可比，只比较域名数
+
+用法：
+    python benchmarks/bench_parsers.py                      # 测量并与基线比较，有退化时退出码为 1
+    python benchmarks/bench_parsers.py --output result.json
+    python benchmarks/bench_parsers.py --update-baseline    # 解析器有意改变时重新生成基线
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import logging
+import platform
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import extract_domains
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCH_DIR, 'fixtures', 'parsers')
+BASELINE = os.path.join(BENCH_DIR, 'baselines', 'parsers.json')
+
+# 样例文件 -> 格式，文件内容固定，sha256 记录在结果中，与基线不一致时不比较
+FIXTURES = {
+    'ChinaDomain.yaml': 'yaml',
+    'ChinaMax_Domain.yaml': 'yaml',
+    'Proxy_Domain.txt': 'blackmatrix7',
+    'accelerated-domains.china.conf': 'dnsmasq',
+    'gfwlist.txt': 'gfwlist',
+    'adblock.txt': 'adblock',
+    'cn_plain.list': 'plain',
+}
+
+SYNTHETIC_NAME = 'synthetic-china.conf'
+SYNTHETIC_SEED = 20240101
+SYNTHETIC_TLDS = ('com', 'cn', 'net', 'com.cn', 'org', 'net.cn', 'top', 'xyz')
+# 速度比值在共享的 CI 机器上仍有约 ±30% 的波动，只标记明显的变慢；内存峰值比值是确定的
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_MEMORY_TOLERANCE = 0.2
+
+def synthetic_china_list(lines: int, seed: int = SYNTHETIC_SEED) -> str:
+    """按 felixonmars/dnsmasq-china-list 的格式生成固定内容的国内域名列表"""
+    rng = random.Random(seed)
+    alphabet = 'abcdefghijklmnopqrstuvwxyz0123456789'
+    out = []
+    for _ in range(lines):
+        name = ''.join(rng.choices(alphabet, k=rng.randint(3, 14)))
+        if rng.random() < 0.15:
+            name = ''.join(rng.choices(alphabet, k=rng.randint(2, 6))) + '.' + name
+        out.append(f"server=/{name}.{rng.choice(SYNTHETIC_TLDS)}/114.114.114.114\n")
+    return ''.join(out)
+
+def load_fixtures(large_lines: int) -> List[Tuple[str, str, str]]:
+    """返回 [(名称, 格式, 内容)]"""
+    fixtures = []
+    for name, fmt in FIXTURES.items():
+        with open(os.path.join(FIXTURE_DIR, name), 'r', encoding='utf-8') as f:
+            fixtures.append((name, fmt, f.read()))
+    if large_lines:
+        fixtures.append((SYNTHETIC_NAME, 'dnsmasq', synthetic_china_list(large_lines)))
+    return fixtures
+
+def reference_parse(content: str) -> set:
+    """参考解析：逐行 strip、用域名正则匹配后放入集合，用来抵消机器速度和内存分配器的差异"""
+    match = extract_domains.DOMAIN_PATTERN.match
+    return {line for line in (raw.strip() for raw in content.splitlines()) if match(line)}
+
+def measure_relative(func: Callable[[str], Any], content: str, min_time: float,
+                     min_runs: int = 5) -> Tuple[float, float, int, int, Any]:
+    """交替运行参考解析和 func，返回 (参考最快耗时, func 最快耗时, 参考内存峰值, func 内存峰值, 解析结果)
+
+    两者交替测量，机器负载的波动对两者的影响相同，比值比分别测量稳定
+    """
+    result = func(content)
+    reference_parse(content)
+    best_reference, best, total, runs = float('inf'), float('inf'), 0.0, 0
+    while runs < min_runs or total < min_time:
+        start = time.perf_counter()
+        reference_parse(content)
+        middle = time.perf_counter()
+        func(content)
+        end = time.perf_counter()
+        best_reference, best = min(best_reference, middle - start), min(best, end - middle)
+        total, runs = total + end - start, runs + 1
+    peaks = []
+    for target in (reference_parse, func):
+        tracemalloc.start()
+        target(content)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return best_reference, best, peaks[0], peaks[1], result
+
+def run(large_lines: int, min_time: float) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'yaml_loader': extract_domains.YAML_LOADER.__name__,
+        'fixtures': {},
+    }
+    for name, fmt, content in load_fixtures(large_lines):
+        lines = content.count('\n')
+        parser = extract_domains.FORMAT_PARSERS[fmt][0]
+        entry: Dict[str, Any] = {
+            'format': fmt,
+            'lines': lines,
+            'bytes': len(content.encode('utf-8')),
+            'sha256': hashlib.sha256(content.encode('utf-8')).hexdigest(),
+        }
+        for kind, func in (('parser', parser), ('dispatch', lambda c: extract_domains.extract_domains_from_file(c, name))):
+            reference_seconds, seconds, reference_peak, peak, domains = measure_relative(func, content, min_time)
+            entry[kind] = {
+                'function': parser.__name__ if kind == 'parser' else 'extract_domains_from_file',
+                'domains': len(domains),
+                'lines_per_s': round(lines / seconds),
+                'peak_bytes': peak,
+                # 相对参考解析的比值，基线只比较这两项
+                'speed_ratio': round(reference_seconds / seconds, 4),
+                'memory_ratio': round(peak / max(reference_peak, 1), 4),
+            }
+        results['fixtures'][name] = entry
+    return results
+
+def python_minor(version: Optional[str]) -> str:
+    return '.'.join((version or '').split('.')[:2])
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+            memory_tolerance: float = DEFAULT_MEMORY_TOLERANCE) -> List[str]:
+    """与基线比较，返回退化说明列表
+
+    速度和内存只比较相对参考解析的比值，Python 版本不同时只比较域名数
+    """
+    regressions = []
+    same_python = python_minor(results.get('python')) == python_minor(baseline.get('python'))
+    if not same_python:
+        print(f"  Python {results.get('python')} 与基线的 {baseline.get('python')} 不同，只比较域名数")
+    for name, entry in results['fixtures'].items():
+        base = baseline.get('fixtures', {}).get(name)
+        if base is None:
+            continue
+        if base.get('sha256') != entry['sha256']:
+            print(f"  {name}: 样例内容与基线不同，跳过比较")
+            continue
+        for kind in ('parser', 'dispatch'):
+            now, then = entry[kind], base[kind]
+            if now['domains'] != then['domains']:
+                regressions.append(f"{name} {kind}: 提取的域名数 {then['domains']} -> {now['domains']}")
+            if not same_python or 'speed_ratio' not in then:
+                continue
+            if now['speed_ratio'] < then['speed_ratio'] * (1 - tolerance):
+                regressions.append(f"{name} {kind}: 相对参考解析的速度 {then['speed_ratio']:.3f} -> {now['speed_ratio']:.3f}")
+            if now['memory_ratio'] > then['memory_ratio'] * (1 + memory_tolerance):
+                regressions.append(f"{name} {kind}: 相对参考解析的内存峰值 {then['memory_ratio']:.3f} -> {now['memory_ratio']:.3f}")
+    return regressions
+
+def baseline_from(results: Dict[str, Any]) -> Dict[str, Any]:
+    """基线只保留与机器无关的内容：域名数和相对参考解析的比值"""
+    fixtures = {}
+    for name, entry in results['fixtures'].items():
+        fixtures[name] = {key: entry[key] for key in ('format', 'lines', 'bytes', 'sha256')}
+        for kind in ('parser', 'dispatch'):
+            fixtures[name][kind] = {key: entry[kind][key] for key in ('function', 'domains', 'speed_ratio', 'memory_ratio')}
+    return {'python': results['python'], 'yaml_loader': results['yaml_loader'], 'fixtures': fixtures}
+
+def read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_json(path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+def main():
+    parser = argparse.ArgumentParser(description='域名源解析基准测试')
+    parser.add_argument('--large-lines', type=int, default=1000000, help='合成国内域名列表的行数，0 表示跳过')
+    parser.add_argument('--min-time', type=float, default=0.5, help='每项至少累计测量的秒数，取最快一次')
+    parser.add_argument('--output', help='将结果保存为 JSON 文件')
+    parser.add_argument('--baseline', default=BASELINE, help='用于比较的基线文件')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='允许的相对速度下降比例（默认 0.5）')
+    parser.add_argument('--memory-tolerance', type=float, default=DEFAULT_MEMORY_TOLERANCE,
+                        help='允许的相对内存峰值增长比例（默认 0.2）')
+    parser.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基线文件')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    results = run(args.large_lines, args.min_time)
+    for name, entry in results['fixtures'].items():
+        print(f"{name}（{entry['format']}，{entry['lines']:,} 行）")
+        for kind in ('parser', 'dispatch'):
+            stats = entry[kind]
+            print(f"  {stats['function']:<45} {stats['lines_per_s']:>12,} 行/秒（参考的 {stats['speed_ratio']:.3f} 倍）  "
+                  f"峰值 {stats['peak_bytes'] / 1024 / 1024:>7.1f} MB（参考的 {stats['memory_ratio']:.2f} 倍）  "
+                  f"{stats['domains']:,} 个域名")
+    if args.output:
+        write_json(args.output, results)
+
+    if args.update_baseline:
+        write_json(args.baseline, baseline_from(results))
+        print(f"已更新基线 {args.baseline}")
+        return
+    baseline = read_json(args.baseline)
+    if baseline is None:
+        print(f"没有可用的基线 {args.baseline}，可用 --update-baseline 生成")
+        return
+    print(f"与基线比较（Python {baseline.get('python')}，速度容差 {args.tolerance:.0%}，内存容差 {args.memory_tolerance:.0%}）：")
+    regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+    for line in regressions:
+        print(f"  退化：{line}")
+    if regressions:
+        sys.exit(1)
+    print("  未发现退化")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+上游DNS探测基准测试
+在本机启动若干个模拟上游（UDP、TCP 和不加密的 DoH，可设置响应延迟和失败率，失败时不应答或返回 SERVFAIL），
+用 probe_upstreams 探测并排序，检查延迟低的上游排在前面、不可用的上游被剔除，并输出探测耗时
+
+也可以只启动模拟上游，用于手动测试 probe_upstreams.py：
+    python benchmarks/bench_probe.py --serve
+"""
+
+import os
+import sys
+import time
+import random
+import struct
+import argparse
+import logging
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import probe_upstreams
+
+# (名称, 协议, 延迟毫秒, 失败率, 失败时是否不应答)
+STAND_INS = [
+    ('slow', probe_upstreams.UDP, 80, 0.0, False),
+    ('fast', probe_upstreams.UDP, 2, 0.0, False),
+    ('doh', probe_upstreams.DOH, 40, 0.0, False),
+    ('flaky', probe_upstreams.TCP, 10, 0.2, False),
+    ('servfail', probe_upstreams.UDP, 1, 1.0, False),
+    ('dead', probe_upstreams.UDP, 0, 1.0, True),
+]
+
+def answer(query: bytes, server) -> bytes:
+    """按模拟上游的设置构造响应：成功时返回 NOERROR（无应答记录），失败时返回 SERVFAIL；不应答时返回 b''"""
+    time.sleep(server.latency)
+    failed = server.random.random() < server.failure_rate
+    if failed and server.silent:
+        return b''
+    query_id, flags = struct.unpack_from('!HH', query)
+    rcode = 2 if failed else 0
+    return struct.pack('!HHHHHH', query_id, 0x8000 | (flags & 0x0100) | 0x0080 | rcode, 1, 0, 0, 0) + query[12:]
+
+class UdpHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        response = answer(data, self.server)
+        if response:
+            sock.sendto(response, self.client_address)
+
+class TcpHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            header = self.rfile.read(2)
+            if len(header) < 2:
+                return
+            response = answer(self.rfile.read(struct.unpack('!H', header)[0]), self.server)
+            if not response:
+                return
+            self.wfile.write(struct.pack('!H', len(response)) + response)
+
+class DohHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头和正文分两次写出，不关闭 Nagle 算法时会与客户端的延迟确认叠加出约 40 ms 的额外延迟
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        response = answer(self.rfile.read(int(self.headers.get('Content-Length', 0))), self.server)
+        status = 200 if response else 502
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/dns-message')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+class ThreadingUdpServer(socketserver.ThreadingMixIn, socketserver.UDPServer):
+    daemon_threads = True
+
+class ThreadingTcpServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_stand_ins(seed: int) -> Tuple[List[str], List[str], list]:
+    """启动模拟上游，返回 (名称, 上游地址, 服务列表)"""
+    names, upstreams, servers = [], [], []
+    for index, (name, kind, latency, failure_rate, silent) in enumerate(STAND_INS):
+        if kind == probe_upstreams.DOH:
+            server = ThreadingHTTPServer(('127.0.0.1', 0), DohHandler)
+            server.daemon_threads = True
+        elif kind == probe_upstreams.TCP:
+            server = ThreadingTcpServer(('127.0.0.1', 0), TcpHandler)
+        else:
+            server = ThreadingUdpServer(('127.0.0.1', 0), UdpHandler)
+        server.latency = latency / 1000
+        server.failure_rate = failure_rate
+        server.silent = silent
+        server.random = random.Random(seed + index)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+        if kind == probe_upstreams.DOH:
+            upstreams.append(f"http://127.0.0.1:{port}/dns-query")
+        elif kind == probe_upstreams.TCP:
+            upstreams.append(f"tcp://127.0.0.1:{port}")
+        else:
+            upstreams.append(f"127.0.0.1:{port}")
+        names.append(name)
+        servers.append(server)
+    return names, upstreams, servers
+
+def main():
+    parser = argparse.ArgumentParser(description='上游DNS探测基准测试')
+    parser.add_argument('--queries', type=int, default=probe_upstreams.DEFAULT_QUERIES, help='每个上游的查询次数')
+    parser.add_argument('--concurrency', type=int, default=probe_upstreams.DEFAULT_CONCURRENCY, help='每个上游的并发连接数')
+    parser.add_argument('--timeout', type=float, default=0.5, help='单次查询超时秒数')
+    parser.add_argument('--seed', type=int, default=1, help='模拟失败使用的随机种子')
+    parser.add_argument('--serve', action='store_true', help='只启动模拟上游并输出地址，按 Ctrl+C 退出')
+    args = parser.parse_args()
+
+    names, upstreams, servers = start_stand_ins(args.seed)
+    if args.serve:
+        print("模拟上游：")
+        for name, upstream in zip(names, upstreams):
+            print(f"  {name:<10} {upstream}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            return
+
+    logging.disable(logging.WARNING)
+    # 末尾加一个不支持探测的上游，应保留在可用上游之后
+    upstreams.append('tls://dns.example')
+    names.append('tls')
+    start = time.perf_counter()
+    results = probe_upstreams.probe_upstreams(upstreams, ['example.com', 'example.org'], args.queries, args.concurrency, args.timeout)
+    elapsed = time.perf_counter() - start
+    print(f"{len(upstreams)} 个上游，每个 {args.queries} 次查询、{args.concurrency} 个并发，探测用时 {elapsed:.2f} 秒")
+    label = dict(zip(upstreams, names))
+    for result in results:
+        print(f"  {label[result.upstream]:<10} {probe_upstreams.format_result(result)}")
+
+    ranked = [label[upstream] for upstream in probe_upstreams.rank_upstreams(results)]
+    print(f"  排序结果: {' > '.join(ranked)}")
+    expected = ['fast', 'flaky', 'doh', 'slow', 'tls']
+    for server in servers:
+        server.shutdown()
+    if ranked != expected:
+        print(f"  与预期顺序不一致: {' > '.join(expected)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+上游配置推送基准测试
+在本机启动若干个模拟 AdGuard Home 的 HTTP 服务（实现 GET /control/dns_info 和 POST /control/dns_config，
+校验 Basic 认证，可模拟网络延迟），用 publish_upstreams.Publisher 把 dist/ 中的分流配置推送到全部实例，
+测量首次推送（全部更新）和再次推送（哈希相同、全部跳过）的耗时，并检查各实例收到的上游配置和使用的连接数
+
+dist/ 中还没有生成的分流配置时（例如刚检出的仓库），先用 benchmarks/fixtures/parsers 中的样例在临时目录中生成，不需要网络
+
+也可以只启动模拟服务，用于手动测试 publish_upstreams.py：
+    python benchmarks/bench_publish.py --serve --instances 3
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import logging
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import artifact_writer
+import conflicts
+import extract_domains
+import publish_upstreams
+from domain_index import BLACKLIST, WHITELIST
+from lookup_domain import MODE_FILES
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'parsers')
+USERNAME = 'admin'
+PASSWORD = 'bench'
+
+# 没有生成结果时用于构造分流配置的样例
+CN_FIXTURES = ('ChinaDomain.yaml', 'ChinaMax_Domain.yaml', 'accelerated-domains.china.conf', 'cn_plain.list')
+FOREIGN_FIXTURES = ('Proxy_Domain.txt', 'gfwlist.txt', 'adblock.txt')
+CN_DNS = ["https://doh.pub/dns-query", "https://dns.alidns.com/dns-query"]
+FOREIGN_DNS = ["https://1.1.1.1/dns-query", "https://8.8.8.8/dns-query"]
+
+class FakeAdGuardHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes = b'') -> None:
+        time.sleep(self.server.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        expected = 'Basic ' + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
+        return self.headers.get('Authorization') == expected
+
+    def do_GET(self):
+        if not self._authorized():
+            return self._reply(401)
+        if self.path != '/control/dns_info':
+            return self._reply(404)
+        self._reply(200, json.dumps({'upstream_dns': self.server.upstream_dns, 'upstream_mode': 'load_balance'}).encode())
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self._authorized():
+            return self._reply(401)
+        if self.path != '/control/dns_config':
+            return self._reply(404)
+        try:
+            self.server.upstream_dns = json.loads(body)['upstream_dns']
+        except (ValueError, KeyError):
+            return self._reply(400, b'invalid json')
+        self.server.updates += 1
+        self._reply(200)
+
+def start_servers(count: int, latency: float) -> List[ThreadingHTTPServer]:
+    servers = []
+    for _ in range(count):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAdGuardHandler)
+        server.daemon_threads = True
+        server.latency = latency
+        server.upstream_dns = ['https://dns10.quad9.net/dns-query']
+        server.updates = 0
+        server.connections = 0
+        server.lock = threading.Lock()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+def fixture_domains(names) -> set:
+    domains = set()
+    for name in names:
+        with open(os.path.join(FIXTURE_DIR, name), 'r', encoding='utf-8') as f:
+            domains |= extract_domains.extract_domains_from_file(f.read(), name)
+    return domains
+
+def generate_fixture_configs(output_dir: str) -> None:
+    """用样例域名生成两种模式的分流配置"""
+    resolution = conflicts.resolve_conflicts(fixture_domains(CN_FIXTURES), fixture_domains(FOREIGN_FIXTURES))
+    artifact_writer.write_artifacts(output_dir, resolution.cn_domains, resolution.foreign_domains, CN_DNS, FOREIGN_DNS, {},
+                                    resolution.whitelist_overrides, resolution.blacklist_overrides, compression=())
+
+def has_mode_configs(dist_dir: str) -> bool:
+    return all(os.path.exists(os.path.join(dist_dir, name)) for name in MODE_FILES.values())
+
+def run(args, servers: List[ThreadingHTTPServer], urls: List[str]) -> List[str]:
+    """推送两次并输出结果，返回收到的配置与预期不一致的实例"""
+    instances = [{"url": url, "username": USERNAME, "password": PASSWORD, "mode": (WHITELIST, BLACKLIST)[i % 2]}
+                 for i, url in enumerate(urls)]
+    expected = {mode: publish_upstreams.read_upstream_lines(os.path.join(args.dist, MODE_FILES[mode])) for mode in MODE_FILES}
+    print(f"{args.instances} 个模拟实例，每个请求延迟 {args.latency:.0f} ms，{args.workers} 个推送线程；"
+          f"白名单模式 {len(expected[WHITELIST])} 行，黑名单模式 {len(expected[BLACKLIST])} 行")
+
+    publisher = publish_upstreams.Publisher(instances, args.workers)
+    try:
+        for label in ('首次推送', '再次推送'):
+            start = time.perf_counter()
+            results = publisher.publish(args.dist)
+            elapsed = time.perf_counter() - start
+            statuses = {status: sum(1 for result in results if result.status == status) for status in
+                        (publish_upstreams.UPDATED, publish_upstreams.UNCHANGED, publish_upstreams.FAILED)}
+            print(f"  {label}: {elapsed:.2f} 秒，" + '，'.join(f"{status} {count}" for status, count in statuses.items()))
+    finally:
+        publisher.close()
+
+    mismatched = [url for url, server, instance in zip(urls, servers, instances) if server.upstream_dns != expected[instance["mode"]]]
+    connections = sum(server.connections for server in servers)
+    print(f"  各实例收到的配置{'全部一致' if not mismatched else '不一致：' + ', '.join(mismatched)}，"
+          f"共建立 {connections} 个连接（{connections / len(servers):.1f} 个/实例），更新 {sum(server.updates for server in servers)} 次")
+    return mismatched
+
+def main():
+    parser = argparse.ArgumentParser(description='上游配置推送基准测试')
+    parser.add_argument('--dist', help='生成结果所在目录（默认 dist，其中没有分流配置时由样例生成）')
+    parser.add_argument('--instances', type=int, default=20, help='模拟实例数')
+    parser.add_argument('--latency', type=float, default=50, help='模拟实例每个请求的延迟（毫秒）')
+    parser.add_argument('--workers', type=int, default=publish_upstreams.DEFAULT_WORKERS, help='并发推送的线程数')
+    parser.add_argument('--serve', action='store_true', help='只启动模拟服务并输出地址，按 Ctrl+C 退出')
+    args = parser.parse_args()
+
+    servers = start_servers(args.instances, args.latency / 1000)
+    urls = [f"http://127.0.0.1:{server.server_address[1]}" for server in servers]
+    if args.serve:
+        print(f"模拟实例（用户名 {USERNAME}，密码 {PASSWORD}）：")
+        for url in urls:
+            print(f"  {url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            return
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix='bench_publish_') as tmp_dir:
+        if args.dist is None:
+            args.dist = os.path.join(ROOT, 'dist')
+            if not has_mode_configs(args.dist):
+                print(f"{os.path.relpath(args.dist)} 中没有生成的分流配置，使用样例在临时目录中生成")
+                args.dist = tmp_dir
+                generate_fixture_configs(args.dist)
+        elif not has_mode_configs(args.dist):
+            print(f"{args.dist} 中没有 {' 和 '.join(MODE_FILES.values())}，请先运行 python scripts/generate_config.py")
+            sys.exit(1)
+        mismatched = run(args, servers, urls)
+    for server in servers:
+        server.shutdown()
+    if mismatched:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+查询日志回放基准测试
+读取 AdGuard Home 的 querylog.json（每行一条 JSON 记录，查询的域名在 QH 字段），
+或按域名列表生成的合成查询日志，将每个查询的域名分别交给白名单模式和黑名单模式的路由表分类，
+统计各模式的规则命中率、发往国内/国外/自定义上游的流量占比、两种模式结果不同的查询数，以及每次分类的耗时（纳秒）
+
+路由表读取 dist/<模式>_mode.txt，不存在时由 dist/ 中的国内外域名列表构造，
+默认回放 benchmarks/fixtures/querylog.json，不需要网络
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import conflicts
+import extract_domains
+import lookup_domain
+from domain_index import BLACKLIST, WHITELIST
+from generate_config import read_custom_domain_dns
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'querylog.json')
+
+CN_DNS = ["https://doh.pub/dns-query", "https://dns.alidns.com/dns-query"]
+FOREIGN_DNS = ["https://1.1.1.1/dns-query", "https://8.8.8.8/dns-query"]
+
+SUBDOMAIN_PREFIXES = ('', '', '', 'www.', 'api.', 'cdn.', 'img.', 'm.')
+QUERY_TYPES = ('A', 'A', 'A', 'AAAA', 'AAAA', 'HTTPS')
+
+def iter_querylog(paths: Iterable[str]) -> Iterator[str]:
+    """逐条读取查询日志中的域名，跳过无法解析的行；.gz 结尾的文件按 gzip 读取"""
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    name = json.loads(line).get('QH')
+                except (ValueError, AttributeError):
+                    continue
+                if name:
+                    yield name
+
+def generate_querylog(domains: List[str], count: int, seed: int = 0, unknown_ratio: float = 0.25) -> Iterator[Dict[str, Any]]:
+    """生成合成查询日志记录：域名按类 Zipf 分布从列表中抽取并随机加上常见子域名前缀，
+    另有 unknown_ratio 比例的查询是不在任何列表中的域名"""
+    rng = random.Random(seed)
+    weights, total = [], 0.0
+    for rank in range(len(domains)):
+        total += 1 / (rank + 1) ** 1.1
+        weights.append(total)
+    order = domains[:]
+    rng.shuffle(order)
+    start = 1700000000
+    for i in range(count):
+        if rng.random() < unknown_ratio:
+            name = f"host{rng.randrange(5000)}.unlisted{rng.randrange(200)}.example"
+        else:
+            name = rng.choice(SUBDOMAIN_PREFIXES) + rng.choices(order, cum_weights=weights)[0]
+        yield {
+            'T': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(start + i * 3)),
+            'QH': name,
+            'QT': rng.choice(QUERY_TYPES),
+            'QC': 'IN',
+            'IP': f"192.168.1.{rng.randrange(2, 40)}",
+            'Elapsed': rng.randrange(100000, 80000000),
+        }
+
+def tables_from_lists(dist_dir: str) -> Dict[str, lookup_domain.RoutingTable]:
+    """由 dist/ 中的国内外域名列表和 config/ 中的DNS配置构造两种模式的路由表，规则与生成的分流配置相同"""
+    with open(os.path.join(dist_dir, 'cn_domains.txt'), 'r', encoding='utf-8') as f:
+        cn_domains = {line.strip() for line in f if line.strip()}
+    with open(os.path.join(dist_dir, 'foreign_domains.txt'), 'r', encoding='utf-8') as f:
+        foreign_domains = {line.strip() for line in f if line.strip()}
+    cn_upstream = ' '.join(extract_domains.read_dns_servers(os.path.join(ROOT, 'config', 'cn_dns.txt'), CN_DNS))
+    foreign_upstream = ' '.join(extract_domains.read_dns_servers(os.path.join(ROOT, 'config', 'foreign_dns.txt'), FOREIGN_DNS))
+    custom_domain_dns = read_custom_domain_dns(os.path.join(ROOT, 'config', 'custom_domain_dns.txt'))
+    resolution = conflicts.resolve_conflicts(cn_domains, foreign_domains, custom_domain_dns.keys())
+    custom = {domain: ' '.join(dns_list) for domain, dns_list in custom_domain_dns.items()}
+    whitelist = dict.fromkeys(resolution.cn_domains, cn_upstream)
+    whitelist.update(dict.fromkeys(resolution.whitelist_overrides, foreign_upstream))
+    whitelist.update(custom)
+    blacklist = dict.fromkeys(resolution.foreign_domains, foreign_upstream)
+    blacklist.update(dict.fromkeys(resolution.blacklist_overrides, cn_upstream))
+    blacklist.update(custom)
+    return {WHITELIST: lookup_domain.RoutingTable(whitelist, foreign_upstream),
+            BLACKLIST: lookup_domain.RoutingTable(blacklist, cn_upstream)}
+
+def load_tables(dist_dir: str) -> Dict[str, lookup_domain.RoutingTable]:
+    """优先使用生成的分流配置（各模式实际输出的规则），不存在时由域名列表构造"""
+    try:
+        return {mode: lookup_domain.load_routing_table(dist_dir, mode, 'config') for mode in (WHITELIST, BLACKLIST)}
+    except OSError:
+        return tables_from_lists(dist_dir)
+
+def time_lookups(route, names: List[str]) -> float:
+    """返回每次查询的平均耗时（纳秒）"""
+    start = time.perf_counter_ns()
+    for name in names:
+        route(name)
+    return (time.perf_counter_ns() - start) / max(len(names), 1)
+
+def replay(tables: Dict[str, lookup_domain.RoutingTable], names: List[str]) -> Dict[str, Any]:
+    """回放查询，返回各模式的统计结果"""
+    # 白名单模式的默认上游是国外DNS，黑名单模式的默认上游是国内DNS
+    labels = {tables[BLACKLIST].default: 'cn', tables[WHITELIST].default: 'foreign'}
+    results: Dict[str, Any] = {'queries': len(names), 'unique': len(set(names)), 'modes': {}}
+    routes = {}
+    for mode, table in tables.items():
+        table.route.cache_clear()
+        uncached_ns = time_lookups(table._route, names)
+        cached_ns = time_lookups(table.route, names)
+        decisions = [table.route(name) for name in names]
+        routes[mode] = [upstream for _, upstream in decisions]
+        hits = sum(1 for matched, _ in decisions if matched is not None)
+        traffic = Counter(labels.get(upstream, 'custom') for _, upstream in decisions)
+        results['modes'][mode] = {
+            'hit_rate': hits / max(len(names), 1),
+            'traffic': {label: count / max(len(names), 1) for label, count in sorted(traffic.items())},
+            'ns_per_lookup': round(uncached_ns, 1),
+            'ns_per_lookup_cached': round(cached_ns, 1),
+        }
+    results['mode_disagreements'] = sum(1 for w, b in zip(routes[WHITELIST], routes[BLACKLIST]) if w != b)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='查询日志回放基准测试')
+    parser.add_argument('querylog', nargs='*', help='AdGuard Home 的 querylog.json（可指定多个），默认使用仓库中的示例日志')
+    parser.add_argument('--dist', default=os.path.join(ROOT, 'dist'), help='生成结果所在目录')
+    parser.add_argument('--synthetic', type=int, metavar='N', help='不读取日志，按域名列表生成 N 条合成查询')
+    parser.add_argument('--seed', type=int, default=0, help='合成查询的随机种子')
+    parser.add_argument('--save-log', help='将合成查询保存为 querylog.json 格式，可作为新的示例日志')
+    parser.add_argument('--json', help='将统计结果保存为 JSON 文件')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    tables = load_tables(args.dist)
+    if args.synthetic:
+        domains = sorted(tables[WHITELIST].rules.keys() | tables[BLACKLIST].rules.keys())
+        records = list(generate_querylog(domains, args.synthetic, args.seed))
+        if args.save_log:
+            with open(args.save_log, 'w', encoding='utf-8', newline='\n') as f:
+                for record in records:
+                    f.write(json.dumps(record, separators=(',', ':')) + '\n')
+        names = [record['QH'] for record in records]
+        source = f"合成查询（种子 {args.seed}）"
+    else:
+        paths = args.querylog or [FIXTURE]
+        names = list(iter_querylog(paths))
+        source = ', '.join(os.path.relpath(path) for path in paths)
+
+    results = replay(tables, names)
+    print(f"查询日志: {source}，{results['queries']} 次查询，{results['unique']} 个不同域名")
+    for mode, stats in results['modes'].items():
+        traffic = '，'.join(f"{label} {share:.1%}" for label, share in stats['traffic'].items())
+        print(f"{mode}: 规则命中 {stats['hit_rate']:.1%}，流量 {traffic}，"
+              f"分类 {stats['ns_per_lookup']:.0f} ns/次（有缓存 {stats['ns_per_lookup_cached']:.0f} ns/次）")
+    print(f"两种模式路由不同的查询: {results['mode_disagreements']}（{results['mode_disagreements'] / max(results['queries'], 1):.1%}）")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
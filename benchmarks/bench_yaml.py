@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+YAML 规则集解析基准测试
+对比“逐行扫描 + yaml.safe_load 完整解析”两遍处理与单遍快速路径的耗时，
+默认使用按 ACL4SSR 和 blackmatrix7 规则集格式合成的内容，也可以传入实际的规则集文件
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import logging
+
+import yaml
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import extract_domains
+
+def random_domain(rng: random.Random) -> str:
+    labels = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(rng.randint(3, 12)))
+              for _ in range(rng.randint(1, 2))]
+    return '.'.join(labels + [rng.choice(['com', 'cn', 'net', 'com.cn', 'org'])])
+
+def acl4ssr_provider(count: int, seed: int = 1) -> str:
+    """ACL4SSR Clash/Providers 风格：payload 下是 DOMAIN/DOMAIN-SUFFIX/DOMAIN-KEYWORD 规则"""
+    rng = random.Random(seed)
+    lines = ['payload:']
+    for _ in range(count):
+        rule = rng.choices(['DOMAIN-SUFFIX', 'DOMAIN', 'DOMAIN-KEYWORD', 'IP-CIDR'], [80, 15, 3, 2])[0]
+        if rule == 'DOMAIN-KEYWORD':
+            lines.append(f"  - DOMAIN-KEYWORD,{random_domain(rng).split('.')[0]}")
+        elif rule == 'IP-CIDR':
+            lines.append(f"  - IP-CIDR,{rng.randint(1, 223)}.{rng.randint(0, 255)}.0.0/16,no-resolve")
+        else:
+            lines.append(f"  - {rule},{random_domain(rng)}")
+    return '\n'.join(lines) + '\n'
+
+def blackmatrix7_provider(count: int, seed: int = 2) -> str:
+    """blackmatrix7 *_Domain.yaml 风格：带头部注释，payload 下是带引号的域名"""
+    rng = random.Random(seed)
+    lines = ['# NAME: ChinaMax', '# AUTHOR: blackmatrix7', f'# TOTAL: {count}', 'payload:']
+    for _ in range(count):
+        domain = random_domain(rng)
+        lines.append(f"  - '+.{domain}'" if rng.random() < 0.9 else f"  - '{domain}'")
+    return '\n'.join(lines) + '\n'
+
+def two_pass(content: str) -> set:
+    """两遍处理：逐行扫描后再用纯Python的 yaml.safe_load 完整解析"""
+    domains = set(extract_domains._iter_classified(content, 'yaml'))
+    domains.update(extract_domains._iter_domains_from_yaml_document(yaml.safe_load(content)))
+    return domains
+
+def full_parse_cloader(content: str) -> set:
+    """逐行扫描加 CSafeLoader 完整解析（快速路径不适用时的回退路径）"""
+    domains = set(extract_domains._iter_classified(content, 'yaml'))
+    domains.update(extract_domains._iter_domains_from_yaml_document(yaml.load(content, Loader=extract_domains.YAML_LOADER)))
+    return domains
+
+def measure(func, content: str, repeat: int):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(content)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='YAML 规则集解析基准测试')
+    parser.add_argument('files', nargs='*', help='实际的规则集文件，不提供时使用合成内容')
+    parser.add_argument('--count', type=int, default=100000, help='合成规则集的条目数')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    if args.files:
+        samples = []
+        for path in args.files:
+            with open(path, 'r', encoding='utf-8') as f:
+                samples.append((os.path.basename(path), f.read()))
+    else:
+        samples = [('ACL4SSR 风格', acl4ssr_provider(args.count)),
+                   ('blackmatrix7 风格', blackmatrix7_provider(args.count))]
+
+    print(f"YAML 加载器: {extract_domains.YAML_LOADER.__name__}")
+    for name, content in samples:
+        lines = content.count('\n')
+        old_time, old_result = measure(two_pass, content, args.repeat)
+        cloader_time, _ = measure(full_parse_cloader, content, args.repeat)
+        new_time, new_result = measure(extract_domains.extract_domains_from_yaml, content, args.repeat)
+        status = '一致' if old_result == new_result else f'不一致（相差 {len(old_result ^ new_result)} 个）'
+        print(f"{name}: {lines} 行，{len(new_result)} 个域名，结果{status}")
+        print(f"  两遍处理（safe_load）: {old_time * 1000:8.1f} ms")
+        print(f"  两遍处理（{extract_domains.YAML_LOADER.__name__}）: {cloader_time * 1000:8.1f} ms")
+        print(f"  单遍快速路径: {new_time * 1000:8.1f} ms  （提速 {old_time / new_time:.1f}x）")
+
+if __name__ == "__main__":
+    main()
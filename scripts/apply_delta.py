@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+增量更新应用脚本
+用一个基础版本的产物文件加上一串增量文件（dist/deltas/<起始批次>.delta）重建最新的完整文件，
+每一步都会校验基础文件和结果文件的 sha256。只依赖标准库，可以单独复制到远程节点上使用
+
+用法：
+    python apply_delta.py --base-dir /etc/adguard/lists deltas/aaaa.delta deltas/bbbb.delta
+"""
+
+import os
+import sys
+import hashlib
+import logging
+import argparse
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+logger = logging.getLogger('apply_delta')
+
+DELTA_HEADER = "# AdGuard Home 分流配置增量更新"
+
+class Hunk(NamedTuple):
+    """一处改动：从基础文件第 base_start 行起删除 removed，插入 added"""
+    base_start: int
+    removed: List[str]
+    added: List[str]
+
+class FileDelta(NamedTuple):
+    """单个文件的增量"""
+    name: str
+    base_sha256: str
+    target_sha256: str
+    hunks: List[Hunk]
+
+class Delta(NamedTuple):
+    """相邻两个批次之间的增量"""
+    from_generation: str
+    to_generation: str
+    files: List[FileDelta]
+
+def parse_delta(lines: Iterable[str]) -> Delta:
+    """解析增量文件"""
+    lines = iter(line.rstrip('\n') for line in lines)
+    if next(lines, None) != DELTA_HEADER:
+        raise ValueError("不是增量更新文件")
+    from_generation = to_generation = None
+    files: List[FileDelta] = []
+    hunk: Optional[Hunk] = None
+    for line in lines:
+        if line.startswith('-') and hunk is not None:
+            hunk.removed.append(line[1:])
+        elif line.startswith('+') and hunk is not None:
+            hunk.added.append(line[1:])
+        elif line.startswith('@ '):
+            hunk = Hunk(int(line.split()[1]), [], [])
+            files[-1].hunks.append(hunk)
+        elif line.startswith('file '):
+            _, name, base_sha256, target_sha256 = line.split(' ')
+            files.append(FileDelta(name, base_sha256, target_sha256, []))
+            hunk = None
+        elif line.startswith('from '):
+            from_generation = line[len('from '):]
+        elif line.startswith('to '):
+            to_generation = line[len('to '):]
+        elif line == 'end':
+            break
+        else:
+            raise ValueError(f"无法识别的增量行: {line[:80]}")
+    else:
+        raise ValueError("增量文件不完整")
+    if not from_generation or not to_generation:
+        raise ValueError("增量文件缺少批次信息")
+    return Delta(from_generation, to_generation, files)
+
+def read_delta(file_path: str) -> Delta:
+    """读取增量文件"""
+    with open(file_path, 'r', encoding='utf-8', newline='\n') as f:
+        return parse_delta(f)
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def apply_file_delta(content: str, file_delta: FileDelta) -> str:
+    """将单个文件的增量应用到基础内容上，返回新内容"""
+    if sha256_text(content) != file_delta.base_sha256:
+        raise ValueError(f"{file_delta.name} 与增量的基础版本不一致")
+    base = content.split('\n')
+    result: List[str] = []
+    position = 0
+    for hunk in file_delta.hunks:
+        if hunk.base_start < position or base[hunk.base_start:hunk.base_start + len(hunk.removed)] != hunk.removed:
+            raise ValueError(f"{file_delta.name} 第 {hunk.base_start} 行的改动与基础内容不符")
+        result.extend(base[position:hunk.base_start])
+        result.extend(hunk.added)
+        position = hunk.base_start + len(hunk.removed)
+    result.extend(base[position:])
+    new_content = '\n'.join(result)
+    if sha256_text(new_content) != file_delta.target_sha256:
+        raise ValueError(f"{file_delta.name} 应用增量后的内容校验失败")
+    return new_content
+
+def apply_deltas(base_dir: str, delta_paths: List[str], output_dir: Optional[str] = None) -> str:
+    """按顺序应用一串增量，返回最终批次标识
+
+    所有增量在内存中依次应用并校验通过后才写出文件，中途失败不会留下不完整的结果
+    """
+    output_dir = output_dir or base_dir
+    contents: Dict[str, str] = {}
+    generation = None
+    for path in delta_paths:
+        delta = read_delta(path)
+        if generation is not None and delta.from_generation != generation:
+            raise ValueError(f"{path} 的起始批次 {delta.from_generation[:12]} 与上一个增量的结果 {generation[:12]} 不连续")
+        for file_delta in delta.files:
+            if file_delta.name not in contents:
+                with open(os.path.join(base_dir, file_delta.name), 'r', encoding='utf-8', newline='\n') as f:
+                    contents[file_delta.name] = f.read()
+            contents[file_delta.name] = apply_file_delta(contents[file_delta.name], file_delta)
+        generation = delta.to_generation
+        logger.info(f"已应用 {os.path.basename(path)}：{delta.from_generation[:12]} -> {delta.to_generation[:12]}，"
+                    f"{sum(len(f.hunks) for f in delta.files)} 处改动")
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name, content in contents.items():
+        file_path = os.path.join(output_dir, name)
+        with open(file_path + '.tmp', 'w', encoding='utf-8', newline='\n') as f:
+            f.write(content)
+        os.replace(file_path + '.tmp', file_path)
+    return generation
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='用基础文件加一串增量重建最新的分流配置文件')
+    parser.add_argument('deltas', nargs='+', help='按批次顺序排列的增量文件')
+    parser.add_argument('--base-dir', required=True, help='基础版本文件所在目录')
+    parser.add_argument('--output-dir', help='结果输出目录，默认覆盖基础目录中的文件')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        generation = apply_deltas(args.base_dir, args.deltas, args.output_dir)
+    except (OSError, ValueError) as e:
+        logger.error(f"应用增量失败：{e}")
+        sys.exit(1)
+    logger.info(f"已更新到批次 {generation}")
+
+if __name__ == "__main__":
+    main()
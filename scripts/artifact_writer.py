@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分流配置产物输出
+每个域名集合只排序一次，白名单/黑名单配置和调试用的域名列表都从同一个有序序列生成，
+逐行写入带缓冲的文件，不在内存中拼接完整的文件内容
+输出不含时间戳，所有文件原子写入且内容不变时不改动，并在 manifest.json 中记录各文件的 sha256 和数量
+"""
+
+import os
+import gzip
+import json
+import lzma
+import time
+import shutil
+import hashlib
+import logging
+from itertools import groupby
+from typing import AbstractSet, Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import upstream_format
+import domain_index
+import hot_set
+from delta import DEFAULT_DELTA_KEEP, DeltaRecorder, update_delta_index
+from domain_trie import find_covered, reversed_name
+from run_metrics import DISABLED, RunMetrics
+
+logger = logging.getLogger('artifact_writer')
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+MANIFEST_NAME = 'manifest.json'
+
+# 排序方式：按标签反转排序时同一上级域名下的规则相邻，压缩率更高
+SORT_KEYS = {
+    'reversed': reversed_name,
+    'alphabetical': None,
+}
+DEFAULT_SORT = 'reversed'
+
+# 预压缩格式，只对需要分发的配置文件和域名列表生成
+COMPRESSED_FILES = ('whitelist_mode.txt', 'blacklist_mode.txt', 'cn_domains.txt', 'foreign_domains.txt')
+DEFAULT_COMPRESSION = ('gz', 'xz')
+
+class ModeText(NamedTuple):
+    """分流模式配置文件中的说明文字"""
+    title: str
+    description: str
+    default_label: str
+    section_label: str
+    override_label: str
+
+WHITELIST = ModeText('白名单模式', '白名单模式：命中国内域名走国内DNS，其他走国外DNS', '国外', '国内', '国外')
+BLACKLIST = ModeText('黑名单模式', '黑名单模式：命中国外域名走国外DNS，其他走国内DNS', '国内', '国外', '国内')
+
+SEPARATOR = "#" + "=" * 50
+
+def find_pruned(domains: Set[str], upstreams: List[str], other_upstreams: List[str],
+                custom_domain_dns: Optional[Dict[str, List[str]]] = None, overrides: Optional[Set[str]] = None) -> Set[str]:
+    """找出本模式中被上级域名覆盖的子域名，自定义规则和例外规则参与查找但不会被剔除"""
+    rules = {domain: tuple(dns_list) for domain, dns_list in (custom_domain_dns or {}).items()}
+    rules.update((domain, tuple(other_upstreams)) for domain in overrides or ())
+    return find_covered(domains, tuple(upstreams), rules)
+
+def find_hot_rules(observed: Dict[str, int], domains: AbstractSet[str], pruned: Set[str], overrides: Set[str],
+                   custom_domain_dns: Dict[str, List[str]]) -> Tuple[Set[str], int]:
+    """找出查询过的域名在本模式中实际命中的规则（不含自定义规则），返回 (命中的规则, 命中规则的查询次数)"""
+    def is_rule(domain: str) -> bool:
+        return domain in custom_domain_dns or domain in overrides or (domain in domains and domain not in pruned)
+
+    matched, hits = hot_set.match_rules(observed, is_rule)
+    return matched - custom_domain_dns.keys(), hits
+
+def rule_lines(domains: Iterable[str], upstream: str, grouped: bool = False,
+               max_line_length: int = upstream_format.DEFAULT_MAX_LINE_LENGTH) -> Iterator[str]:
+    """生成使用同一组上游的域名规则行"""
+    if grouped:
+        return upstream_format.format_grouped_rules(domains, upstream, max_line_length)
+    return (f"[/{domain}/]{upstream}" for domain in domains)
+
+def iter_mode_config(text: ModeText, domains: Sequence[str], upstreams: List[str], default_upstreams: List[str],
+                     other_upstreams: List[str], custom_domain_dns: Optional[Dict[str, List[str]]] = None,
+                     overrides: Optional[Set[str]] = None, pruned: Optional[Set[str]] = None, excluded: int = 0,
+                     grouped: bool = False, max_line_length: int = upstream_format.DEFAULT_MAX_LINE_LENGTH,
+                     sort_key: Optional[Callable[[str], Any]] = None, notes: Iterable[str] = ()) -> Iterator[str]:
+    """逐行生成分流模式配置
+
+    domains 为已排序、且不含自定义规则域名的本模式域名序列，其中 pruned 中的域名会被跳过；
+    excluded 为事先排除的自定义DNS域名数，仅用于注释；sort_key 为 domains 使用的排序键，其他规则按同样的顺序输出；
+    notes 为附加在头部的说明
+    """
+    custom_domain_dns = custom_domain_dns or {}
+    pruned = pruned or set()
+
+    # 添加头部注释
+    yield f"# AdGuard Home DNS 分流配置 - {text.title}"
+    yield f"# {text.description}"
+    for note in notes:
+        yield f"# {note}"
+    if custom_domain_dns:
+        yield "# 包含自定义域名DNS规则"
+    yield ""
+
+    # 添加默认上游DNS服务器
+    yield f"# 默认上游DNS服务器（{text.default_label}）"
+    yield from default_upstreams
+    yield ""
+
+    # 先添加自定义域名DNS规则（优先级最高），上游相同的相邻规则在分组模式下合并为一行
+    if custom_domain_dns:
+        yield SEPARATOR
+        yield f"# 自定义域名DNS规则（共 {len(custom_domain_dns)} 个域名）"
+        yield "# 这些规则优先级最高，会覆盖下面的国内/国外规则"
+        yield SEPARATOR
+        items = [(domain, ' '.join(custom_domain_dns[domain])) for domain in sorted(custom_domain_dns, key=sort_key)]
+        for dns_string, group in groupby(items, key=lambda item: item[1]):
+            yield from rule_lines((domain for domain, _ in group), dns_string, grouped, max_line_length)
+        yield ""
+
+    # 添加本模式的域名规则，跳过被上级域名覆盖的子域名
+    yield SEPARATOR
+    yield f"# {text.section_label}域名规则（共 {len(domains) - len(pruned)} 个域名）"
+    if excluded:
+        yield f"# 已排除 {excluded} 个自定义DNS域名"
+    if pruned:
+        yield f"# 已移除 {len(pruned)} 个被上级域名覆盖的子域名"
+    yield SEPARATOR
+    selected = (domain for domain in domains if domain not in pruned)
+    yield from rule_lines(selected, ' '.join(upstreams), grouped, max_line_length)
+
+    # 嵌套在本模式或自定义规则之下的另一类域名，需要显式指定上游才能生效
+    if overrides:
+        yield ""
+        yield SEPARATOR
+        yield f"# {text.override_label}域名例外规则（共 {len(overrides)} 个域名）"
+        yield f"# 这些域名是上面规则的子域名，按最具体者优先走{text.override_label}DNS"
+        yield SEPARATOR
+        yield from rule_lines(sorted(overrides, key=sort_key), ' '.join(other_upstreams), grouped, max_line_length)
+
+class AtomicWriter:
+    """原子写入文件：内容先写入同目录下的临时文件并计算 sha256，
+    关闭时只有内容与现有文件不同才替换目标文件，否则保留原文件（修改时间也不变）；
+    替换前调用 on_change(旧文件路径或 None, 新内容临时路径, 旧 sha256, 新 sha256)
+    """
+
+    def __init__(self, file_path: str, on_change: Optional[Callable[[Optional[str], str, Optional[str], str], None]] = None):
+        self.file_path = file_path
+        self.on_change = on_change
+        self.tmp_path = file_path + '.tmp'
+        self.sha256 = None
+        self.size = 0
+        self.changed = False
+        self._hash = hashlib.sha256()
+        self._pending: List[str] = []
+        self._pending_size = 0
+        self._file = None
+
+    def __enter__(self) -> 'AtomicWriter':
+        self._file = open(self.tmp_path, 'wb')
+        return self
+
+    def write(self, text: str) -> None:
+        # 攒够一批再编码、计算哈希并写入，避免逐行调用的开销
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= WRITE_BUFFER_SIZE:
+            self._flush()
+
+    def write_bytes(self, data: bytes) -> None:
+        """写入二进制内容（例如索引文件）"""
+        self._flush()
+        self._write(data)
+
+    def _flush(self) -> None:
+        if self._pending:
+            data = ''.join(self._pending).encode('utf-8')
+            self._pending, self._pending_size = [], 0
+            self._write(data)
+
+    def _write(self, data: bytes) -> None:
+        self._hash.update(data)
+        self.size += len(data)
+        self._file.write(data)
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        try:
+            if exc_type is None:
+                self._flush()
+        finally:
+            self._file.close()
+        if exc_type is not None:
+            os.remove(self.tmp_path)
+            return False
+        self.sha256 = self._hash.hexdigest()
+        old_sha256 = file_sha256(self.file_path) if os.path.exists(self.file_path) else None
+        if old_sha256 == self.sha256:
+            os.remove(self.tmp_path)
+            logger.info(f"{self.file_path} 内容未变化，跳过写入")
+            return False
+        # 替换前新旧内容都在磁盘上，可以在此比较生成增量
+        if self.on_change:
+            self.on_change(self.file_path if old_sha256 else None, self.tmp_path, old_sha256, self.sha256)
+        os.replace(self.tmp_path, self.file_path)
+        self.changed = True
+        return False
+
+def file_sha256(file_path: str) -> str:
+    """计算文件内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(WRITE_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _compress_file(source_path: str, output_path: str, fmt: str) -> None:
+    """以确定性的方式压缩文件：gzip 头部不写文件名和时间"""
+    with open(source_path, 'rb') as src, open(output_path, 'wb') as raw:
+        if fmt == 'gz':
+            compressed = gzip.GzipFile(filename='', mode='wb', fileobj=raw, compresslevel=9, mtime=0)
+        elif fmt == 'xz':
+            compressed = lzma.LZMAFile(raw, 'wb', format=lzma.FORMAT_XZ, preset=6)
+        else:
+            raise ValueError(f"不支持的压缩格式: {fmt}")
+        with compressed:
+            shutil.copyfileobj(src, compressed, WRITE_BUFFER_SIZE)
+
+def write_compressed(file_path: str, fmt: str, source_changed: bool = True) -> Dict[str, Any]:
+    """生成产物的压缩版本 <file_path>.<fmt>，返回清单条目（含压缩率）和耗时
+
+    原文件未变化且压缩文件已存在时直接复用，耗时记为 0
+    """
+    output_path = f"{file_path}.{fmt}"
+    start = time.perf_counter()
+    if source_changed or not os.path.exists(output_path):
+        tmp_path = output_path + '.tmp'
+        _compress_file(file_path, tmp_path, fmt)
+        sha256 = file_sha256(tmp_path)
+        if os.path.exists(output_path) and file_sha256(output_path) == sha256:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, output_path)
+        seconds = time.perf_counter() - start
+    else:
+        sha256 = file_sha256(output_path)
+        seconds = 0.0
+    size = os.path.getsize(output_path)
+    original = os.path.getsize(file_path)
+    return {'sha256': sha256, 'bytes': size, 'ratio': round(size / original, 4) if original else 1.0, 'seconds': seconds}
+
+def write_lines(f, lines: Iterable[str]) -> None:
+    """按行写入，行之间以换行分隔（末尾不加换行，与 '\\n'.join 的结果相同）"""
+    first = True
+    for line in lines:
+        if not first:
+            f.write('\n')
+        f.write(line)
+        first = False
+
+def write_artifact(file_path: str, lines: Iterable[str], trailing_newline: bool = True,
+                   recorder: Optional[DeltaRecorder] = None) -> Dict[str, Any]:
+    """原子写入一个产物文件，返回它在清单中的条目（sha256、字节数）
+
+    提供 recorder 时，内容变化的文件会在替换前记录与旧内容之间的增量
+    """
+    name = os.path.basename(file_path)
+    on_change = (lambda *args: recorder.record(name, *args)) if recorder else None
+    with AtomicWriter(file_path, on_change) as f:
+        if trailing_newline:
+            for line in lines:
+                f.write(line)
+                f.write('\n')
+        else:
+            write_lines(f, lines)
+    return {'sha256': f.sha256, 'bytes': f.size, 'changed': f.changed}
+
+def iter_prune_report(prune_report: Dict[str, List[str]]) -> Iterator[str]:
+    """逐行生成冗余子域名剔除报告"""
+    yield "# 被上级域名覆盖而剔除的子域名规则"
+    for name, pruned in prune_report.items():
+        yield f"# {name}: 剔除 {len(pruned)} 个"
+    for name, pruned in prune_report.items():
+        yield ""
+        yield f"[{name}]"
+        yield from pruned
+
+def generation_id(files: Dict[str, Dict[str, Any]]) -> str:
+    """由各产物文件名和内容哈希计算的批次标识，内容不变时保持不变"""
+    digest = hashlib.sha256()
+    for name, entry in sorted(files.items()):
+        digest.update(f"{name}\t{entry['sha256']}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def write_artifacts(output_dir: str, cn_domains: Set[str], foreign_domains: Set[str], cn_dns: List[str], foreign_dns: List[str],
+                    custom_domain_dns: Dict[str, List[str]], whitelist_overrides: Optional[Set[str]] = None,
+                    blacklist_overrides: Optional[Set[str]] = None, prune: bool = True, grouped: bool = False,
+                    max_line_length: int = upstream_format.DEFAULT_MAX_LINE_LENGTH,
+                    reports: Optional[Dict[str, Iterable[str]]] = None, delta_keep: int = DEFAULT_DELTA_KEEP,
+                    sort_order: str = DEFAULT_SORT, compression: Iterable[str] = DEFAULT_COMPRESSION,
+                    metrics: RunMetrics = DISABLED, hot_names: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """写入全部产物和 manifest.json，返回清单内容
+
+    cn_domains/foreign_domains 应已去掉与自定义规则相同的域名（见 conflicts.resolve_conflicts）；
+    reports 为额外的报告文件（文件名 -> 行），例如冲突报告。
+    所有文件都是原子写入，内容不变时不会改动；输出不含时间戳，相同输入总是得到相同的字节。
+    批次变化时生成相对上一批次的增量文件，清单中保留最近 delta_keep 个增量。
+    sort_order 见 SORT_KEYS；compression 为需要生成的预压缩格式，
+    各文件的压缩率写入清单；prune、emit、compress 各阶段的耗时等运行指标记录到 metrics。
+    提供 hot_names（查询日志中的域名 -> 查询次数）时另外输出只含命中规则的精简配置（见 hot_set），覆盖率和节省的大小写入清单
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    previous_manifest = read_manifest(output_dir)
+    recorder = DeltaRecorder(previous_manifest)
+    custom_domain_dns = custom_domain_dns or {}
+    whitelist_overrides = whitelist_overrides or set()
+    blacklist_overrides = blacklist_overrides or set()
+
+    # 每个集合只排序一次，配置文件和域名列表共用
+    sort_key = SORT_KEYS[sort_order]
+    cn_sorted = sorted(cn_domains, key=sort_key)
+    foreign_sorted = sorted(foreign_domains, key=sort_key)
+
+    cn_pruned, foreign_pruned = set(), set()
+    if prune:
+        with metrics.stage('prune') as record:
+            cn_pruned = find_pruned(cn_domains, cn_dns, foreign_dns, custom_domain_dns, whitelist_overrides)
+            foreign_pruned = find_pruned(foreign_domains, foreign_dns, cn_dns, custom_domain_dns, blacklist_overrides)
+            record['domains'] = len(cn_pruned) + len(foreign_pruned)
+        logger.info(f"国内域名规则中移除了 {len(cn_pruned)} 个被上级域名覆盖的子域名")
+        logger.info(f"国外域名规则中移除了 {len(foreign_pruned)} 个被上级域名覆盖的子域名")
+
+    files: Dict[str, Dict[str, Any]] = {}
+    hot_summary: Dict[str, Any] = {}
+    mode_domains = {'whitelist_mode.txt': cn_domains, 'blacklist_mode.txt': foreign_domains}
+    with metrics.stage('emit') as record:
+        modes = [
+            ('whitelist_mode.txt', dict(text=WHITELIST, domains=cn_sorted, upstreams=cn_dns, default_upstreams=foreign_dns,
+                                        other_upstreams=foreign_dns, custom_domain_dns=custom_domain_dns,
+                                        overrides=whitelist_overrides, pruned=cn_pruned, max_line_length=max_line_length,
+                                        sort_key=sort_key)),
+            ('blacklist_mode.txt', dict(text=BLACKLIST, domains=foreign_sorted, upstreams=foreign_dns, default_upstreams=cn_dns,
+                                        other_upstreams=cn_dns, custom_domain_dns=custom_domain_dns,
+                                        overrides=blacklist_overrides, pruned=foreign_pruned, max_line_length=max_line_length,
+                                        sort_key=sort_key)),
+        ]
+        for name, kwargs in modes:
+            logger.info(f"生成 {name} ...")
+            mode_grouped = grouped
+            lines: Iterable[str] = iter_mode_config(**kwargs)
+            if grouped:
+                # 两份配置各生成一次，供两项校验和写入共用
+                # 分组输出先与逐域名输出的规则序列逐条比对，序列不同时再比较路由，路由也不一致时改为输出逐域名配置
+                flat_lines = list(lines)
+                lines = list(iter_mode_config(grouped=True, **kwargs))
+                if (not upstream_format.same_rule_sequence(flat_lines, lines)
+                        and not upstream_format.routes_equivalent(flat_lines, lines)):
+                    logger.error(f"{name} 的分组配置与逐域名配置的路由不一致，改为输出逐域名配置")
+                    mode_grouped = False
+                    lines = flat_lines
+                del flat_lines
+            entry = write_artifact(os.path.join(output_dir, name), lines, trailing_newline=False, recorder=recorder)
+            entry['rules'] = len(kwargs['domains']) - len(kwargs['pruned']) + len(custom_domain_dns) + len(kwargs['overrides'])
+            entry['grouped'] = mode_grouped
+            files[name] = entry
+
+            if hot_names is not None:
+                matched, hits = find_hot_rules(hot_names, mode_domains[name], kwargs['pruned'], kwargs['overrides'],
+                                               custom_domain_dns)
+                hot_kwargs = dict(kwargs, domains=[domain for domain in kwargs['domains'] if domain in matched],
+                                  overrides={domain for domain in kwargs['overrides'] if domain in matched}, pruned=set(),
+                                  notes=["精简配置：只包含查询日志中实际命中的规则和全部自定义规则，其他域名走默认上游"])
+                hot_name = hot_set.HOT_FILES[name]
+                hot_entry = write_artifact(os.path.join(output_dir, hot_name), iter_mode_config(grouped=mode_grouped, **hot_kwargs),
+                                           trailing_newline=False)
+                hot_entry['rules'] = len(hot_kwargs['domains']) + len(custom_domain_dns) + len(hot_kwargs['overrides'])
+                hot_entry['grouped'] = mode_grouped
+                files[hot_name] = hot_entry
+                queries = sum(hot_names.values())
+                hot_summary[hot_name] = {
+                    'rules': hot_entry['rules'],
+                    'full_rules': entry['rules'],
+                    'bytes': hot_entry['bytes'],
+                    'full_bytes': entry['bytes'],
+                    'saved_bytes': entry['bytes'] - hot_entry['bytes'],
+                    'query_hit_rate': round(hits / queries, 4) if queries else 0.0,
+                }
+                logger.info(f"{hot_name}：保留 {hot_entry['rules']}/{entry['rules']} 条规则，"
+                            f"{entry['bytes']} -> {hot_entry['bytes']} 字节（节省 {1 - hot_entry['bytes'] / max(entry['bytes'], 1):.1%}），"
+                            f"查询日志中 {hot_summary[hot_name]['query_hit_rate']:.1%} 的查询命中规则")
+
+        # 保存域名列表（用于调试）
+        files['cn_domains.txt'] = dict(write_artifact(os.path.join(output_dir, 'cn_domains.txt'), cn_sorted, recorder=recorder),
+                                       domains=len(cn_sorted))
+        files['foreign_domains.txt'] = dict(write_artifact(os.path.join(output_dir, 'foreign_domains.txt'), foreign_sorted,
+                                                           recorder=recorder), domains=len(foreign_sorted))
+
+        # 保存自定义域名DNS列表（用于调试）
+        if custom_domain_dns:
+            lines = (f"{domain}: {', '.join(dns_list)}" for domain, dns_list in sorted(custom_domain_dns.items()))
+            files['custom_domain_dns_debug.txt'] = dict(write_artifact(os.path.join(output_dir, 'custom_domain_dns_debug.txt'), lines),
+                                                        domains=len(custom_domain_dns))
+
+        # 保存二进制路由索引，供查询工具直接 mmap 使用
+        rules, groups = domain_index.routing_rules(cn_domains, foreign_domains, cn_dns, foreign_dns, custom_domain_dns)
+        with AtomicWriter(os.path.join(output_dir, domain_index.INDEX_NAME)) as f:
+            for chunk in domain_index.iter_index_bytes(rules, groups, whitelist_default=1, blacklist_default=0):
+                f.write_bytes(chunk)
+        files[domain_index.INDEX_NAME] = {'sha256': f.sha256, 'bytes': f.size, 'changed': f.changed,
+                                          'entries': len(rules), 'groups': len(groups)}
+        del rules
+
+        # 保存冗余子域名剔除报告及其他报告
+        if prune:
+            prune_report = {'cn_domains': sorted(cn_pruned), 'foreign_domains': sorted(foreign_pruned)}
+            files['prune_report.txt'] = write_artifact(os.path.join(output_dir, 'prune_report.txt'), iter_prune_report(prune_report))
+        for name, lines in (reports or {}).items():
+            files[name] = write_artifact(os.path.join(output_dir, name), lines)
+        record['bytes'] = sum(entry['bytes'] for entry in files.values())
+        record['domains'] = len(cn_sorted) + len(foreign_sorted)
+
+    if hot_names is None:
+        remove_hot_files(output_dir)
+
+    # 生成预压缩版本，压缩率记入清单，耗时记入运行指标
+    for name in COMPRESSED_FILES + tuple(name for name in hot_set.HOT_FILES.values() if name in files):
+        entry = files[name]
+        variants = {}
+        for fmt in compression:
+            with metrics.stage('compress', f"{name}.{fmt}") as record:
+                variant = write_compressed(os.path.join(output_dir, name), fmt, entry['changed'])
+                record.update(bytes=variant['bytes'], ratio=variant['ratio'], reused=not variant.pop('seconds'))
+            variants[fmt] = variant
+            logger.info(f"{name}.{fmt}：{entry['bytes']} -> {variant['bytes']} 字节（{variant['ratio']:.1%}）")
+        if variants:
+            entry['compressed'] = variants
+
+    changed = [name for name, entry in files.items() if entry.pop('changed')]
+    manifest = {
+        'generation': generation_id(files),
+        'counts': {
+            'cn_domains': len(cn_sorted),
+            'foreign_domains': len(foreign_sorted),
+            'custom_domain_dns': len(custom_domain_dns),
+            'cn_pruned': len(cn_pruned),
+            'foreign_pruned': len(foreign_pruned),
+            'whitelist_overrides': len(whitelist_overrides),
+            'blacklist_overrides': len(blacklist_overrides),
+        },
+        'sort': sort_order,
+        'files': files,
+    }
+    if hot_names is not None:
+        manifest['hot_set'] = dict(names=len(hot_names), queries=sum(hot_names.values()), files=hot_summary)
+    # 增量只覆盖配置文件和域名列表（delta.DELTA_FILES），报告文件不需要下发
+    delta_entry = recorder.write(output_dir, manifest['generation'])
+    generation_changed = previous_manifest is not None and previous_manifest.get('generation') != manifest['generation']
+    reset = generation_changed and delta_entry is None
+    manifest['deltas'] = update_delta_index(output_dir, (previous_manifest or {}).get('deltas', []), delta_entry, delta_keep, reset)
+    write_manifest(os.path.join(output_dir, MANIFEST_NAME), manifest)
+    if changed:
+        logger.info(f"产物批次 {manifest['generation'][:12]}，内容有变化的文件: {', '.join(changed)}")
+    else:
+        logger.info(f"产物批次 {manifest['generation'][:12]}，所有文件内容均未变化")
+    return manifest
+
+def remove_hot_files(output_dir: str) -> None:
+    """未启用精简配置时删除以前生成的精简配置及其压缩版本，避免节点继续使用过期的内容"""
+    for name in hot_set.HOT_FILES.values():
+        for file_name in (name,) + tuple(f"{name}.{fmt}" for fmt in DEFAULT_COMPRESSION):
+            path = os.path.join(output_dir, file_name)
+            if os.path.exists(path):
+                os.remove(path)
+                logger.info(f"已删除过期的精简配置 {file_name}")
+
+def write_manifest(file_path: str, manifest: Dict[str, Any]) -> None:
+    """原子写入 manifest.json，键排序、不含时间戳，内容不变时不改动文件"""
+    write_artifact(file_path, [json.dumps(manifest, indent=2, sort_keys=True, ensure_ascii=False)])
+
+def read_manifest(output_dir: str) -> Optional[Dict[str, Any]]:
+    """读取产物目录中的 manifest.json，不存在或已损坏时返回 None"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
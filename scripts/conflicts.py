@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+国内/国外/自定义域名规则冲突处理
+基于反转标签后缀树，一次遍历找出三组规则之间的所有重叠：
+同一域名同时出现在多个列表中，或一个列表中的域名是另一个列表中域名的上级/子域名
+
+处理策略（最具体者优先）：
+1. 自定义DNS规则（custom_domain_dns.txt）与国内/国外域名相同时，以自定义规则为准；
+2. 同一域名同时出现在国内和国外列表中时，按 tie_breaker 决定归属（默认国外，
+   因为国外域名被国内DNS解析可能得到污染结果，而国内域名走国外DNS通常只是不够快）；
+3. 不同列表的规则互为上下级时，更具体（层级更深）的规则生效：
+   例如国内列表有 example.com、国外列表有 api.example.com，则 api.example.com 及其子域名走国外DNS，
+   example.com 的其余子域名走国内DNS
+"""
+
+import heapq
+import logging
+from collections import Counter
+from itertools import repeat
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set
+
+from domain_set import DomainSet, decode_key, iter_with_parent
+from domain_trie import reversed_labels
+
+logger = logging.getLogger('conflicts')
+
+CN = 'cn'
+FOREIGN = 'foreign'
+CUSTOM = 'custom'
+
+LIST_NAMES = {CN: '国内', FOREIGN: '国外', CUSTOM: '自定义DNS'}
+
+class Conflict(NamedTuple):
+    """一条冲突记录：domain 属于 source 列表，与 other 列表中的 other_domain 重叠，最终由 winner 生效"""
+    kind: str
+    domain: str
+    source: str
+    other_domain: str
+    other: str
+    winner: str
+
+class Resolution(NamedTuple):
+    """冲突处理结果
+
+    cn_domains/foreign_domains 为处理后的国内/国外域名集合；
+    whitelist_overrides 为白名单模式下需要显式走国外DNS的域名（嵌套在国内或自定义规则之下的国外域名），
+    blacklist_overrides 为黑名单模式下需要显式走国内DNS的域名
+    """
+    cn_domains: DomainSet
+    foreign_domains: DomainSet
+    whitelist_overrides: Set[str]
+    blacklist_overrides: Set[str]
+    conflicts: List[Conflict]
+
+def resolve_conflicts(cn_domains: Iterable[str], foreign_domains: Iterable[str], custom_domains: Iterable[str] = (),
+                      tie_breaker: str = FOREIGN) -> Resolution:
+    """按最具体者优先的策略处理三组规则之间的冲突
+
+    国内/国外域名以 DomainSet 处理和返回，不会展开成普通集合
+    """
+    if tie_breaker not in (CN, FOREIGN):
+        raise ValueError(f"未知的冲突归属: {tie_breaker}")
+    cn_domains, foreign_domains, custom_domains = DomainSet(cn_domains), DomainSet(foreign_domains), DomainSet(custom_domains)
+    conflicts: List[Conflict] = []
+
+    # 同一域名出现在多个列表中
+    for domain in custom_domains:
+        for name, domains in ((CN, cn_domains), (FOREIGN, foreign_domains)):
+            if domain in domains:
+                conflicts.append(Conflict('exact', domain, name, domain, CUSTOM, CUSTOM))
+    cn_domains -= custom_domains
+    foreign_domains -= custom_domains
+
+    both = cn_domains & foreign_domains
+    loser = CN if tie_breaker == FOREIGN else FOREIGN
+    for domain in both:
+        conflicts.append(Conflict('exact', domain, loser, domain, tie_breaker, tie_breaker))
+    if tie_breaker == FOREIGN:
+        cn_domains -= both
+    else:
+        foreign_domains -= both
+
+    # 三组域名此时互不重叠，按反转标签归并后顺序扫描，每个域名的上级都已扫描过，最近的上级即可判断嵌套冲突
+    labelled = heapq.merge(zip(cn_domains.iter_keys(), repeat(CN)), zip(foreign_domains.iter_keys(), repeat(FOREIGN)),
+                           zip(custom_domains.iter_keys(), repeat(CUSTOM)))
+    whitelist_overrides: Set[str] = set()
+    blacklist_overrides: Set[str] = set()
+    for key, name, ancestor in iter_with_parent(labelled):
+        # 上级属于同一列表时没有冲突，也不需要例外规则
+        if ancestor is None or ancestor[1] == name:
+            continue
+        parent_key, parent_name = ancestor
+        domain = decode_key(key)
+        conflicts.append(Conflict('nested', domain, name, decode_key(parent_key), parent_name, name))
+        # 白名单模式只输出国内和自定义规则，默认走国外DNS：
+        # 上级规则不走国外DNS时，国外域名必须显式输出；黑名单模式同理
+        if name == FOREIGN and parent_name != FOREIGN:
+            whitelist_overrides.add(domain)
+        elif name == CN and parent_name != CN:
+            blacklist_overrides.add(domain)
+
+    conflicts.sort(key=lambda c: (c.kind, reversed_labels(c.domain), c.source))
+    return Resolution(cn_domains, foreign_domains, whitelist_overrides, blacklist_overrides, conflicts)
+
+def summarize(conflicts: List[Conflict]) -> Dict[str, int]:
+    """按冲突类型和涉及的列表统计冲突数量"""
+    counter = Counter(f"{c.kind}:{c.source}/{c.other}" for c in conflicts)
+    return dict(sorted(counter.items()))
+
+def iter_conflict_report(resolution: Resolution, tie_breaker: Optional[str] = None) -> Iterator[str]:
+    """逐行生成冲突报告"""
+    yield "# 国内/国外/自定义域名规则冲突报告"
+    yield ("# 策略：自定义规则优先；同一域名同时出现在国内和国外列表时归属"
+           f"{LIST_NAMES[tie_breaker or FOREIGN]}；互为上下级时更具体的规则生效")
+    for key, count in summarize(resolution.conflicts).items():
+        yield f"# {key}: {count}"
+    yield f"# 白名单模式显式走国外DNS的域名: {len(resolution.whitelist_overrides)}"
+    yield f"# 黑名单模式显式走国内DNS的域名: {len(resolution.blacklist_overrides)}"
+    yield ""
+    for c in resolution.conflicts:
+        if c.kind == 'exact':
+            yield f"exact\t{c.domain}\t{c.source}+{c.other}\t-> {c.winner}"
+        else:
+            yield f"nested\t{c.domain}({c.source})\tunder {c.other_domain}({c.other})\t-> {c.winner}"
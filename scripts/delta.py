@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+相邻批次之间的增量文件生成
+产物内容变化时，在新文件替换旧文件之前比较两者的行，记录增删的行（即增删的域名规则），
+写入 dist/deltas/<起始批次>.delta；远程节点用 apply_delta.py 从基础版本依次应用即可得到最新文件
+
+行比较采用 patience diff：两边都只出现一次的行（几乎所有域名规则行）作为锚点，
+取锚点的最长递增子序列确定对应关系，锚点之间的少量剩余行再用 difflib 比较，整体接近线性
+"""
+
+import os
+import bisect
+import difflib
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from apply_delta import DELTA_HEADER
+
+logger = logging.getLogger('delta')
+
+DELTA_DIR = 'deltas'
+DELTA_FILES = ('whitelist_mode.txt', 'blacklist_mode.txt', 'cn_domains.txt', 'foreign_domains.txt')
+DEFAULT_DELTA_KEEP = 30
+
+Opcode = Tuple[int, int, int, int]
+
+def _unique_anchors(a: List[str], b: List[str], a_lo: int, a_hi: int, b_lo: int, b_hi: int) -> List[Tuple[int, int]]:
+    """返回两段中都只出现一次的行的位置对，按最长递增子序列筛选，保证对应关系不交叉"""
+    a_pos: Dict[str, int] = {}
+    for i in range(a_lo, a_hi):
+        a_pos[a[i]] = -1 if a[i] in a_pos else i
+    b_pos: Dict[str, int] = {}
+    for j in range(b_lo, b_hi):
+        line = b[j]
+        if a_pos.get(line, -1) >= 0:
+            b_pos[line] = -1 if line in b_pos else j
+    pairs = sorted((a_pos[line], j) for line, j in b_pos.items() if j >= 0)
+    if not pairs:
+        return []
+
+    # 按 b 中位置求最长递增子序列
+    tails: List[int] = []
+    tail_index: List[int] = []
+    previous: List[int] = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[pos] = j
+            tail_index[pos] = k
+        previous[k] = tail_index[pos - 1] if pos else -1
+    result = []
+    k = tail_index[-1]
+    while k >= 0:
+        result.append(pairs[k])
+        k = previous[k]
+    return result[::-1]
+
+def diff_lines(a: List[str], b: List[str]) -> List[Opcode]:
+    """比较两组行，返回不相同的区段 (a起, a止, b起, b止)"""
+    opcodes: List[Opcode] = []
+
+    def gap(a_lo: int, a_hi: int, b_lo: int, b_hi: int) -> None:
+        # 锚点之间的剩余行通常很少，直接用 difflib 比较
+        if a_lo == a_hi and b_lo == b_hi:
+            return
+        if a_lo == a_hi or b_lo == b_hi:
+            opcodes.append((a_lo, a_hi, b_lo, b_hi))
+            return
+        matcher = difflib.SequenceMatcher(None, a[a_lo:a_hi], b[b_lo:b_hi], autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag != 'equal':
+                opcodes.append((a_lo + i1, a_lo + i2, b_lo + j1, b_lo + j2))
+
+    a_lo, b_lo = 0, 0
+    for i, j in _unique_anchors(a, b, 0, len(a), 0, len(b)):
+        gap(a_lo, i, b_lo, j)
+        a_lo, b_lo = i + 1, j + 1
+    gap(a_lo, len(a), b_lo, len(b))
+
+    # 合并相邻区段
+    merged: List[Opcode] = []
+    for op in opcodes:
+        if merged and merged[-1][1] == op[0] and merged[-1][3] == op[2]:
+            merged[-1] = (merged[-1][0], op[1], merged[-1][2], op[3])
+        else:
+            merged.append(op)
+    return merged
+
+def iter_file_delta(name: str, base_sha256: str, target_sha256: str, a: List[str], b: List[str]) -> Iterator[str]:
+    """逐行生成单个文件的增量"""
+    opcodes = diff_lines(a, b)
+    yield f"file {name} {base_sha256} {target_sha256}"
+    for a1, a2, b1, b2 in opcodes:
+        yield f"@ {a1} {a2 - a1} {b2 - b1}"
+        for line in a[a1:a2]:
+            yield f"-{line}"
+        for line in b[b1:b2]:
+            yield f"+{line}"
+
+def read_lines(file_path: str) -> List[str]:
+    with open(file_path, 'r', encoding='utf-8', newline='\n') as f:
+        return f.read().split('\n')
+
+class DeltaRecorder:
+    """在产物替换前记录新旧内容之间的增量"""
+
+    def __init__(self, previous_manifest: Optional[Dict[str, Any]] = None):
+        self.previous_manifest = previous_manifest
+        self.files: Dict[str, List[str]] = {}
+        self.complete = previous_manifest is not None
+
+    def record(self, name: str, old_path: Optional[str], new_path: str, old_sha256: Optional[str], new_sha256: str) -> None:
+        """记录一个产物文件的增量
+
+        旧文件不存在（old_path 为 None）或与上一批次清单不一致时，本批次无法生成可用的增量
+        """
+        if old_path is None:
+            logger.info(f"{name} 是新增的产物，本批次不生成增量")
+            self.complete = False
+            return
+        published = (self.previous_manifest or {}).get('files', {}).get(name, {}).get('sha256')
+        if published != old_sha256:
+            logger.info(f"{name} 与上一批次清单不一致，本批次不生成增量")
+            self.complete = False
+            return
+        self.files[name] = list(iter_file_delta(name, old_sha256, new_sha256, read_lines(old_path), read_lines(new_path)))
+
+    def write(self, output_dir: str, to_generation: str) -> Optional[Dict[str, Any]]:
+        """写入增量文件，返回清单中的增量条目；没有上一批次、批次未变化或无法生成增量时返回 None
+
+        只有报告文件变化时也会写出不含文件改动的增量，保证增量链能连续到达最新批次
+        """
+        if not self.complete:
+            return None
+        from_generation = self.previous_manifest.get('generation')
+        if not from_generation or from_generation == to_generation:
+            return None
+        delta_dir = os.path.join(output_dir, DELTA_DIR)
+        os.makedirs(delta_dir, exist_ok=True)
+        relative_path = f"{DELTA_DIR}/{from_generation}.delta"
+        file_path = os.path.join(output_dir, relative_path)
+        with open(file_path + '.tmp', 'w', encoding='utf-8', newline='\n') as f:
+            f.write(f"{DELTA_HEADER}\nfrom {from_generation}\nto {to_generation}\n")
+            for name in sorted(self.files):
+                for line in self.files[name]:
+                    f.write(f"{line}\n")
+            f.write("end\n")
+        os.replace(file_path + '.tmp', file_path)
+
+        changes = sum(1 for lines in self.files.values() for line in lines if line[:1] in ('-', '+'))
+        size = os.path.getsize(file_path)
+        logger.info(f"生成增量 {relative_path}：{changes} 行改动，{size} 字节")
+        return {'from': from_generation, 'to': to_generation, 'file': relative_path, 'bytes': size, 'changed_lines': changes}
+
+def update_delta_index(output_dir: str, previous: List[Dict[str, Any]], entry: Optional[Dict[str, Any]],
+                       keep: int = DEFAULT_DELTA_KEEP, reset: bool = False) -> List[Dict[str, Any]]:
+    """更新清单中的增量列表（从旧到新），只保留最近 keep 个，删除过期的增量文件
+
+    reset 为 True 表示本批次有变化但无法生成增量，旧的增量链已无法到达最新批次，全部删除
+    """
+    deltas = [] if reset else [d for d in previous if os.path.exists(os.path.join(output_dir, d.get('file', '')))]
+    if entry:
+        deltas = [d for d in deltas if d['from'] != entry['from']] + [entry]
+    retained = deltas[-keep:] if keep > 0 else []
+    retained_files = {d['file'] for d in retained}
+    for d in previous + deltas:
+        file_path = os.path.join(output_dir, d.get('file', ''))
+        if d.get('file') and d['file'] not in retained_files and os.path.isfile(file_path):
+            os.remove(file_path)
+            logger.info(f"删除过期的增量 {d['file']}")
+    return retained
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+二进制域名路由索引
+将最终的路由表（国内/国外/自定义DNS规则及各自的上游）写成可以直接 mmap 的紧凑二进制文件，
+查询时不需要解析：在映射的字节上对标签反转后的域名做二分查找，沿上级域名逐级查找最近的规则
+
+文件布局（小端序）：
+    文件头     magic(8) 版本(u16) 条目数(u32) 上游组数(u32) 白名单默认组(u16) 黑名单默认组(u16)
+    条目表     每条 8 字节：域名偏移(u32) 域名长度(u16) 上游组(u16)，按反转域名的字节序排列
+    上游组表   每组 8 字节：偏移(u32) 长度(u16) 保留(u16)
+    域名区     反转后的域名（com.example.www），UTF-8 编码依次拼接
+    上游区     各组上游DNS（空格分隔），UTF-8 编码依次拼接
+偏移均为相对文件开头的字节数
+"""
+
+import mmap
+import struct
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from domain_trie import parent_domains, reversed_name
+
+logger = logging.getLogger('domain_index')
+
+MAGIC = b'ADGIDX\x00\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sHIIHH')
+ENTRY = struct.Struct('<IHH')
+GROUP = struct.Struct('<IHH')
+
+INDEX_NAME = 'domain_index.bin'
+
+WHITELIST = 'whitelist'
+BLACKLIST = 'blacklist'
+
+def iter_index_bytes(rules: Iterable[Tuple[str, int]], groups: List[str], whitelist_default: int,
+                     blacklist_default: int) -> Iterator[bytes]:
+    """逐段生成索引文件内容
+
+    rules 为 (域名, 上游组序号)，groups 为各组的上游DNS（空格分隔），
+    whitelist_default/blacklist_default 为两种模式下未命中任何规则时使用的上游组
+    """
+    names = sorted((reversed_name(domain).encode('utf-8'), group) for domain, group in rules)
+    encoded_groups = [group.encode('utf-8') for group in groups]
+    entries_offset = HEADER.size
+    groups_offset = entries_offset + ENTRY.size * len(names)
+    names_offset = groups_offset + GROUP.size * len(encoded_groups)
+
+    yield HEADER.pack(MAGIC, VERSION, len(names), len(encoded_groups), whitelist_default, blacklist_default)
+    table = bytearray()
+    offset = names_offset
+    for name, group in names:
+        table += ENTRY.pack(offset, len(name), group)
+        offset += len(name)
+    for group in encoded_groups:
+        table += GROUP.pack(offset, len(group), 0)
+        offset += len(group)
+    yield bytes(table)
+    yield b''.join(name for name, _ in names)
+    yield b''.join(encoded_groups)
+
+class DomainIndex:
+    """以 mmap 方式打开的二进制路由索引，打开时只读取文件头"""
+
+    def __init__(self, file_path: str):
+        with open(file_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self.group_count, whitelist_default, blacklist_default = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{file_path} 不是受支持的域名索引文件")
+        self.defaults = {WHITELIST: whitelist_default, BLACKLIST: blacklist_default}
+        self._groups_offset = HEADER.size + ENTRY.size * self.count
+
+    def __enter__(self) -> 'DomainIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.close()
+        return False
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self._map.close()
+
+    def _name(self, i: int) -> bytes:
+        offset, length, _ = ENTRY.unpack_from(self._map, HEADER.size + ENTRY.size * i)
+        return self._map[offset:offset + length]
+
+    def _search(self, key: bytes, hi: int) -> Tuple[int, bool]:
+        """在前 hi 个条目中二分查找，返回 (插入位置, 是否命中)"""
+        lo = 0
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name = self._name(mid)
+            if name < key:
+                lo = mid + 1
+            elif name > key:
+                hi = mid
+            else:
+                return mid, True
+        return lo, False
+
+    def group(self, group_id: int) -> str:
+        """返回上游组对应的上游DNS（空格分隔）"""
+        offset, length, _ = GROUP.unpack_from(self._map, self._groups_offset + GROUP.size * group_id)
+        return self._map[offset:offset + length].decode('utf-8')
+
+    def groups(self) -> List[str]:
+        return [self.group(i) for i in range(self.group_count)]
+
+    def iter_rules(self) -> Iterator[Tuple[str, int]]:
+        """按索引顺序产出全部规则 (域名, 上游组)"""
+        for i in range(self.count):
+            offset, length, group = ENTRY.unpack_from(self._map, HEADER.size + ENTRY.size * i)
+            yield reversed_name(self._map[offset:offset + length].decode('utf-8')), group
+
+    def nearest(self, domain: str) -> Optional[Tuple[str, int]]:
+        """返回覆盖该域名的最具体规则 (规则域名, 上游组)，不存在时返回 None"""
+        domain = domain.strip().rstrip('.').lower()
+        hi = self.count
+        for candidate in (domain, *parent_domains(domain)):
+            # 上级域名的反转形式是子域名的前缀，排序总在其之前，查找范围可以逐级收窄
+            position, found = self._search(reversed_name(candidate).encode('utf-8'), hi)
+            if found:
+                return candidate, ENTRY.unpack_from(self._map, HEADER.size + ENTRY.size * position)[2]
+            hi = position
+        return None
+
+    def route(self, domain: str, mode: str = WHITELIST) -> Tuple[Optional[str], str]:
+        """返回 (命中的规则域名或 None, 实际使用的上游DNS)"""
+        match = self.nearest(domain)
+        if match is None:
+            return None, self.group(self.defaults[mode])
+        return match[0], self.group(match[1])
+
+def routing_rules(cn_domains: Iterable[str], foreign_domains: Iterable[str], cn_dns: List[str], foreign_dns: List[str],
+                  custom_domain_dns: Dict[str, List[str]]) -> Tuple[List[Tuple[str, int]], List[str]]:
+    """由冲突处理后的国内/国外域名和自定义DNS规则构造路由表，返回 (规则, 上游组)
+
+    上游组 0 为国内DNS，1 为国外DNS，其后为自定义规则中出现的上游组合（按字典序）；
+    国内外规则互为上下级时由最近的上级规则决定路由，与 AdGuard Home 的匹配方式一致，两种模式共用同一张表
+    """
+    groups = [' '.join(cn_dns), ' '.join(foreign_dns)]
+    custom_groups = sorted({' '.join(dns_list) for dns_list in custom_domain_dns.values()} - set(groups))
+    groups.extend(custom_groups)
+    group_ids = {group: i for i, group in reversed(list(enumerate(groups)))}
+    rules = [(domain, 0) for domain in cn_domains]
+    rules.extend((domain, 1) for domain in foreign_domains)
+    rules.extend((domain, group_ids[' '.join(dns_list)]) for domain, dns_list in custom_domain_dns.items())
+    return rules, groups
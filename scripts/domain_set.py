@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+紧凑的域名集合
+把域名按反转标签（com -> example -> www）排序后拼接存放在一个 bytes 中，另用一个 array 记录各域名的偏移，
+每个域名只占其 UTF-8 长度加 4 字节，而普通 set 中的每个 str 对象加上哈希表槽位要多占七八十字节。
+集合不可变：成员判断为二分查找，并集、差集、交集通过有序归并得到新集合，迭代时按反转标签的顺序产出域名
+
+反转标签之间用 \\x00 分隔，字节序与按标签逐级比较的顺序一致，同一域名的子域名紧跟在它之后，
+因此按顺序扫描时用一个栈就能找到每个域名在集合中最近的上级域名（见 iter_with_parent），不需要建后缀树
+"""
+
+import heapq
+import logging
+from array import array
+from collections.abc import Set as AbstractSet
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger('domain_set')
+
+SEPARATOR = b'\x00'
+
+def encode_key(domain: str) -> bytes:
+    """域名 -> 排序键（www.example.com -> com\\x00example\\x00www）"""
+    return '\x00'.join(domain.split('.')[::-1]).encode('utf-8')
+
+def decode_key(key: bytes) -> str:
+    return '.'.join(key.decode('utf-8').split('\x00')[::-1])
+
+def _unique(keys: Iterable[bytes]) -> Iterator[bytes]:
+    """去掉有序序列中相邻的重复项"""
+    previous = None
+    for key in keys:
+        if key != previous:
+            yield key
+            previous = key
+
+def iter_with_parent(entries: Iterable[Tuple[bytes, Any]]) -> Iterator[Tuple[bytes, Any, Optional[Tuple[bytes, Any]]]]:
+    """按排序键顺序扫描 (键, 值)，产出 (键, 值, 最近的上级 (键, 值) 或 None)
+
+    entries 必须按键排序且不重复；栈中始终是当前域名在已扫描条目中的上级链，
+    结果与把所有条目插入后缀树再逐个查找最近的严格上级相同
+    """
+    stack: List[Tuple[bytes, Any]] = []
+    for key, value in entries:
+        while stack and not key.startswith(stack[-1][0] + SEPARATOR):
+            stack.pop()
+        yield key, value, stack[-1] if stack else None
+        stack.append((key, value))
+
+class DomainSet(AbstractSet):
+    """不可变的紧凑域名集合，支持 in、len、迭代以及 |、-、& 运算"""
+
+    __slots__ = ('_blob', '_offsets')
+
+    def __init__(self, domains: Iterable[str] = ()):
+        if isinstance(domains, DomainSet):
+            self._blob, self._offsets = domains._blob, domains._offsets
+        else:
+            self._build(sorted({encode_key(domain) for domain in domains}))
+
+    @classmethod
+    def from_keys(cls, keys: Iterable[bytes]) -> 'DomainSet':
+        """由已排序、不重复的排序键构造"""
+        domain_set = cls.__new__(cls)
+        domain_set._build(keys)
+        return domain_set
+
+    def _build(self, keys: Iterable[bytes]) -> None:
+        blob = bytearray()
+        offsets = array('I', [0])
+        for key in keys:
+            blob += key
+            offsets.append(len(blob))
+        self._blob = bytes(blob)
+        self._offsets = offsets
+
+    def __getstate__(self):
+        return self._blob, self._offsets
+
+    def __setstate__(self, state):
+        self._blob, self._offsets = state
+
+    @classmethod
+    def _from_iterable(cls, domains: Iterable[str]) -> 'DomainSet':
+        return cls(domains)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _key(self, i: int) -> bytes:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]]
+
+    def iter_keys(self) -> Iterator[bytes]:
+        """按顺序产出排序键"""
+        blob, offsets = self._blob, self._offsets
+        for i in range(len(offsets) - 1):
+            yield blob[offsets[i]:offsets[i + 1]]
+
+    def __iter__(self) -> Iterator[str]:
+        return map(decode_key, self.iter_keys())
+
+    def __contains__(self, domain: object) -> bool:
+        if not isinstance(domain, str):
+            return False
+        key = encode_key(domain)
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = self._key(mid)
+            if current < key:
+                lo = mid + 1
+            elif current > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    @property
+    def nbytes(self) -> int:
+        """占用的数据字节数（不含对象本身的固定开销）"""
+        return len(self._blob) + self._offsets.itemsize * len(self._offsets)
+
+    def __repr__(self) -> str:
+        return f"<DomainSet {len(self)} 个域名 {self.nbytes} 字节>"
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, DomainSet):
+            return self._blob == other._blob and self._offsets == other._offsets
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    @staticmethod
+    def _as_domain_set(other: Iterable[str]) -> 'DomainSet':
+        return other if isinstance(other, DomainSet) else DomainSet(other)
+
+    def union(self, *others: Iterable[str]) -> 'DomainSet':
+        """多路归并得到并集，内存占用只有输入和结果本身"""
+        sets = [self] + [self._as_domain_set(other) for other in others]
+        return DomainSet.from_keys(_unique(heapq.merge(*(domain_set.iter_keys() for domain_set in sets))))
+
+    def difference(self, other: Iterable[str]) -> 'DomainSet':
+        return DomainSet.from_keys(self._merge(self._as_domain_set(other), keep_common=False))
+
+    def intersection(self, other: Iterable[str]) -> 'DomainSet':
+        return DomainSet.from_keys(self._merge(self._as_domain_set(other), keep_common=True))
+
+    def _merge(self, other: 'DomainSet', keep_common: bool) -> Iterator[bytes]:
+        """有序归并，产出本集合中与 other 共有（keep_common）或不在 other 中的键"""
+        others = other.iter_keys()
+        current = next(others, None)
+        for key in self.iter_keys():
+            while current is not None and current < key:
+                current = next(others, None)
+            if (current == key) == keep_common:
+                yield key
+
+    def __or__(self, other):
+        if not isinstance(other, AbstractSet):
+            return NotImplemented
+        return self.union(other)
+
+    def __sub__(self, other):
+        if not isinstance(other, AbstractSet):
+            return NotImplemented
+        return self.difference(other)
+
+    def __and__(self, other):
+        if not isinstance(other, AbstractSet):
+            return NotImplemented
+        return self.intersection(other)
+
+    __ror__ = __or__
+    __rand__ = __and__
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+域名后缀树
+按反转后的标签（com -> example -> www）逐级存储域名，
+用于查找某个域名最近的上级规则，以及剔除已被上级域名覆盖的冗余子域名规则
+"""
+
+import heapq
+import logging
+import itertools
+from typing import AbstractSet, Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from domain_set import DomainSet, decode_key, encode_key, iter_with_parent
+
+logger = logging.getLogger('domain_trie')
+
+# 合法域名中不会出现空标签，用空字符串作为节点上保存规则值的键
+_VALUE = ''
+_MISSING = object()
+
+def reversed_labels(domain: str) -> List[str]:
+    """将域名拆分为从顶级域开始的标签列表"""
+    return domain.lower().split('.')[::-1]
+
+def reversed_name(domain: str) -> str:
+    """标签反转后的域名（www.example.com -> com.example.www），
+    用作排序键时同一上级域名下的域名相邻、且上级总是排在子域名之前"""
+    return '.'.join(domain.split('.')[::-1])
+
+class DomainTrie:
+    """反转标签后缀树，每个域名可以关联一个值（例如对应的上游DNS）"""
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, domain: str) -> bool:
+        node = self._root
+        for label in reversed_labels(domain):
+            node = node.get(label)
+            if node is None:
+                return False
+        return _VALUE in node
+
+    def insert(self, domain: str, value: Any = True) -> None:
+        """插入域名，已存在时更新其值"""
+        node = self._root
+        for label in reversed_labels(domain):
+            node = node.setdefault(label, {})
+        if _VALUE not in node:
+            self._size += 1
+        node[_VALUE] = value
+
+    def nearest(self, domain: str, include_self: bool = True) -> Optional[Tuple[str, Any]]:
+        """返回覆盖该域名的最具体规则 (规则域名, 值)，不存在时返回 None
+
+        include_self 为 False 时只查找严格的上级域名
+        """
+        labels = reversed_labels(domain)
+        depth = len(labels) if include_self else len(labels) - 1
+        node = self._root
+        found, found_depth = _MISSING, 0
+        for i in range(depth):
+            node = node.get(labels[i])
+            if node is None:
+                break
+            value = node.get(_VALUE, _MISSING)
+            if value is not _MISSING:
+                found, found_depth = value, i + 1
+        if found is _MISSING:
+            return None
+        return '.'.join(reversed(labels[:found_depth])), found
+
+def parent_domains(domain: str) -> Iterator[str]:
+    """由近到远依次产出域名的各级上级域名（不含自身）"""
+    pos = domain.find('.')
+    while pos != -1:
+        yield domain[pos + 1:]
+        pos = domain.find('.', pos + 1)
+
+def find_covered(domains: AbstractSet[str], value: Any, rules: Optional[Dict[str, Any]] = None) -> Set[str]:
+    """找出已被上级域名覆盖的冗余子域名
+
+    AdGuard Home 的 [/example.com/] 同时匹配所有子域名，且以最具体的规则为准。
+    一个域名只有在离它最近的上级规则与它使用相同的上游（value）时才是冗余的；
+    rules 为同一文件中的其他规则（域名 -> 上游），它们参与查找但自身不会被剔除，
+    这样夹在中间的自定义规则不会因为剔除而改变子域名的解析结果。
+
+    冗余关系可以传递（上级本身被剔除时，它的上级使用的也是同一个上游），
+    因此只需在完整的规则集合中逐个查找最近的上级，结果与处理顺序无关；
+    上级域名直接在集合中查找，不需要额外建树
+    """
+    rules = rules or {}
+    if isinstance(domains, DomainSet):
+        return _find_covered_sorted(domains, value, rules)
+    covered: Set[str] = set()
+    for domain in domains:
+        if domain in rules:
+            continue
+        for parent in parent_domains(domain):
+            rule_value = rules.get(parent, _MISSING)
+            if rule_value is not _MISSING:
+                if rule_value == value:
+                    covered.add(domain)
+                break
+            if parent in domains:
+                covered.add(domain)
+                break
+    return covered
+
+def _find_covered_sorted(domains: DomainSet, value: Any, rules: Dict[str, Any]) -> Set[str]:
+    """find_covered 的 DomainSet 版本：把集合与其他规则按反转标签归并后顺序扫描，
+    最近的上级由栈给出，不需要对有序集合逐级做二分查找"""
+    rule_values = {encode_key(domain): rule_value for domain, rule_value in rules.items()}
+    # 同时是其他规则的域名按规则处理（不剔除，作为上级时以规则的上游为准）
+    keys = heapq.merge(domains.iter_keys(), sorted(rule_values))
+    entries = ((key, rule_values.get(key, _MISSING)) for key, _ in itertools.groupby(keys))
+    covered: Set[str] = set()
+    for key, rule_value, parent in iter_with_parent(entries):
+        if rule_value is not _MISSING or parent is None:
+            continue
+        if parent[1] is _MISSING or parent[1] == value:
+            covered.add(decode_key(key))
+    return covered
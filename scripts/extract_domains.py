@@ -11,16 +11,26 @@
 - 普通文本格式的域名列表
 """
 
+import io
 import os
 import re
 import sys
 import yaml
 import base64
+import binascii
+import contextlib
+import hashlib
+import itertools
 import json
+import tempfile
 import urllib.request
 import logging
-from typing import List, Set, Dict, Any
-from urllib.error import URLError
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Set, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+from urllib.error import HTTPError, URLError
+
+from http_cache import HttpCache
+from run_metrics import DISABLED, RunMetrics
 
 # 配置日志
 logging.basicConfig(
@@ -33,533 +43,580 @@ logging.basicConfig(
 logger = logging.getLogger('extract_domains')
 
 # 正则表达式
-DOMAIN_PATTERN = re.compile(r'^[a-zA-Z0-9][-a-zA-Z0-9]*(\.[a-zA-Z0-9][-a-zA-Z0-9]*)+$')
-DOMAIN_PREFIX_PATTERN = re.compile(r'^\.([a-zA-Z0-9][-a-zA-Z0-9]*(\.[a-zA-Z0-9][-a-zA-Z0-9]*)+)$')
-CLASH_DOMAIN_PATTERN = re.compile(r'.*(?:DOMAIN|domain)[,:][ ]*([a-zA-Z0-9][-a-zA-Z0-9]*(\.[a-zA-Z0-9][-a-zA-Z0-9]*)+)')
-CLASH_DOMAIN_SUFFIX_PATTERN = re.compile(r'.*(?:DOMAIN-SUFFIX|domain-suffix)[,:][ ]*([a-zA-Z0-9][-a-zA-Z0-9]*(\.[a-zA-Z0-9][-a-zA-Z0-9]*)+)')
-DNSMASQ_PATTERN = re.compile(r'server=/([^/]+)/')
-ADBLOCK_PATTERN = re.compile(r'^\|\|([a-zA-Z0-9][-a-zA-Z0-9]*(\.[a-zA-Z0-9][-a-zA-Z0-9]*)+)\^')
-URL_PATTERN = re.compile(r'https?://([a-zA-Z0-9][-a-zA-Z0-9]*(\.[a-zA-Z0-9][-a-zA-Z0-9]*)+)')
-
-def download_file(url: str) -> str:
-    """从URL下载文件内容"""
-    try:
-        logger.info(f"下载文件：{url}")
+DOMAIN_LABEL = r'[a-zA-Z0-9][-a-zA-Z0-9]*'
+DOMAIN_BODY = rf'{DOMAIN_LABEL}(?:\.{DOMAIN_LABEL})+'
+DOMAIN_PATTERN = re.compile(rf'^{DOMAIN_BODY}$')
+BASE64_LINE_PATTERN = re.compile(r'^[A-Za-z0-9+/=]+$')
+BASE64_STRIP_PATTERN = re.compile(rb'[^A-Za-z0-9+/=]')
+
+# 行分类器：一次匹配把一行规则归类为 (规则类型, 域名)
+# 每个分支的最后一个捕获组是域名，分组名即规则类型
+LINE_CLASSIFIER = re.compile(
+    r'^\s*(?![#!\[])(?:-\s*)?(?P<quote>[\'"]?)(?:'
+    # Clash规则：DOMAIN,example.com / DOMAIN-SUFFIX:example.com，允许后跟策略等参数
+    rf'(?i:DOMAIN-SUFFIX|DOMAIN)\s*[,:]\s*(?P<rule>{DOMAIN_BODY})(?:,[^\'"#]*)?(?P=quote)\s*(?:#.*)?$'
+    # dnsmasq：server=/example.com/114.114.114.114
+    rf'|server=/(?P<dnsmasq>{DOMAIN_BODY})/'
+    # AdBlock/GFWList 白名单规则（不走代理，不提取）
+    r'|(?P<exception>@@)'
+    # AdBlock/GFWList：||example.com^ 或 ||example.com
+    rf'|\|\|(?P<adblock>{DOMAIN_BODY})(?:[\^/:]|$)'
+    # 域名本身，允许 .example.com 和 +.example.com 形式
+    rf'|(?:\+?\.)?(?P<domain>{DOMAIN_BODY})(?P=quote)\s*(?:#.*)?$'
+    # 行中URL的域名
+    rf'|.*?https?://(?P<url>{DOMAIN_BODY})'
+    r')'
+)
+
+# 各格式接受的规则类型
+PARSER_RULE_KINDS = {
+    'yaml': frozenset({'rule', 'domain', 'url'}),
+    'dnsmasq': frozenset({'dnsmasq', 'domain'}),
+    'gfwlist': frozenset({'adblock', 'domain', 'url'}),
+    'adblock': frozenset({'adblock', 'domain', 'url'}),
+    'blackmatrix7': frozenset({'domain'}),
+    'plain': frozenset({'domain', 'url'}),
+}
+
+# YAML快速路径使用的模式；有libyaml时使用C实现的加载器
+YAML_INDICATORS = frozenset('[]{},&*!|>%@`?:#')
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# 解析函数接受的内容：完整的字符串，或逐行产出 bytes/str 的可迭代对象
+Content = Union[str, Iterable]
+
+# 解析器版本，修改任何提取逻辑后需要递增，使解析结果缓存失效
+PARSER_VERSION = '5'
+
+# 下载参数默认值
+DEFAULT_TIMEOUT = 30
+DEFAULT_WORKERS = 8
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+def download_file(url: str, timeout: float = DEFAULT_TIMEOUT, cache: Optional[HttpCache] = None,
+                  metrics: RunMetrics = DISABLED) -> str:
+    """从URL下载文件内容
+
+    提供 cache 时发送条件请求，服务器返回 304 时直接使用缓存内容；
+    下载（fetch）和解码（decode）的耗时与字节数记录到 metrics 中
+    """
+    body = None
+    with metrics.stage('fetch', url) as record:
+        try:
+            logger.info(f"下载文件：{url}")
+            headers = {
+                'User-Agent': USER_AGENT
+            }
+            if cache:
+                headers.update(cache.conditional_headers(url))
+            req = urllib.request.Request(url, headers=headers)
+            with urllib.request.urlopen(req, timeout=timeout) as response:
+                body = response.read()
+                if cache:
+                    cache.store(url, body, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        except HTTPError as e:
+            if e.code == 304 and cache:
+                body = cache.load(url)
+                if body is not None:
+                    logger.info(f"{url} 未修改，使用缓存内容")
+                    record['cached'] = True
+            if body is None:
+                logger.error(f"下载 {url} 失败：{e}")
+        except URLError as e:
+            logger.error(f"下载 {url} 失败：{e}")
+        except Exception as e:
+            logger.error(f"下载 {url} 时出现未知错误：{e}")
+        record['bytes'] = len(body) if body is not None else 0
+    if body is None:
+        return ""
+    with metrics.stage('decode', url) as record:
+        record['bytes'] = len(body)
+        return body.decode('utf-8', errors='ignore')
+
+def download_files(sources: Iterable[Tuple[str, float]], workers: int = DEFAULT_WORKERS, cache: Optional[HttpCache] = None,
+                   metrics: RunMetrics = DISABLED) -> Dict[str, str]:
+    """并发下载多个URL
+
+    sources 为 (url, 超时秒数) 序列，返回 url -> 内容 的字典。
+    总耗时取决于最慢的单个源，而不是所有源耗时之和。
+    """
+    tasks: Dict[str, float] = {}
+    for url, timeout in sources:
+        # 同一URL只下载一次，取较长的超时时间
+        tasks[url] = max(timeout, tasks.get(url, 0))
+    
+    if not tasks:
+        return {}
+    
+    workers = max(1, min(workers, len(tasks)))
+    logger.info(f"使用 {workers} 个线程并发下载 {len(tasks)} 个源")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download') as executor:
+        futures = {url: executor.submit(download_file, url, timeout, cache, metrics) for url, timeout in tasks.items()}
+        return {url: future.result() for url, future in futures.items()}
+
+class SourceStream:
+    """逐行读取源内容的流式下载
+
+    按行产出原始 bytes，不会把整个响应读入内存。提供 cache 时发送条件请求：
+    收到 304 直接从缓存文件逐行读取；否则边读边写入缓存临时文件，读完后登记到缓存。
+    用法：
+        with SourceStream(url) as stream:
+            domains = extract_domains_from_file(stream, url)
+    """
+
+    def __init__(self, url: str, timeout: float = DEFAULT_TIMEOUT, cache: Optional[HttpCache] = None):
+        self.url = url
+        self.timeout = timeout
+        self.cache = cache
+        self.from_cache = False
+        self.bytes_read = 0
+        self._fp = None
+        self._tee = None
+        self._headers = {}
+        self._hash = hashlib.sha256()
+        self._sha256 = None
+        self._complete = False
+
+    def __enter__(self) -> 'SourceStream':
+        logger.info(f"流式下载文件：{self.url}")
         headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            'User-Agent': USER_AGENT
         }
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=30) as response:
-            return response.read().decode('utf-8', errors='ignore')
-    except URLError as e:
-        logger.error(f"下载 {url} 失败：{e}")
-        return ""
-    except Exception as e:
-        logger.error(f"下载 {url} 时出现未知错误：{e}")
-        return ""
+        if self.cache:
+            headers.update(self.cache.conditional_headers(self.url))
+        req = urllib.request.Request(self.url, headers=headers)
+        try:
+            self._fp = urllib.request.urlopen(req, timeout=self.timeout)
+        except HTTPError as e:
+            meta = self.cache.lookup(self.url) if self.cache and e.code == 304 else None
+            if not meta:
+                raise
+            logger.info(f"{self.url} 未修改，使用缓存内容")
+            self.cache.touch(self.url)
+            self._fp = open(self.cache.body_path(self.url), 'rb')
+            self._sha256 = meta.get('sha256')
+            self.from_cache = True
+            return self
+        
+        self._headers = self._fp.headers
+        if self.cache:
+            self._tee = open(self.cache.temp_path(self.url), 'wb')
+        return self
+
+    def __iter__(self) -> Iterator[bytes]:
+        for line in self._fp:
+            self.bytes_read += len(line)
+            if not self.from_cache:
+                self._hash.update(line)
+                if self._tee:
+                    self._tee.write(line)
+            yield line
+        self._complete = True
+
+    @property
+    def sha256(self) -> Optional[str]:
+        """内容的sha256；304时在读取前即可得到，否则需要读完后才能得到"""
+        if self._sha256 is None and self._complete:
+            self._sha256 = self._hash.hexdigest()
+        return self._sha256
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._fp:
+            self._fp.close()
+        if self._tee:
+            self._tee.close()
+            if self._complete and exc_type is None:
+                self.cache.store_file(self.url, self._tee.name, self.sha256,
+                                      self._headers.get('ETag'), self._headers.get('Last-Modified'))
+            else:
+                try:
+                    os.remove(self._tee.name)
+                except OSError:
+                    pass
 
 def is_valid_domain(domain: str) -> bool:
-    """验证域名是否有效，并且不是纯IPv4地址"""
+    """验证域名是否有效，并且不是纯IPv4地址（顶级域不能是纯数字）"""
     if not domain or len(domain) > 253:
         return False
-    if domain.startswith('.'):
-        domain = domain[1:]
-    if domain.endswith('.'):
-        return False
-    if '..' in domain:
-        return False
+    return DOMAIN_PATTERN.match(domain) is not None and not domain.rpartition('.')[2].isdigit()
+
+def classify_line(line: str) -> Optional[Tuple[str, str]]:
+    """把一行规则归类为 (规则类型, 域名)
 
-    # 新增：排除IPv4地址
-    ipv4_pattern = re.compile(r'^(\d{1,3}\.){3}\d{1,3}$')
-    if ipv4_pattern.match(domain):
+    规则类型为 rule、dnsmasq、adblock、domain、url 之一，AdBlock 白名单规则为 exception；
+    注释和无法识别的行返回 None
+    """
+    match = LINE_CLASSIFIER.match(line)
+    if match is None:
+        return None
+    if match.lastgroup == 'exception':
+        return 'exception', ''
+    domain = match.group(match.lastindex)
+    if len(domain) > 253 or domain.rpartition('.')[2].isdigit():
+        return None
+    return match.lastgroup, domain
+
+def _iter_classified(content: Content, fmt: str) -> Iterator[str]:
+    """按行分类，产出属于该格式接受的规则类型的域名"""
+    kinds = PARSER_RULE_KINDS[fmt]
+    match_line = LINE_CLASSIFIER.match
+    for line in iter_lines(content):
+        match = match_line(line)
+        if match is not None and match.lastgroup in kinds:
+            domain = match.group(match.lastindex)
+            if len(domain) <= 253 and not domain.rpartition('.')[2].isdigit():
+                yield domain
+
+def iter_lines(content: Content) -> Iterator[str]:
+    """逐行迭代内容
+
+    content 可以是完整的字符串，也可以是逐行产出 bytes/str 的可迭代对象（如 SourceStream），
+    后者按行解码，不需要把整个文件读入内存
+    """
+    if isinstance(content, str):
+        content = io.StringIO(content)
+    for line in content:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='ignore')
+        yield line
+
+class ReplayableLines:
+    """把一次性的行流暂存到临时文件，之后可以多次从头迭代
+
+    用于需要多遍扫描的格式（如 YAML、未知格式），内存占用与源大小无关
+    """
+
+    def __init__(self, lines: Iterable):
+        self._file = tempfile.TemporaryFile()
+        for line in lines:
+            self._file.write(line if isinstance(line, bytes) else line.encode('utf-8'))
+
+    def __iter__(self) -> Iterator[bytes]:
+        self._file.seek(0)
+        return iter(self._file)
+
+    @contextlib.contextmanager
+    def text(self) -> Iterator[io.TextIOWrapper]:
+        """以文本流的形式从头读取，退出时不关闭底层临时文件"""
+        self._file.seek(0)
+        wrapper = io.TextIOWrapper(self._file, encoding='utf-8', errors='ignore')
+        try:
+            yield wrapper
+        finally:
+            wrapper.detach()
+
+    def close(self) -> None:
+        self._file.close()
+
+def _yaml_item_is_simple(text: str) -> bool:
+    """payload 列表项是否为简单的单引号、双引号或普通标量（不含转义、嵌套等写法）"""
+    if not text:
         return False
+    first = text[0]
+    if first == "'" or first == '"':
+        inner = text[1:-1]
+        return len(text) >= 2 and text[-1] == first and first not in inner and not (first == '"' and '\\' in inner)
+    return not (first in YAML_INDICATORS or ': ' in text or text.endswith(':') or text.startswith('- ') or text == '-')
 
-    return bool(DOMAIN_PATTERN.match(domain))
+def _parse_yaml_payload_fast(content: Content) -> Optional[List[str]]:
+    """单遍解析最常见的规则集格式（顶层只有一个 payload: 列表）
 
-def extract_domains_from_yaml(content: str) -> Set[str]:
-    """从YAML格式的Clash规则列表中提取域名"""
-    domains = set()
-    
-    # 首先尝试直接从文本中提取域名（针对可能包含域名但不是有效YAML的情况）
-    for line in content.splitlines():
-        line = line.strip()
+    列表项直接交给行分类器处理，不需要YAML解析。遇到无法处理的结构时返回 None
+    """
+    kinds = PARSER_RULE_KINDS['yaml']
+    domains = []
+    in_payload = False
+    for raw_line in iter_lines(content):
+        line = raw_line.strip()
         
         # 跳过注释和空行
         if not line or line.startswith('#'):
             continue
         
-        # 检查是否是DOMAIN规则
-        if 'DOMAIN,' in line.upper() or 'DOMAIN:' in line.upper():
-            parts = re.split(r'[,:]', line, 1)
-            if len(parts) > 1:
-                domain = parts[1].strip()
-                if is_valid_domain(domain):
-                    domains.add(domain)
-        
-        # 检查是否是DOMAIN-SUFFIX规则
-        elif 'DOMAIN-SUFFIX,' in line.upper() or 'DOMAIN-SUFFIX:' in line.upper():
-            parts = re.split(r'[,:]', line, 1)
-            if len(parts) > 1:
-                domain = parts[1].strip()
-                if is_valid_domain(domain):
-                    domains.add(domain)
-        
-        # 尝试直接匹配域名
-        elif is_valid_domain(line):
-            domains.add(line)
-        # 处理 .domain.com 格式
-        elif line.startswith('.') and is_valid_domain(line[1:]):
-            domains.add(line[1:])
+        if not in_payload:
+            if raw_line.rstrip() != 'payload:':
+                return None
+            in_payload = True
+            continue
         
-        # 使用通用正则匹配
+        if not line.startswith('- ') or not _yaml_item_is_simple(line[2:].split(' #', 1)[0].strip()):
+            return None
+        result = classify_line(line)
+        if result and result[0] in kinds:
+            domains.append(result[1])
+    
+    return domains if in_payload else None
+
+def _iter_domains_from_yaml_document(data: Any) -> Iterator[str]:
+    """遍历解析后的YAML文档，提取其中的域名"""
+    # 处理不同格式的Clash规则：payload（通常在Providers文件中）、rules、domain-set，
+    # 以及其他键下的列表；有些文件可能直接是列表
+    if isinstance(data, dict):
+        for key in ('payload', 'rules', 'domains'):
+            if isinstance(data.get(key), list):
+                items = data[key]
+                break
         else:
-            # 尝试匹配DOMAIN
-            match = CLASH_DOMAIN_PATTERN.match(line)
-            if match:
-                domain = match.group(1)
-                if is_valid_domain(domain):
-                    domains.add(domain)
-                continue
-            
-            # 尝试匹配DOMAIN-SUFFIX
-            match = CLASH_DOMAIN_SUFFIX_PATTERN.match(line)
-            if match:
-                domain = match.group(1)
-                if is_valid_domain(domain):
-                    domains.add(domain)
-                continue
-            
-            # 尝试匹配URL中的域名
-            match = URL_PATTERN.search(line)
-            if match:
-                domain = match.group(1)
-                if is_valid_domain(domain):
-                    domains.add(domain)
+            items = [item for value in data.values() if isinstance(value, list) for item in value]
+    elif isinstance(data, list):
+        items = data
+    else:
+        return
     
-    # 然后尝试解析YAML
+    kinds = PARSER_RULE_KINDS['yaml']
+    for item in items:
+        if isinstance(item, str):
+            result = classify_line(item.strip())
+            if result and result[0] in kinds:
+                yield result[1]
+
+def iter_domains_from_yaml(content: Content) -> Iterator[str]:
+    """从YAML格式的Clash规则列表中逐个产出域名"""
+    replay = None
+    if not isinstance(content, str):
+        # 快速路径失败时需要再扫描一遍，流式内容先暂存到临时文件
+        replay = content = ReplayableLines(content)
     try:
-        data = yaml.safe_load(content)
+        # 常见的 payload: 列表格式单遍处理，不需要完整的YAML解析
+        domains = _parse_yaml_payload_fast(content)
+        if domains is not None:
+            yield from domains
+            return
         
-        # 处理不同格式的Clash规则
-        if isinstance(data, dict):
-            # 检查是否存在payload字段（通常在Providers文件中）
-            if 'payload' in data and isinstance(data['payload'], list):
-                for item in data['payload']:
-                    if isinstance(item, str):
-                        # 检查是否是DOMAIN规则
-                        if item.startswith('DOMAIN,') or item.startswith('DOMAIN:'):
-                            parts = re.split(r'[,:]', item, 1)
-                            if len(parts) > 1:
-                                domain = parts[1].strip()
-                                if is_valid_domain(domain):
-                                    domains.add(domain)
-                        
-                        # 检查是否是DOMAIN-SUFFIX规则
-                        elif item.startswith('DOMAIN-SUFFIX,') or item.startswith('DOMAIN-SUFFIX:'):
-                            parts = re.split(r'[,:]', item, 1)
-                            if len(parts) > 1:
-                                domain = parts[1].strip()
-                                if is_valid_domain(domain):
-                                    domains.add(domain)
-                        
-                        # 尝试直接匹配域名
-                        elif is_valid_domain(item):
-                            domains.add(item)
-                        
-                        # 使用通用正则匹配
-                        else:
-                            # 尝试匹配DOMAIN
-                            match = CLASH_DOMAIN_PATTERN.match(item)
-                            if match:
-                                domain = match.group(1)
-                                if is_valid_domain(domain):
-                                    domains.add(domain)
-                                continue
-                            
-                            # 尝试匹配DOMAIN-SUFFIX
-                            match = CLASH_DOMAIN_SUFFIX_PATTERN.match(item)
-                            if match:
-                                domain = match.group(1)
-                                if is_valid_domain(domain):
-                                    domains.add(domain)
-                                continue
-                            
-                            # 尝试匹配URL中的域名
-                            match = URL_PATTERN.search(item)
-                            if match:
-                                domain = match.group(1)
-                                if is_valid_domain(domain):
-                                    domains.add(domain)
-            
-            # 检查是否存在rules字段
-            elif 'rules' in data and isinstance(data['rules'], list):
-                for item in data['rules']:
-                    if isinstance(item, str):
-                        # 检查是否是DOMAIN规则
-                        if item.startswith('DOMAIN,') or item.startswith('DOMAIN:'):
-                            parts = re.split(r'[,:]', item, 1)
-                            if len(parts) > 1:
-                                domain = parts[1].strip()
-                                if is_valid_domain(domain):
-                                    domains.add(domain)
-                        
-                        # 检查是否是DOMAIN-SUFFIX规则
-                        elif item.startswith('DOMAIN-SUFFIX,') or item.startswith('DOMAIN-SUFFIX:'):
-                            parts = re.split(r'[,:]', item, 1)
-                            if len(parts) > 1:
-                                domain = parts[1].strip()
-                                if is_valid_domain(domain):
-                                    domains.add(domain)
-                        
-                        # 尝试直接匹配域名
-                        elif is_valid_domain(item):
-                            domains.add(item)
-                        
-                        # 使用通用正则匹配
-                        else:
-                            # 尝试匹配DOMAIN
-                            match = CLASH_DOMAIN_PATTERN.match(item)
-                            if match:
-                                domain = match.group(1)
-                                if is_valid_domain(domain):
-                                    domains.add(domain)
-                                continue
-                            
-                            # 尝试匹配DOMAIN-SUFFIX
-                            match = CLASH_DOMAIN_SUFFIX_PATTERN.match(item)
-                            if match:
-                                domain = match.group(1)
-                                if is_valid_domain(domain):
-                                    domains.add(domain)
-                                continue
-                            
-                            # 尝试匹配URL中的域名
-                            match = URL_PATTERN.search(item)
-                            if match:
-                                domain = match.group(1)
-                                if is_valid_domain(domain):
-                                    domains.add(domain)
-                                
-            # 处理domain-set格式
-            elif 'domains' in data and isinstance(data['domains'], list):
-                for domain in data['domains']:
-                    if isinstance(domain, str) and is_valid_domain(domain):
-                        domains.add(domain)
-            
-            # 尝试遍历所有可能的键值对
-            else:
-                for key, value in data.items():
-                    if isinstance(value, list):
-                        for item in value:
-                            if isinstance(item, str) and is_valid_domain(item):
-                                domains.add(item)
+        # 首先逐行提取域名（针对可能包含域名但不是有效YAML的情况）
+        yield from _iter_classified(content, 'yaml')
         
-        # 有些文件可能直接是列表
-        elif isinstance(data, list):
-            for item in data:
-                if isinstance(item, str):
-                    # 检查是否是DOMAIN规则
-                    if item.startswith('DOMAIN,') or item.startswith('DOMAIN:'):
-                        parts = re.split(r'[,:]', item, 1)
-                        if len(parts) > 1:
-                            domain = parts[1].strip()
-                            if is_valid_domain(domain):
-                                domains.add(domain)
-                    
-                    # 检查是否是DOMAIN-SUFFIX规则
-                    elif item.startswith('DOMAIN-SUFFIX,') or item.startswith('DOMAIN-SUFFIX:'):
-                        parts = re.split(r'[,:]', item, 1)
-                        if len(parts) > 1:
-                            domain = parts[1].strip()
-                            if is_valid_domain(domain):
-                                domains.add(domain)
-                    
-                    # 尝试直接匹配域名
-                    elif is_valid_domain(item):
-                        domains.add(item)
-                    
-                    # 使用通用正则匹配
-                    else:
-                        # 尝试匹配DOMAIN
-                        match = CLASH_DOMAIN_PATTERN.match(item)
-                        if match:
-                            domain = match.group(1)
-                            if is_valid_domain(domain):
-                                domains.add(domain)
-                            continue
-                        
-                        # 尝试匹配DOMAIN-SUFFIX
-                        match = CLASH_DOMAIN_SUFFIX_PATTERN.match(item)
-                        if match:
-                            domain = match.group(1)
-                            if is_valid_domain(domain):
-                                domains.add(domain)
-                            continue
-                        
-                        # 尝试匹配URL中的域名
-                        match = URL_PATTERN.search(item)
-                        if match:
-                            domain = match.group(1)
-                            if is_valid_domain(domain):
-                                domains.add(domain)
-                
-    except yaml.YAMLError as e:
-        logger.warning(f"解析YAML失败，已使用文本模式提取域名：{e}")
-    except Exception as e:
-        logger.warning(f"解析文件时出现未知错误，已使用文本模式提取域名：{e}")
-    
-    return domains
+        # 然后尝试解析YAML
+        try:
+            if replay is None:
+                data = yaml.load(content, Loader=YAML_LOADER)
+            else:
+                with replay.text() as text:
+                    data = yaml.load(text, Loader=YAML_LOADER)
+            yield from _iter_domains_from_yaml_document(data)
+        except yaml.YAMLError as e:
+            logger.warning(f"解析YAML失败，已使用文本模式提取域名：{e}")
+        except Exception as e:
+            logger.warning(f"解析文件时出现未知错误，已使用文本模式提取域名：{e}")
+    finally:
+        if replay is not None:
+            replay.close()
+
+def extract_domains_from_yaml(content: Content) -> Set[str]:
+    """从YAML格式的Clash规则列表中提取域名"""
+    return set(iter_domains_from_yaml(content))
+
+def iter_domains_from_dnsmasq(content: Content) -> Iterator[str]:
+    """从dnsmasq格式的域名列表中逐个产出域名"""
+    return _iter_classified(content, 'dnsmasq')
 
-def extract_domains_from_dnsmasq(content: str) -> Set[str]:
+def extract_domains_from_dnsmasq(content: Content) -> Set[str]:
     """从dnsmasq格式的域名列表中提取域名"""
-    domains = set()
-    for line in content.splitlines():
-        line = line.strip()
-        if line and not line.startswith('#'):
-            match = DNSMASQ_PATTERN.match(line)
-            if match:
-                domain = match.group(1)
-                if is_valid_domain(domain):
-                    domains.add(domain)
-            # 尝试作为普通域名处理
-            elif is_valid_domain(line):
-                domains.add(line)
-    return domains
+    return set(iter_domains_from_dnsmasq(content))
+
+def iter_domains_from_adblock(content: Content) -> Iterator[str]:
+    """从Adblock格式的域名列表中逐个产出域名"""
+    return _iter_classified(content, 'adblock')
 
-def extract_domains_from_adblock(content: str) -> Set[str]:
+def extract_domains_from_adblock(content: Content) -> Set[str]:
     """从Adblock格式的域名列表中提取域名"""
-    domains = set()
-    for line in content.splitlines():
-        line = line.strip()
-        if line and not line.startswith('!') and not line.startswith('#'):
-            # 匹配 ||example.com^ 格式
-            match = ADBLOCK_PATTERN.match(line)
-            if match:
-                domain = match.group(1)
-                if is_valid_domain(domain):
-                    domains.add(domain)
-            # 匹配直接的域名
-            elif is_valid_domain(line):
-                domains.add(line)
-            # 匹配URL中的域名
-            else:
-                match = URL_PATTERN.search(line)
-                if match:
-                    domain = match.group(1)
-                    if is_valid_domain(domain):
-                        domains.add(domain)
-    return domains
+    return set(iter_domains_from_adblock(content))
 
-def extract_domains_from_gfwlist(content: str) -> Set[str]:
-    """从GFWList格式的域名列表中提取域名"""
-    domains = set()
-    try:
-        # GFWList是Base64编码的，先解码
-        decoded_content = base64.b64decode(content).decode('utf-8', errors='ignore')
-        
-        # GFWList类似AdBlock格式，但有一些特殊规则
-        for line in decoded_content.splitlines():
-            line = line.strip()
-            # 跳过注释和空行
-            if not line or line.startswith('!') or line.startswith('[') or line.startswith('#'):
-                continue
-                
-            # 处理域名格式（||example.com^）
-            if line.startswith('||') and '^' in line:
-                domain = line[2:line.find('^')]
-                if is_valid_domain(domain):
-                    domains.add(domain)
-            # 处理域名格式（|https://example.com）
-            elif line.startswith('|http'):
-                try:
-                    from urllib.parse import urlparse
-                    domain = urlparse(line[1:]).netloc
-                    if is_valid_domain(domain):
-                        domains.add(domain)
-                except:
-                    pass
-            # 处理普通域名
-            elif '/' not in line and '.' in line and not line.startswith('.'):
-                if is_valid_domain(line):
-                    domains.add(line)
-            # 尝试提取URL中的域名
-            else:
-                match = URL_PATTERN.search(line)
-                if match:
-                    domain = match.group(1)
-                    if is_valid_domain(domain):
-                        domains.add(domain)
-    except Exception as e:
-        logger.error(f"解析GFWList失败：{e}")
-        
-        # 尝试作为普通文本处理
+def _iter_base64_lines(content: Content) -> Iterator[str]:
+    """增量解码Base64内容，逐行产出解码后的文本"""
+    pending = b''
+    remainder = b''
+    for line in iter_lines(content):
+        pending += BASE64_STRIP_PATTERN.sub(b'', line.encode('ascii', errors='ignore'))
+        usable = len(pending) - len(pending) % 4
+        if not usable:
+            continue
+        decoded = remainder + base64.b64decode(pending[:usable])
+        pending = pending[usable:]
+        *lines, remainder = decoded.split(b'\n')
+        for decoded_line in lines:
+            yield decoded_line.decode('utf-8', errors='ignore')
+    if pending:
+        remainder += base64.b64decode(pending)
+    if remainder:
+        yield remainder.decode('utf-8', errors='ignore')
+
+def iter_domains_from_gfwlist(content: Content) -> Iterator[str]:
+    """从GFWList格式的域名列表中逐个产出域名"""
+    lines = iter_lines(content)
+    
+    # 根据第一个非空行判断内容是否为Base64编码（GFWList通常是Base64编码的）
+    head = []
+    for line in lines:
+        head.append(line)
+        if line.strip():
+            break
+    first = head[-1].strip() if head else ''
+    lines = itertools.chain(head, lines)
+    
+    if first and BASE64_LINE_PATTERN.match(first):
         try:
-            for line in content.splitlines():
-                line = line.strip()
-                if line and not line.startswith('#') and not line.startswith('!'):
-                    if is_valid_domain(line):
-                        domains.add(line)
-        except Exception as e2:
-            logger.error(f"作为普通文本处理GFWList也失败：{e2}")
+            yield from _iter_classified(_iter_base64_lines(lines), 'gfwlist')
+            return
+        except (binascii.Error, ValueError) as e:
+            logger.error(f"解析GFWList失败：{e}")
+            return
     
-    return domains
+    # 不是Base64内容，按解码后的规则处理
+    yield from _iter_classified(lines, 'gfwlist')
+
+def extract_domains_from_gfwlist(content: Content) -> Set[str]:
+    """从GFWList格式的域名列表中提取域名"""
+    return set(iter_domains_from_gfwlist(content))
 
-def extract_domains_from_plain_text(content: str) -> Set[str]:
+def iter_domains_from_plain_text(content: Content) -> Iterator[str]:
+    """从普通文本格式的域名列表中逐个产出域名"""
+    return _iter_classified(content, 'plain')
+
+def extract_domains_from_plain_text(content: Content) -> Set[str]:
     """从普通文本格式的域名列表中提取域名"""
-    domains = set()
-    header_passed = False
-    
-    for line in content.splitlines():
-        line = line.strip()
-        
-        # 跳过空行和注释
-        if not line or line.startswith('#'):
-            continue
-        
-        # 检查是否是头部信息部分
-        if not header_passed and "NAME:" in line:
-            # 可能是blackmatrix7的域名列表头部
-            header_passed = True
-            continue
-        
-        # 处理以点开头的域名（如.example.com）
-        if line.startswith('.'):
-            match = DOMAIN_PREFIX_PATTERN.match(line)
-            if match:
-                domain = match.group(1)
-                if is_valid_domain(domain):
-                    domains.add(domain)
-            continue
-        
-        # 直接的域名
-        if is_valid_domain(line):
-            domains.add(line)
-        else:
-            # 尝试匹配URL中的域名
-            match = URL_PATTERN.search(line)
-            if match:
-                domain = match.group(1)
-                if is_valid_domain(domain):
-                    domains.add(domain)
-    
-    return domains
+    return set(iter_domains_from_plain_text(content))
 
-def extract_domains_from_blackmatrix7_domain_txt(content: str) -> Set[str]:
+def iter_domains_from_blackmatrix7_domain_txt(content: Content) -> Iterator[str]:
+    """从blackmatrix7的Domain.txt格式中逐个产出域名（example.com、.example.com、+.example.com）"""
+    return _iter_classified(content, 'blackmatrix7')
+
+def extract_domains_from_blackmatrix7_domain_txt(content: Content) -> Set[str]:
     """从blackmatrix7的Domain.txt格式提取域名"""
-    domains = set()
-    header_section = True
+    return set(iter_domains_from_blackmatrix7_domain_txt(content))
+
+# 格式名称 -> (解析函数, 日志中的描述)
+FORMAT_PARSERS = {
+    'yaml': (extract_domains_from_yaml, 'YAML规则集'),
+    'dnsmasq': (extract_domains_from_dnsmasq, 'dnsmasq配置'),
+    'gfwlist': (extract_domains_from_gfwlist, 'GFWList'),
+    'adblock': (extract_domains_from_adblock, 'AdBlock规则'),
+    'blackmatrix7': (extract_domains_from_blackmatrix7_domain_txt, 'blackmatrix7 Domain.txt'),
+    'plain': (extract_domains_from_plain_text, '普通文本'),
+}
+
+# 各格式正文行的特征，用于按内容识别格式
+FORMAT_SIGNATURES = {
+    'yaml': re.compile(r'^(?:\s*-\s|[A-Za-z_][\w-]*:\s*$)'),
+    'dnsmasq': re.compile(r'^(?:server|address|ipset|nftset)=/'),
+    'gfwlist': re.compile(r'^[A-Za-z0-9+/]{16,}={0,2}$'),
+    'adblock': re.compile(r'^(?:\|\||\|https?://|@@)'),
+    'blackmatrix7': re.compile(r'^(?:\+?\.)?[a-zA-Z0-9][-a-zA-Z0-9]*(?:\.[a-zA-Z0-9][-a-zA-Z0-9]*)+$'),
+    'plain': re.compile(r'^(?:\.?[a-zA-Z0-9][-a-zA-Z0-9]*(?:\.[a-zA-Z0-9][-a-zA-Z0-9]*)+$|.*https?://)'),
+}
+
+# 格式识别时采样的字节数
+SNIFF_BYTES = 8192
+
+# 文件名提示只在内容特征接近时起作用
+FILENAME_HINT_BONUS = 0.05
+
+def _format_hint(file_url: str) -> Optional[str]:
+    """根据文件名猜测格式，仅作为内容识别的辅助"""
+    file_name = file_url.split('/')[-1].lower()
+    if file_name.endswith(('.yaml', '.yml')):
+        return 'yaml'
+    if file_name.endswith('.conf'):
+        return 'dnsmasq'
+    if file_name == 'gfwlist.txt':
+        return 'gfwlist'
+    if file_name.endswith('_domain.txt'):
+        return 'blackmatrix7'
+    if '.list' in file_name:
+        return 'plain'
+    return None
+
+def detect_format(sample: str, file_url: str = '') -> Tuple[str, float]:
+    """根据内容样本识别格式，返回 (格式名称, 置信度)
+
+    置信度为样本正文行中符合该格式特征的比例（0~1），文件名只在得分接近时用于区分
+    """
+    lines = sample.splitlines()
+    if len(sample) >= SNIFF_BYTES and lines:
+        # 样本被截断，最后一行可能不完整
+        lines = lines[:-1]
     
-    for line in content.splitlines():
+    body = []
+    header_hints = set()
+    for line in lines:
         line = line.strip()
-        
-        # 跳过空行
         if not line:
             continue
-        
-        # 跳过头部注释
         if line.startswith('#'):
+            if 'NAME:' in line:
+                header_hints.add('blackmatrix7')
             continue
-        
-        # 检查是否已经过了头部注释部分
-        if header_section and "DOMAIN:" in line:
-            header_section = False
+        if line.startswith('!') or (line.startswith('[') and line.endswith(']')):
+            if line.startswith(('[AutoProxy', '[Adblock')):
+                header_hints.add('adblock')
             continue
-        
-        # 处理正文部分
-        if not header_section:
-            # 检查是否是以点开头的域名（如.example.com）
-            if line.startswith('.'):
-                domain = line[1:]
-                if is_valid_domain(domain):
-                    domains.add(domain)
-            # 直接的域名
-            elif is_valid_domain(line):
-                domains.add(line)
+        body.append(line)
     
-    return domains
-
-def extract_domains_from_file(content: str, file_url: str) -> Set[str]:
-    """根据文件类型提取域名"""
-    file_name = file_url.split('/')[-1].lower()
-    domains = set()
+    if not body:
+        return 'plain', 0.0
     
-    # 根据文件扩展名或内容判断文件类型
-    if "proxy_domain.txt" in file_url.lower():
-        # 这是blackmatrix7项目中的Proxy_Domain.txt格式
-        domains = extract_domains_from_blackmatrix7_domain_txt(content)
-        logger.info(f"从blackmatrix7 Proxy_Domain.txt中提取到 {len(domains)} 个域名")
-    elif "chinamax_domain.txt" in file_url.lower() or "china_domain.txt" in file_url.lower():
-        # 这是blackmatrix7项目中的ChinaMax_Domain.txt或China_Domain.txt格式
-        domains = extract_domains_from_blackmatrix7_domain_txt(content)
-        logger.info(f"从blackmatrix7 ChinaMax_Domain.txt中提取到 {len(domains)} 个域名")
-    elif file_name.endswith('.yaml') or file_name.endswith('.yml'):
-        domains = extract_domains_from_yaml(content)
-        logger.info(f"从YAML文件中提取到 {len(domains)} 个域名")
-    elif file_name.endswith('.conf'):
-        domains = extract_domains_from_dnsmasq(content)
-        logger.info(f"从dnsmasq配置文件中提取到 {len(domains)} 个域名")
-    elif file_name == 'gfwlist.txt':
-        domains = extract_domains_from_gfwlist(content)
-        logger.info(f"从GFWList文件中提取到 {len(domains)} 个域名")
-    elif '.list' in file_name:
-        # 尝试作为普通文本解析
-        domains = extract_domains_from_plain_text(content)
-        logger.info(f"从列表文件中提取到 {len(domains)} 个域名")
-    else:
-        # 尝试各种格式
-        logger.info("未能确定文件类型，尝试多种格式解析")
-        
-        # 尝试作为普通文本解析
-        text_domains = extract_domains_from_plain_text(content)
-        if text_domains:
-            logger.info(f"作为普通文本解析提取到 {len(text_domains)} 个域名")
-            domains.update(text_domains)
-        
-        # 如果普通文本解析提取的域名很少，尝试其他方式
-        if len(domains) < 10:
-            # 尝试作为YAML解析
-            yaml_domains = extract_domains_from_yaml(content)
-            if yaml_domains:
-                logger.info(f"作为YAML解析提取到 {len(yaml_domains)} 个域名")
-                domains.update(yaml_domains)
-            
-            # 尝试作为dnsmasq配置解析
-            dnsmasq_domains = extract_domains_from_dnsmasq(content)
-            if dnsmasq_domains:
-                logger.info(f"作为dnsmasq配置解析提取到 {len(dnsmasq_domains)} 个域名")
-                domains.update(dnsmasq_domains)
-            
-            # 尝试作为AdBlock规则解析
-            adblock_domains = extract_domains_from_adblock(content)
-            if adblock_domains:
-                logger.info(f"作为AdBlock规则解析提取到 {len(adblock_domains)} 个域名")
-                domains.update(adblock_domains)
-            
-            # 尝试作为GFWList解析
-            try:
-                gfwlist_domains = extract_domains_from_gfwlist(content)
-                if gfwlist_domains:
-                    logger.info(f"作为GFWList解析提取到 {len(gfwlist_domains)} 个域名")
-                    domains.update(gfwlist_domains)
-            except:
-                pass
+    hint = _format_hint(file_url)
+    scores = {}
+    for name, signature in FORMAT_SIGNATURES.items():
+        score = sum(1 for line in body if signature.match(line)) / len(body)
+        if score and name in header_hints:
+            score += 0.1
+        if name == 'blackmatrix7' and 'blackmatrix7' not in header_hints and not any(line.startswith('+.') for line in body):
+            # 没有blackmatrix7特征时按普通文本处理
+            score = 0.0
+        if score and name == hint:
+            score += FILENAME_HINT_BONUS
+        scores[name] = score
     
-    return domains
+    # 得分相同时按 FORMAT_SIGNATURES 中的顺序优先
+    best = max(scores, key=lambda name: scores[name])
+    return best, min(1.0, scores[best])
 
-def process_sources(sources: List[str]) -> Set[str]:
-    """处理源列表，下载并提取域名"""
-    all_domains = set()
+def _peek(content: Content, size: int = SNIFF_BYTES) -> Tuple[str, Content]:
+    """读取内容开头的样本，返回 (样本, 可继续完整读取的内容)"""
+    if isinstance(content, str):
+        return content[:size], content
     
-    for source in sources:
-        content = download_file(source)
-        if content:
-            domains = extract_domains_from_file(content, source)
-            logger.info(f"从 {source} 中提取了 {len(domains)} 个域名")
-            all_domains.update(domains)
+    head = []
+    total = 0
+    lines = iter(content)
+    for line in lines:
+        head.append(line)
+        total += len(line)
+        if total >= size:
+            break
+    sample = ''.join(line.decode('utf-8', errors='ignore') if isinstance(line, bytes) else line for line in head)
+    return sample, itertools.chain(head, lines)
+
+def resolve_format(content: Content, file_url: str, fmt: Optional[str] = None) -> Tuple[str, Content]:
+    """确定内容的格式，返回 (格式名称, 可继续完整读取的内容)
+
+    fmt 指定格式时直接使用，否则按内容开头的样本识别格式
+    """
+    if fmt:
+        if fmt not in FORMAT_PARSERS:
+            raise ValueError(f"未知的格式：{fmt}")
+        logger.info(f"按配置使用 {FORMAT_PARSERS[fmt][1]} 格式解析 {file_url}")
+    else:
+        sample, content = _peek(content)
+        fmt, confidence = detect_format(sample, file_url)
+        if confidence < 0.5:
+            logger.warning(f"{file_url} 的格式识别置信度较低：{FORMAT_PARSERS[fmt][1]}（{confidence:.2f}），可在配置中通过 format 指定")
         else:
-            logger.warning(f"下载 {url} 失败或内容为空")
-    
-    return all_domains
+            logger.info(f"{file_url} 识别为 {FORMAT_PARSERS[fmt][1]} 格式（置信度 {confidence:.2f}）")
+    return fmt, content
+
+def extract_domains_from_file(content: Content, file_url: str, fmt: Optional[str] = None) -> Set[str]:
+    """根据文件格式提取域名
+
+    content 可以是完整的字符串，也可以是逐行产出内容的流。
+    fmt 指定格式时直接使用对应的解析器，否则按内容开头的样本识别格式，只解析一次
+    """
+    fmt, content = resolve_format(content, file_url, fmt)
+    parser, description = FORMAT_PARSERS[fmt]
+    domains = parser(content)
+    logger.info(f"从{description}中提取到 {len(domains)} 个域名")
+    return domains
 
 def save_domains_to_file(domains: Set[str], output_file: str) -> None:
     """将域名保存到文件"""
@@ -10,14 +10,25 @@ import os
 import sys
 import json
 import logging
-import datetime
+import argparse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from urllib.error import URLError
-from typing import Dict, List, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 # 避免循环导入
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import extract_domains
+from http_cache import HttpCache
+from parse_cache import ParseCache, content_hash
+import conflicts
+import upstream_format
+import artifact_writer
+import parallel_parse
+import probe_upstreams
+import hot_set
+from domain_set import DomainSet
+from run_metrics import DISABLED, PROFILERS, RunMetrics
 
 # 配置日志
 logging.basicConfig(
@@ -63,23 +74,214 @@ def load_config() -> dict:
     
     return config
 
-def process_sources(sources, custom_file=None) -> set:
-    """处理源列表，下载并提取域名"""
-    all_domains = set()
+def normalize_sources(entries, default_timeout: float = extract_domains.DEFAULT_TIMEOUT) -> List[Dict[str, Any]]:
+    """规范化源配置
+
+    config.json 中的源既可以是URL字符串，也可以是带附加参数的对象：
+    {"url": "https://...", "timeout": 60, "format": "yaml"}
+    format 可选值见 extract_domains.FORMAT_PARSERS，未指定时按内容自动识别
+    """
+    sources = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"url": entry}
+        if not isinstance(entry, dict) or not entry.get("url"):
+            logger.warning(f"忽略无效的源配置: {entry}")
+            continue
+        source = dict(entry)
+        source["timeout"] = float(source.get("timeout", default_timeout))
+        if source.get("format") and source["format"] not in extract_domains.FORMAT_PARSERS:
+            logger.warning(f"{source['url']} 配置了未知的格式 {source['format']}，改为自动识别")
+            source.pop("format")
+        sources.append(source)
+    return sources
+
+def create_http_cache(config: dict, enabled: bool = True) -> Optional[HttpCache]:
+    """根据配置创建HTTP下载缓存，禁用时返回 None"""
+    cache_config = config.get('cache', {})
+    if not enabled or not cache_config.get('enabled', True):
+        logger.info("已禁用HTTP下载缓存")
+        return None
+    cache_dir = os.path.join(cache_config.get('dir', '.cache'), 'http')
+    max_bytes = int(cache_config.get('http_max_mb', 256)) * 1024 * 1024
+    return HttpCache(cache_dir, max_bytes)
+
+def create_parse_cache(config: dict, enabled: bool = True) -> Optional[ParseCache]:
+    """根据配置创建解析结果缓存，禁用时返回 None"""
+    cache_config = config.get('cache', {})
+    if not enabled or not cache_config.get('enabled', True):
+        return None
+    return ParseCache(os.path.join(cache_config.get('dir', '.cache'), 'parsed'))
+
+def parser_key(fmt: Optional[str] = None) -> str:
+    """解析缓存使用的解析器标识：解析器版本加上配置指定的格式"""
+    return f"{extract_domains.PARSER_VERSION}/{fmt or 'auto'}"
+
+def extract_source_domains(url: str, content: str, parse_cache: Optional[ParseCache] = None, fmt: Optional[str] = None,
+                           metrics: RunMetrics = DISABLED) -> Set[str]:
+    """提取单个源的域名，内容和解析器版本未变化时直接使用缓存结果"""
+    with metrics.stage('parse', url) as record:
+        record['bytes'] = len(content)
+        domains = _extract_source_domains(url, content, parse_cache, fmt, record)
+        record['domains'] = len(domains)
+    return domains
+
+def _extract_source_domains(url: str, content: str, parse_cache: Optional[ParseCache], fmt: Optional[str],
+                            record: Dict[str, Any]) -> Set[str]:
+    if not parse_cache:
+        return extract_domains.extract_domains_from_file(content, url, fmt)
+    
+    digest = content_hash(content)
+    domains = parse_cache.get(url, digest, parser_key(fmt))
+    if domains is not None:
+        logger.info(f"{url} 内容未变化，使用解析缓存（{len(domains)} 个域名）")
+        record['cached'] = True
+        return domains
+    
+    domains = extract_domains.extract_domains_from_file(content, url, fmt)
+    if domains:
+        parse_cache.put(url, digest, parser_key(fmt), domains)
+    return domains
+
+def fetch_sources(source_groups: Dict[str, List[Dict[str, Any]]], workers: int = extract_domains.DEFAULT_WORKERS, cache: Optional[HttpCache] = None,
+                  metrics: RunMetrics = DISABLED) -> Dict[str, str]:
+    """并发下载所有分组中的源，返回 url -> 内容"""
+    tasks = [(source["url"], source["timeout"]) for sources in source_groups.values() for source in sources]
+    return extract_domains.download_files(tasks, workers, cache, metrics)
+
+def stream_source_domains(url: str, timeout: float, http_cache: Optional[HttpCache] = None, parse_cache: Optional[ParseCache] = None,
+                          fmt: Optional[str] = None, metrics: RunMetrics = DISABLED) -> Optional[Set[str]]:
+    """流式下载并解析单个源，失败时返回 None
+
+    下载、解码和解析交替进行，指标中只记录一个包含三者的 fetch 阶段
+    """
+    with metrics.stage('fetch', url) as record:
+        record['streaming'] = True
+        try:
+            with extract_domains.SourceStream(url, timeout, http_cache) as stream:
+                # 304 时下载前即可知道内容哈希，可以直接命中解析缓存
+                if parse_cache and stream.sha256:
+                    domains = parse_cache.get(url, stream.sha256, parser_key(fmt))
+                    if domains is not None:
+                        logger.info(f"{url} 内容未变化，使用解析缓存（{len(domains)} 个域名）")
+                        record.update(cached=True, bytes=0, domains=len(domains))
+                        return domains
+                domains = extract_domains.extract_domains_from_file(stream, url, fmt)
+                if parse_cache and domains and stream.sha256:
+                    parse_cache.put(url, stream.sha256, parser_key(fmt), domains)
+                record.update(bytes=stream.bytes_read, domains=len(domains))
+                return domains
+        except Exception as e:
+            logger.error(f"流式下载 {url} 失败：{e}")
+            record['failed'] = True
+            return None
+
+def stream_sources(source_groups: Dict[str, List[Dict[str, Any]]], workers: int = extract_domains.DEFAULT_WORKERS,
+                   http_cache: Optional[HttpCache] = None, parse_cache: Optional[ParseCache] = None,
+                   metrics: RunMetrics = DISABLED) -> Dict[str, Optional[Set[str]]]:
+    """并发地流式下载并解析所有分组中的源，返回 url -> 域名集合（失败为 None）
+
+    内容按行读取、边读边解析，内存占用与源文件大小无关
+    """
+    tasks: Dict[str, Dict[str, Any]] = {}
+    for sources in source_groups.values():
+        for source in sources:
+            task = tasks.setdefault(source["url"], dict(source))
+            task["timeout"] = max(source["timeout"], task["timeout"])
+    if not tasks:
+        return {}
+    
+    workers = max(1, min(workers, len(tasks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stream') as executor:
+        futures = {url: executor.submit(stream_source_domains, url, task["timeout"], http_cache, parse_cache, task.get("format"), metrics)
+                   for url, task in tasks.items()}
+        parsed: Dict[str, Optional[Set[str]]] = {}
+        for url, future in futures.items():
+            domains = future.result()
+            parsed[url] = DomainSet(domains) if domains is not None else None
+        return parsed
+
+def parse_sources(source_groups: Dict[str, List[Dict[str, Any]]], contents: Dict[str, str], workers: int,
+                  parse_cache: Optional[ParseCache] = None, metrics: RunMetrics = DISABLED) -> Dict[str, Optional[Set[str]]]:
+    """用多进程解析所有分组中已下载的源，返回 url -> 域名集合（下载失败或内容为空为 None）
+
+    命中解析缓存的源不再解析，结果与逐个调用 extract_source_domains 相同
+    """
+    formats: Dict[str, Optional[str]] = {}
+    for sources in source_groups.values():
+        for source in sources:
+            formats.setdefault(source["url"], source.get("format"))
+    
+    parsed: Dict[str, Optional[Set[str]]] = {}
+    tasks = []
+    for url, fmt in formats.items():
+        content = contents.get(url, "")
+        if not content:
+            parsed[url] = None
+            continue
+        domains = parse_cache.get(url, content_hash(content), parser_key(fmt)) if parse_cache else None
+        if domains is not None:
+            logger.info(f"{url} 内容未变化，使用解析缓存（{len(domains)} 个域名）")
+            metrics.add('parse', {'bytes': len(content), 'domains': len(domains), 'cached': True}, 0.0, url)
+            parsed[url] = DomainSet(domains)
+        else:
+            tasks.append((url, content, fmt))
+    if not tasks:
+        return parsed
+    
+    logger.info(f"使用 {workers} 个进程解析 {len(tasks)} 个源")
+    for url, (domains, seconds, peak_rss) in parallel_parse.parse_contents(tasks, workers).items():
+        content = contents[url]
+        # 内存峰值为解析该源的子进程的峰值，而不是主进程的
+        metrics.add('parse', {'bytes': len(content), 'domains': len(domains)}, seconds, url, peak_rss)
+        if parse_cache and domains:
+            parse_cache.put(url, content_hash(content), parser_key(formats[url]), domains)
+        parsed[url] = DomainSet(domains)
+    return parsed
+
+def process_sources(sources, custom_file=None, contents: Optional[Dict[str, str]] = None, parse_cache: Optional[ParseCache] = None,
+                    parsed: Optional[Dict[str, Optional[Set[str]]]] = None, metrics: RunMetrics = DISABLED) -> DomainSet:
+    """处理源列表，下载并提取域名
+
+    contents 为预先并发下载好的 url -> 内容；parsed 为流式模式下已解析好的 url -> 域名集合；
+    两者都未提供时在此处下载。
+    提供 parse_cache 时，下载失败或没有提取到域名的源会使用最近一次成功解析的结果。
+    """
+    # 各源的结果立即转为紧凑的 DomainSet，最后一次归并，不保留逐个域名的 str 集合
+    domain_sets: List[DomainSet] = []
+    sources = normalize_sources(sources)
+    if contents is None and parsed is None:
+        contents = fetch_sources({"sources": sources}, metrics=metrics)
     
+    # 按配置顺序合并，保证结果和日志的确定性
     for source in sources:
-        content = extract_domains.download_file(source)
-        if content:
-            domains = extract_domains.extract_domains_from_file(content, source)
-            logger.info(f"从 {source} 中提取了 {len(domains)} 个域名")
-            all_domains.update(domains)
+        url = source["url"]
+        if parsed is not None:
+            domains = parsed.get(url)
+        else:
+            content = contents.get(url, "")
+            domains = extract_source_domains(url, content, parse_cache, source.get("format"), metrics) if content else None
+        if domains:
+            logger.info(f"从 {url} 中提取了 {len(domains)} 个域名")
+            domain_sets.append(DomainSet(domains))
+        else:
+            # 下载成功但解析不出域名（如返回了错误页面或格式变化）同样按失败处理
+            if domains is None:
+                logger.warning(f"下载 {url} 失败或内容为空")
+            else:
+                logger.warning(f"没有从 {url} 中提取到任何域名，按下载失败处理")
+            domains = parse_cache.last_known_good(url) if parse_cache else None
+            if domains:
+                logger.warning(f"使用 {url} 最近一次成功解析的结果（{len(domains)} 个域名）")
+                domain_sets.append(DomainSet(domains))
+        domains = None
     
     if custom_file and os.path.exists(custom_file):
         custom_domains = extract_domains.read_custom_domains(custom_file)
         logger.info(f"从自定义文件中读取了 {len(custom_domains)} 个域名")
-        all_domains.update(custom_domains)
+        domain_sets.append(DomainSet(custom_domains))
     
-    return all_domains
+    return DomainSet().union(*domain_sets)
 
 def read_custom_domain_dns(file_path: str) -> Dict[str, List[str]]:
     """读取自定义域名DNS配置
@@ -131,119 +333,95 @@ def read_custom_domain_dns(file_path: str) -> Dict[str, List[str]]:
     logger.info(f"从自定义DNS文件中读取了 {len(custom_dns)} 条规则")
     return custom_dns
 
-def generate_whitelist_config(cn_domains, foreign_domains, cn_dns, foreign_dns, custom_domain_dns=None) -> str:
-    """生成白名单模式配置（命中国内域名走国内DNS，其他走国外DNS）"""
-    config_lines = []
-    
-    # 添加头部注释
-    config_lines.append("# AdGuard Home DNS 分流配置 - 白名单模式")
-    config_lines.append(f"# 自动生成于 {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    config_lines.append("# 白名单模式：命中国内域名走国内DNS，其他走国外DNS")
-    if custom_domain_dns:
-        config_lines.append("# 包含自定义域名DNS规则")
-    config_lines.append("")
-    
-    # 添加默认上游DNS服务器（国外）
-    config_lines.append("# 默认上游DNS服务器（国外）")
-    for dns in foreign_dns:
-        config_lines.append(dns)
-    config_lines.append("")
-    
-    # 先添加自定义域名DNS规则（优先级最高）
-    if custom_domain_dns:
-        config_lines.append("#" + "="*50)
-        config_lines.append(f"# 自定义域名DNS规则（共 {len(custom_domain_dns)} 个域名）")
-        config_lines.append("# 这些规则优先级最高，会覆盖下面的国内/国外规则")
-        config_lines.append("#" + "="*50)
-        for domain, dns_list in sorted(custom_domain_dns.items()):
-            dns_string = ' '.join(dns_list)
-            config_lines.append(f"[/{domain}/]{dns_string}")
-        config_lines.append("")
-    
-    # 从国内域名中排除已有自定义DNS的域名
-    cn_domains_filtered = cn_domains - set(custom_domain_dns.keys()) if custom_domain_dns else cn_domains
-    
-    # 添加国内域名规则
-    config_lines.append("#" + "="*50)
-    config_lines.append(f"# 国内域名规则（共 {len(cn_domains_filtered)} 个域名）")
-    if custom_domain_dns and len(cn_domains) != len(cn_domains_filtered):
-        config_lines.append(f"# 已排除 {len(cn_domains) - len(cn_domains_filtered)} 个自定义DNS域名")
-    config_lines.append("#" + "="*50)
-    for domain in sorted(cn_domains_filtered):
-        dns_list = ' '.join(cn_dns)
-        config_lines.append(f"[/{domain}/]{dns_list}")
-    
-    return '\n'.join(config_lines)
+def generate_whitelist_config(cn_domains, foreign_domains, cn_dns, foreign_dns, custom_domain_dns=None, prune=True,
+                              prune_report: Optional[Dict[str, List[str]]] = None, overrides: Optional[Set[str]] = None) -> str:
+    """生成白名单模式配置（命中国内域名走国内DNS，其他走国外DNS）
 
-def generate_blacklist_config(cn_domains, foreign_domains, cn_dns, foreign_dns, custom_domain_dns=None) -> str:
-    """生成黑名单模式配置（命中国外域名走国外DNS，其他走国内DNS）"""
-    config_lines = []
-    
-    # 添加头部注释
-    config_lines.append("# AdGuard Home DNS 分流配置 - 黑名单模式")
-    config_lines.append(f"# 自动生成于 {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    config_lines.append("# 黑名单模式：命中国外域名走国外DNS，其他走国内DNS")
-    if custom_domain_dns:
-        config_lines.append("# 包含自定义域名DNS规则")
-    config_lines.append("")
-    
-    # 添加默认上游DNS服务器（国内）
-    config_lines.append("# 默认上游DNS服务器（国内）")
-    for dns in cn_dns:
-        config_lines.append(dns)
-    config_lines.append("")
-    
-    # 先添加自定义域名DNS规则（优先级最高）
-    if custom_domain_dns:
-        config_lines.append("#" + "="*50)
-        config_lines.append(f"# 自定义域名DNS规则（共 {len(custom_domain_dns)} 个域名）")
-        config_lines.append("# 这些规则优先级最高，会覆盖下面的国内/国外规则")
-        config_lines.append("#" + "="*50)
-        for domain, dns_list in sorted(custom_domain_dns.items()):
-            dns_string = ' '.join(dns_list)
-            config_lines.append(f"[/{domain}/]{dns_string}")
-        config_lines.append("")
-    
-    # 从国外域名中排除已有自定义DNS的域名
-    foreign_domains_filtered = foreign_domains - set(custom_domain_dns.keys()) if custom_domain_dns else foreign_domains
-    
-    # 添加国外域名规则
-    config_lines.append("#" + "="*50)
-    config_lines.append(f"# 国外域名规则（共 {len(foreign_domains_filtered)} 个域名）")
-    if custom_domain_dns and len(foreign_domains) != len(foreign_domains_filtered):
-        config_lines.append(f"# 已排除 {len(foreign_domains) - len(foreign_domains_filtered)} 个自定义DNS域名")
-    config_lines.append("#" + "="*50)
-    for domain in sorted(foreign_domains_filtered):
-        dns_list = ' '.join(foreign_dns)
-        config_lines.append(f"[/{domain}/]{dns_list}")
-    
-    return '\n'.join(config_lines)
+    prune 为 True 时剔除被上级域名覆盖的子域名规则，被剔除的域名记录到 prune_report 中；
+    overrides 为嵌套在国内或自定义规则之下、需要显式走国外DNS的域名（见 conflicts.resolve_conflicts）
+    main() 通过 artifact_writer 直接写文件，这里返回完整内容，便于单独调用
+    """
+    return _generate_mode_config(artifact_writer.WHITELIST, 'cn_domains', cn_domains, cn_dns, foreign_dns,
+                                 custom_domain_dns, prune, prune_report, overrides)
 
-def debug_domain(domains, domain_to_check):
-    """调试指定域名是否在域名列表中"""
-    if domain_to_check in domains:
-        logger.info(f"域名 {domain_to_check} 在列表中")
-    else:
-        logger.info(f"域名 {domain_to_check} 不在列表中")
-        # 查找相似域名
-        similar_domains = [d for d in domains if domain_to_check in d or d in domain_to_check]
-        if similar_domains:
-            logger.info(f"找到相似域名: {similar_domains}")
+def generate_blacklist_config(cn_domains, foreign_domains, cn_dns, foreign_dns, custom_domain_dns=None, prune=True,
+                              prune_report: Optional[Dict[str, List[str]]] = None, overrides: Optional[Set[str]] = None) -> str:
+    """生成黑名单模式配置（命中国外域名走国外DNS，其他走国内DNS）
+
+    参数含义同 generate_whitelist_config，overrides 为需要显式走国内DNS的域名
+    """
+    return _generate_mode_config(artifact_writer.BLACKLIST, 'foreign_domains', foreign_domains, foreign_dns, cn_dns,
+                                 custom_domain_dns, prune, prune_report, overrides)
+
+def _generate_mode_config(text, name, domains, upstreams, other_upstreams, custom_domain_dns, prune, prune_report, overrides) -> str:
+    custom_domain_dns = custom_domain_dns or {}
+    # 从本模式域名中排除已有自定义DNS的域名
+    filtered = domains - custom_domain_dns.keys()
+    pruned = set()
+    if prune:
+        pruned = artifact_writer.find_pruned(filtered, upstreams, other_upstreams, custom_domain_dns, overrides)
+        if prune_report is not None:
+            prune_report[name] = sorted(pruned)
+    lines = artifact_writer.iter_mode_config(text, sorted(filtered), upstreams, other_upstreams, other_upstreams,
+                                             custom_domain_dns, overrides, pruned, len(domains) - len(filtered))
+    return '\n'.join(lines)
 
 def remove_duplicates_in_list(domains):
-    """在单个列表内部去重"""
+    """在单个列表内部去重，返回 DomainSet"""
     initial_count = len(domains)
-    unique_domains = set(domains)
+    unique_domains = DomainSet(domains)
     if len(unique_domains) < initial_count:
         logger.info(f"从列表中移除了 {initial_count - len(unique_domains)} 个重复域名")
     return unique_domains
 
-def main():
-    """主函数"""
-    # 加载配置
-    config = load_config()
-    
-    # 获取DNS服务器
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='生成 AdGuard Home 分流配置文件')
+    parser.add_argument('--no-cache', action='store_true', help='不使用本地缓存，完整下载所有源')
+    parser.add_argument('--streaming', action='store_true', help='流式下载并解析，内存占用与源文件大小无关')
+    parser.add_argument('--no-prune', action='store_true', help='保留被上级域名覆盖的子域名规则')
+    parser.add_argument('--grouped', action='store_true', help='将上游相同的域名合并到同一行输出')
+    parser.add_argument('--parse-workers', type=int, metavar='N',
+                        help='解析进程数，0 表示使用全部可用 CPU，1 表示在主进程中顺序解析（默认读取 fetch.parse_workers）')
+    parser.add_argument('--querylog', action='append', metavar='PATH',
+                        help='AdGuard Home 的 querylog.json（可重复，支持通配符），额外输出只含命中规则的精简配置（默认读取 hot_set 配置）')
+    parser.add_argument('--probe', action='store_true', help='探测上游DNS，按延迟排列并剔除不可用的上游（默认读取 probe.enabled）')
+    parser.add_argument('--metrics-file', help='运行指标 JSON 文件（默认 .cache/run_metrics.json）')
+    parser.add_argument('--prometheus-file', help='同时写出 Prometheus textfile collector 格式的指标文件')
+    parser.add_argument('--profile', choices=PROFILERS, help='按阶段做性能分析（cProfile 或 tracemalloc）')
+    return parser.parse_args(argv)
+
+def create_run_metrics(config: Dict[str, Any], args) -> RunMetrics:
+    """根据配置和命令行参数创建运行指标收集器"""
+    metrics_config = config.get('metrics', {})
+    profiler = args.profile or metrics_config.get('profile')
+    if profiler and profiler not in PROFILERS:
+        logger.warning(f"未知的性能分析方式 {profiler}，已忽略")
+        profiler = None
+    cache_dir = config.get('cache', {}).get('dir', '.cache')
+    profile_dir = metrics_config.get('profile_dir', os.path.join(cache_dir, 'profiles'))
+    if profiler:
+        logger.info(f"按阶段使用 {profiler} 做性能分析，结果保存在 {profile_dir}")
+    return RunMetrics(profiler=profiler, profile_dir=profile_dir)
+
+def write_run_metrics(config: Dict[str, Any], args, metrics: RunMetrics) -> None:
+    """将本次运行的指标写入缓存目录（不放在 dist/ 中以免影响输出的确定性），并按配置写出 Prometheus 文本文件"""
+    metrics_config = config.get('metrics', {})
+    cache_dir = config.get('cache', {}).get('dir', '.cache')
+    metrics_path = args.metrics_file or metrics_config.get('file', os.path.join(cache_dir, 'run_metrics.json'))
+    prometheus_path = args.prometheus_file or metrics_config.get('prometheus_file')
+    metrics.log_summary()
+    try:
+        metrics.write_json(metrics_path)
+        logger.info(f"运行指标已写入 {metrics_path}")
+        if prometheus_path:
+            metrics.write_prometheus(prometheus_path)
+            logger.info(f"Prometheus 指标已写入 {prometheus_path}")
+    except OSError as e:
+        logger.warning(f"写入运行指标失败: {e}")
+
+def read_dns_config() -> Tuple[List[str], List[str], Dict[str, List[str]]]:
+    """读取国内外DNS服务器和自定义域名DNS配置，返回 (国内DNS, 国外DNS, 自定义域名DNS)"""
     default_cn_dns = ["https://doh.pub/dns-query", "https://dns.alidns.com/dns-query"]
     default_foreign_dns = ["https://1.1.1.1/dns-query", "https://8.8.8.8/dns-query"]
     
@@ -256,73 +434,151 @@ def main():
     logger.info(f"使用国内DNS服务器: {cn_dns}")
     logger.info(f"使用国外DNS服务器: {foreign_dns}")
     logger.info(f"自定义域名DNS规则数: {len(custom_domain_dns)}")
-    
-    # 获取域名源
-    cn_sources = config.get('sources', {}).get('cn_domains', [])
-    foreign_sources = config.get('sources', {}).get('foreign_domains', [])
-    
-    # 提取域名
-    logger.info("开始提取国内域名...")
-    cn_domains = process_sources(cn_sources, os.path.join('config', 'custom_cn_domains.txt'))
-    
-    logger.info("开始提取国外域名...")
-    foreign_domains = process_sources(foreign_sources, os.path.join('config', 'custom_foreign_domains.txt'))
-    
-    # 单独在各自列表内去重
-    logger.info("对国内域名列表进行去重...")
-    cn_domains = remove_duplicates_in_list(cn_domains)
-    logger.info(f"去重后国内域名数量: {len(cn_domains)}")
-    
-    logger.info("对国外域名列表进行去重...")
-    foreign_domains = remove_duplicates_in_list(foreign_domains)
-    logger.info(f"去重后国外域名数量: {len(foreign_domains)}")
+    return cn_dns, foreign_dns, custom_domain_dns
+
+def output_options(config: Dict[str, Any], no_prune: bool = False, grouped: bool = False,
+                   querylog: Optional[List[str]] = None) -> Dict[str, Any]:
+    """读取 output 和 hot_set 配置，返回 write_artifacts 的输出参数；querylog 为命令行指定的查询日志，指定时启用精简配置"""
+    output_config = config.get('output', {})
+    prune = not no_prune and output_config.get('prune_subdomains', True)
+    grouped = grouped or output_config.get('grouped', False)
+    max_line_length = int(output_config.get('max_line_length', upstream_format.DEFAULT_MAX_LINE_LENGTH))
+    if grouped:
+        logger.info(f"将上游相同的域名合并到同一行（每行最长 {max_line_length} 字符）")
+    delta_keep = int(output_config.get('delta_keep', artifact_writer.DEFAULT_DELTA_KEEP))
+    sort_order = output_config.get('sort', artifact_writer.DEFAULT_SORT)
+    if sort_order not in artifact_writer.SORT_KEYS:
+        logger.warning(f"未知的排序方式 {sort_order}，改为 {artifact_writer.DEFAULT_SORT}")
+        sort_order = artifact_writer.DEFAULT_SORT
+    compression = []
+    for fmt in output_config.get('compress', artifact_writer.DEFAULT_COMPRESSION):
+        if fmt in artifact_writer.DEFAULT_COMPRESSION:
+            compression.append(fmt)
+        else:
+            logger.warning(f"不支持的压缩格式 {fmt}，已忽略")
+    hot_config = config.get('hot_set', {})
+    hot = None
+    if querylog or hot_config.get('enabled', False):
+        paths = querylog or hot_config.get('querylog', [])
+        if paths:
+            cache_dir = config.get('cache', {}).get('dir', '.cache')
+            hot = dict(paths=paths, window_days=int(hot_config.get('window_days', hot_set.DEFAULT_WINDOW_DAYS)),
+                       index_file=os.path.join(cache_dir, 'querylog_index.json'))
+        else:
+            logger.warning("已启用精简配置，但没有配置查询日志（hot_set.querylog），只输出完整配置")
+    return dict(prune=prune, grouped=grouped, max_line_length=max_line_length, delta_keep=delta_keep,
+                sort_order=sort_order, compression=compression, hot_set=hot)
+
+def probe_dns_config(config: Dict[str, Any], cn_dns: List[str], foreign_dns: List[str], enabled: bool = False,
+                     metrics: RunMetrics = DISABLED) -> Tuple[List[str], List[str]]:
+    """启用 probe 时探测国内外上游，按延迟重新排列并剔除不可用的上游；结果保存在缓存目录的 upstream_probe.json 中"""
+    probe_config = config.get('probe', {})
+    if not (enabled or probe_config.get('enabled', False)):
+        return cn_dns, foreign_dns
+    logger.info("探测上游DNS的延迟和失败率...")
+    results_file = os.path.join(config.get('cache', {}).get('dir', '.cache'), 'upstream_probe.json')
+    return probe_upstreams.rank_configured_upstreams(probe_config, cn_dns, foreign_dns, results_file, metrics)
+
+def build_outputs(cn_domains, foreign_domains, cn_dns: List[str], foreign_dns: List[str],
+                  custom_domain_dns: Dict[str, List[str]], config: Dict[str, Any], options: Dict[str, Any],
+                  output_dir: str = 'dist', metrics: RunMetrics = DISABLED) -> Tuple[Dict[str, Any], conflicts.Resolution]:
+    """对合并后的国内外域名去重、处理冲突并写出所有产物，返回 (清单, 冲突处理结果)"""
+    with metrics.stage('merge') as record:
+        # 单独在各自列表内去重
+        logger.info("对国内域名列表进行去重...")
+        cn_domains = remove_duplicates_in_list(cn_domains)
+        logger.info(f"去重后国内域名数量: {len(cn_domains)}")
+        
+        logger.info("对国外域名列表进行去重...")
+        foreign_domains = remove_duplicates_in_list(foreign_domains)
+        logger.info(f"去重后国外域名数量: {len(foreign_domains)}")
+        
+        # 处理国内/国外/自定义规则之间的冲突
+        tie_breaker = config.get('conflicts', {}).get('tie_breaker', conflicts.FOREIGN)
+        if tie_breaker not in (conflicts.CN, conflicts.FOREIGN):
+            logger.warning(f"未知的冲突归属 {tie_breaker}，改为 {conflicts.FOREIGN}")
+            tie_breaker = conflicts.FOREIGN
+        logger.info(f"处理域名规则冲突（同时出现在国内外列表中的域名归属{conflicts.LIST_NAMES.get(tie_breaker, tie_breaker)}）...")
+        resolution = conflicts.resolve_conflicts(cn_domains, foreign_domains, custom_domain_dns.keys(), tie_breaker)
+        for key, count in conflicts.summarize(resolution.conflicts).items():
+            logger.info(f"冲突 {key}: {count} 个")
+        record['domains'] = len(resolution.cn_domains) + len(resolution.foreign_domains)
+    
+    hot_names = None
+    if options['hot_set']:
+        with metrics.stage('querylog') as record:
+            hot_names = hot_set.load_observed(**options['hot_set'])
+            record['domains'] = len(hot_names)
     
     # 生成配置文件
-    logger.info("生成白名单模式配置文件...")
-    whitelist_config = generate_whitelist_config(cn_domains, foreign_domains, cn_dns, foreign_dns, custom_domain_dns)
-    
-    logger.info("生成黑名单模式配置文件...")
-    blacklist_config = generate_blacklist_config(cn_domains, foreign_domains, cn_dns, foreign_dns, custom_domain_dns)
-    
-    # 确保目录存在
-    os.makedirs('dist', exist_ok=True)
+    reports = {'conflict_report.txt': conflicts.iter_conflict_report(resolution, tie_breaker)}
+    manifest = artifact_writer.write_artifacts(output_dir, resolution.cn_domains, resolution.foreign_domains, cn_dns, foreign_dns,
+                                               custom_domain_dns, resolution.whitelist_overrides, resolution.blacklist_overrides,
+                                               options['prune'], options['grouped'], options['max_line_length'], reports,
+                                               options['delta_keep'], options['sort_order'], options['compression'], metrics,
+                                               hot_names)
+    return manifest, resolution
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
     
-    # 保存配置文件
-    with open(os.path.join('dist', 'whitelist_mode.txt'), 'w', encoding='utf-8') as f:
-        f.write(whitelist_config)
+    # 加载配置
+    config = load_config()
+    metrics = create_run_metrics(config, args)
     
-    with open(os.path.join('dist', 'blacklist_mode.txt'), 'w', encoding='utf-8') as f:
-        f.write(blacklist_config)
+    # 获取DNS服务器
+    cn_dns, foreign_dns, custom_domain_dns = read_dns_config()
+    cn_dns, foreign_dns = probe_dns_config(config, cn_dns, foreign_dns, args.probe, metrics)
     
-    # 保存域名列表（用于调试）
-    with open(os.path.join('dist', 'cn_domains.txt'), 'w', encoding='utf-8') as f:
-        for domain in sorted(cn_domains):
-            f.write(f"{domain}\n")
+    # 获取域名源
+    fetch_config = config.get('fetch', {})
+    timeout = float(fetch_config.get('timeout', extract_domains.DEFAULT_TIMEOUT))
+    workers = int(fetch_config.get('workers', extract_domains.DEFAULT_WORKERS))
+    cn_sources = normalize_sources(config.get('sources', {}).get('cn_domains', []), timeout)
+    foreign_sources = normalize_sources(config.get('sources', {}).get('foreign_domains', []), timeout)
+    
+    # 国内外两组源一起并发下载
+    logger.info("开始并发下载域名源...")
+    http_cache = create_http_cache(config, enabled=not args.no_cache)
+    parse_cache = create_parse_cache(config, enabled=not args.no_cache)
+    source_groups = {'cn_domains': cn_sources, 'foreign_domains': foreign_sources}
+    contents, parsed = None, None
+    with metrics.stage('fetch') as record:
+        if args.streaming or fetch_config.get('streaming', False):
+            logger.info("使用流式下载解析模式")
+            parsed = stream_sources(source_groups, workers, http_cache, parse_cache, metrics)
+            record['domains'] = sum(len(domains) for domains in parsed.values() if domains)
+        else:
+            contents = fetch_sources(source_groups, workers, http_cache, metrics)
+            record['bytes'] = sum(len(content) for content in contents.values())
     
-    with open(os.path.join('dist', 'foreign_domains.txt'), 'w', encoding='utf-8') as f:
-        for domain in sorted(foreign_domains):
-            f.write(f"{domain}\n")
+    # 提取域名
+    parse_workers = args.parse_workers if args.parse_workers is not None else int(fetch_config.get('parse_workers', 1))
+    if parse_workers <= 0:
+        parse_workers = parallel_parse.available_cpus()
+    with metrics.stage('parse') as record:
+        if contents is not None and parse_workers > 1:
+            parsed = parse_sources(source_groups, contents, parse_workers, parse_cache, metrics)
+        logger.info("开始提取国内域名...")
+        cn_domains = process_sources(cn_sources, os.path.join('config', 'custom_cn_domains.txt'), contents, parse_cache, parsed, metrics)
+        
+        logger.info("开始提取国外域名...")
+        foreign_domains = process_sources(foreign_sources, os.path.join('config', 'custom_foreign_domains.txt'), contents, parse_cache, parsed, metrics)
+        record['domains'] = len(cn_domains) + len(foreign_domains)
+    contents = None
     
-    # 保存自定义域名DNS列表（用于调试）
-    if custom_domain_dns:
-        with open(os.path.join('dist', 'custom_domain_dns_debug.txt'), 'w', encoding='utf-8') as f:
-            for domain, dns_list in sorted(custom_domain_dns.items()):
-                f.write(f"{domain}: {', '.join(dns_list)}\n")
+    options = output_options(config, args.no_prune, args.grouped, args.querylog)
+    manifest, resolution = build_outputs(cn_domains, foreign_domains, cn_dns, foreign_dns, custom_domain_dns,
+                                         config, options, metrics=metrics)
+    metrics.extra['generation'] = manifest['generation']
+    write_run_metrics(config, args, metrics)
     
     logger.info("配置文件生成完成")
-    logger.info(f"白名单模式：共 {len(cn_domains)} 个国内域名")
-    logger.info(f"黑名单模式：共 {len(foreign_domains)} 个国外域名")
+    logger.info(f"白名单模式：共 {len(resolution.cn_domains)} 个国内域名")
+    logger.info(f"黑名单模式：共 {len(resolution.foreign_domains)} 个国外域名")
     logger.info(f"自定义域名DNS：共 {len(custom_domain_dns)} 个域名")
-    
-    # 统计被覆盖的域名
-    if custom_domain_dns:
-        cn_overridden = len(cn_domains.intersection(set(custom_domain_dns.keys())))
-        foreign_overridden = len(foreign_domains.intersection(set(custom_domain_dns.keys())))
-        
-        if cn_overridden > 0:
-            logger.info(f"自定义DNS覆盖了 {cn_overridden} 个国内域名")
-        if foreign_overridden > 0:
-            logger.info(f"自定义DNS覆盖了 {foreign_overridden} 个国外域名")
+    logger.info(f"规则冲突：共 {len(resolution.conflicts)} 个，详见 dist/conflict_report.txt")
 
 if __name__ == "__main__":
     main()
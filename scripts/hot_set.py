@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+查询日志热点规则
+读取 AdGuard Home 的 querylog.json（每行一条 JSON 记录，T 为查询时间，QH 为查询的域名），
+按天累计各域名的查询次数并保存为索引（默认 .cache/querylog_index.json）；每个日志文件只读取上次之后新增的内容，
+日志轮转（querylog.json -> querylog.json.1）后也不会重复计数，索引可以覆盖比 AdGuard Home 日志保留期更长的窗口。
+
+生成配置时据此输出精简的分流配置（whitelist_mode_hot.txt/blacklist_mode_hot.txt）：只保留窗口期内被查询过的域名
+实际命中的规则和全部自定义规则，窗口期内查询过的域名的路由与完整配置相同，其他域名可能改走默认上游。
+窗口按索引中最新的查询日期计算（不使用当前时间），相同的日志总是得到相同的结果
+
+用法：
+    python scripts/hot_set.py /opt/AdGuardHome/data/querylog.json*   # 更新索引并输出各模式的规则覆盖情况
+"""
+
+import os
+import re
+import sys
+import glob
+import gzip
+import json
+import logging
+import argparse
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from domain_trie import parent_domains
+
+logger = logging.getLogger('hot_set')
+
+INDEX_VERSION = 1
+DEFAULT_WINDOW_DAYS = 7
+DAY_SECONDS = 86400
+
+HOT_FILES = {'whitelist_mode.txt': 'whitelist_mode_hot.txt', 'blacklist_mode.txt': 'blacklist_mode_hot.txt'}
+
+TIME_PATTERN = re.compile(r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.\d+)?(Z|[+-]\d\d:\d\d)?$')
+
+def parse_time(value: Any) -> Optional[int]:
+    """解析 querylog 中的时间（RFC 3339，小数部分可到纳秒），返回 Unix 时间戳（秒），无法解析时返回 None"""
+    match = TIME_PATTERN.match(value) if isinstance(value, str) else None
+    if not match:
+        return None
+    base, zone = match.groups()
+    parsed = datetime.fromisoformat(base + ('+00:00' if zone in (None, 'Z') else zone))
+    return int(parsed.astimezone(timezone.utc).timestamp())
+
+def expand_paths(patterns: Iterable[str]) -> List[str]:
+    """展开日志路径中的通配符，按文件名排序并去重"""
+    paths: List[str] = []
+    for pattern in patterns:
+        matched = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        paths.extend(path for path in matched if path not in paths)
+    return paths
+
+class QueryIndex:
+    """按天统计的查询域名索引：日期（Unix 天数）-> 域名 -> 查询次数"""
+
+    def __init__(self):
+        self.days: Dict[int, Dict[str, int]] = {}
+        # 各日志文件（按设备号和 inode 区分，轮转改名后仍能识别）已读取到的位置
+        self.offsets: Dict[str, int] = {}
+
+    @classmethod
+    def load(cls, file_path: str) -> 'QueryIndex':
+        """读取保存的索引，不存在、已损坏或版本不同时返回空索引"""
+        index = cls()
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                index.days = {int(day): names for day, names in data.get('days', {}).items()}
+                index.offsets = data.get('offsets', {})
+        except (OSError, ValueError, AttributeError):
+            pass
+        return index
+
+    def save(self, file_path: str) -> None:
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        data = {'version': INDEX_VERSION, 'offsets': self.offsets,
+                'days': {str(day): names for day, names in sorted(self.days.items())}}
+        with open(file_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'), sort_keys=True)
+        os.replace(file_path + '.tmp', file_path)
+
+    def add(self, name: str, timestamp: int, count: int = 1) -> None:
+        name = name.rstrip('.').lower()
+        if name:
+            names = self.days.setdefault(timestamp // DAY_SECONDS, {})
+            names[name] = names.get(name, 0) + count
+
+    def read_log(self, file_path: str) -> int:
+        """读取日志文件中上次之后新增的记录，返回读取的记录数；.gz 结尾的文件按 gzip 读取
+
+        文件比上次读取的位置短（被清空或重建）时从头读取；最后一行不完整时留到下次再读
+        """
+        stat = os.stat(file_path)
+        key = f"{stat.st_dev}:{stat.st_ino}"
+        offset = self.offsets.get(key, 0)
+        gzipped = file_path.endswith('.gz')
+        if not gzipped and offset > stat.st_size:
+            offset = 0
+        records = 0
+        opener = gzip.open if gzipped else open
+        with opener(file_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                    name, timestamp = record.get('QH'), parse_time(record.get('T'))
+                except (ValueError, AttributeError):
+                    continue
+                if isinstance(name, str) and timestamp is not None:
+                    self.add(name, timestamp)
+                    records += 1
+        self.offsets[key] = offset
+        return records
+
+    def latest_day(self) -> Optional[int]:
+        return max(self.days, default=None)
+
+    def expire(self, window_days: int) -> None:
+        """删除窗口之外的日期"""
+        latest = self.latest_day()
+        if latest is not None:
+            for day in [day for day in self.days if day <= latest - window_days]:
+                del self.days[day]
+
+    def observed(self, window_days: int) -> Dict[str, int]:
+        """窗口期内（截至最新的查询日期）各域名的查询次数"""
+        latest = self.latest_day()
+        counts: Dict[str, int] = {}
+        for day, names in self.days.items():
+            if day > latest - window_days:
+                for name, count in names.items():
+                    counts[name] = counts.get(name, 0) + count
+        return counts
+
+def update_index(paths: Iterable[str], index_file: str, window_days: int = DEFAULT_WINDOW_DAYS) -> QueryIndex:
+    """读取日志中新增的记录并更新保存的索引，返回更新后的索引"""
+    index = QueryIndex.load(index_file)
+    for path in expand_paths(paths):
+        try:
+            records = index.read_log(path)
+        except (OSError, EOFError, gzip.BadGzipFile) as e:
+            logger.warning(f"读取查询日志 {path} 失败: {e}")
+            continue
+        logger.info(f"从 {path} 读取了 {records} 条新的查询记录")
+    index.expire(window_days)
+    # 已不存在的日志文件不再需要记录读取位置
+    present = set()
+    for path in expand_paths(paths):
+        try:
+            stat = os.stat(path)
+            present.add(f"{stat.st_dev}:{stat.st_ino}")
+        except OSError:
+            pass
+    index.offsets = {key: offset for key, offset in index.offsets.items() if key in present}
+    try:
+        index.save(index_file)
+    except OSError as e:
+        logger.warning(f"保存查询日志索引失败: {e}")
+    return index
+
+def load_observed(paths: Iterable[str], window_days: int = DEFAULT_WINDOW_DAYS,
+                  index_file: Optional[str] = None) -> Dict[str, int]:
+    """更新索引并返回窗口期内查询过的域名及其查询次数；不提供 index_file 时只读取本次的日志"""
+    if index_file:
+        index = update_index(paths, index_file, window_days)
+    else:
+        index = QueryIndex()
+        for path in expand_paths(paths):
+            index.read_log(path)
+    observed = index.observed(window_days)
+    latest = index.latest_day()
+    if latest is not None:
+        first = datetime.fromtimestamp((latest - window_days + 1) * DAY_SECONDS, timezone.utc).date()
+        last = datetime.fromtimestamp(latest * DAY_SECONDS, timezone.utc).date()
+        logger.info(f"查询日志窗口 {first} ~ {last}：{len(observed)} 个域名，共 {sum(observed.values())} 次查询")
+    else:
+        logger.warning("查询日志中没有可用的记录")
+    return observed
+
+def match_rules(observed: Dict[str, int], is_rule: Callable[[str], bool]) -> Tuple[Set[str], int]:
+    """找出查询的域名实际命中的规则（最具体者优先），返回 (命中的规则, 命中规则的查询次数)"""
+    matched: Set[str] = set()
+    hits = 0
+    for name, count in observed.items():
+        if is_rule(name):
+            matched.add(name)
+            hits += count
+            continue
+        for parent in parent_domains(name):
+            if is_rule(parent):
+                matched.add(parent)
+                hits += count
+                break
+    return matched, hits
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='根据 AdGuard Home 的查询日志统计实际命中的分流规则')
+    parser.add_argument('querylog', nargs='+', help='querylog.json 文件（可指定多个，支持通配符和 .gz）')
+    parser.add_argument('--dist', default='dist', help='生成结果所在目录（默认 dist）')
+    parser.add_argument('--window-days', type=int, default=DEFAULT_WINDOW_DAYS, help=f'窗口天数（默认 {DEFAULT_WINDOW_DAYS}）')
+    parser.add_argument('--index', default=os.path.join('.cache', 'querylog_index.json'), help='查询日志索引文件')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                        stream=sys.stdout)
+
+    import lookup_domain
+    observed = load_observed(args.querylog, args.window_days, args.index)
+    queries = sum(observed.values())
+    for mode in sorted(lookup_domain.MODE_FILES):
+        try:
+            table = lookup_domain.load_routing_table(args.dist, mode, 'config')
+        except OSError as e:
+            logger.error(f"加载 {mode} 模式的分流配置失败：{e}")
+            sys.exit(1)
+        matched, hits = match_rules(observed, table.rules.__contains__)
+        print(f"{mode}: 命中 {len(matched)}/{len(table.rules)} 条规则（{len(matched) / max(len(table.rules), 1):.2%}），"
+              f"命中规则的查询 {hits / max(queries, 1):.1%}")
+
+if __name__ == "__main__":
+    main()
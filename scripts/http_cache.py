@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HTTP 条件请求缓存
+将下载内容连同 ETag/Last-Modified 校验信息保存在本地目录中，
+后续下载时发送 If-None-Match/If-Modified-Since，收到 304 时直接复用缓存内容
+缓存总大小有上限，超出时按最近使用时间淘汰
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger('http_cache')
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'http')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class HttpCache:
+    """按URL保存响应体及其校验信息的磁盘缓存"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.body")
+
+    def _read_meta(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._meta_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key: str, meta: Dict) -> None:
+        tmp_path = self._meta_path(key) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self._meta_path(key))
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """返回URL对应的缓存元数据，缓存不存在或已损坏时返回 None"""
+        key = self._key(url)
+        meta = self._read_meta(key)
+        if not meta or meta.get('url') != url or not os.path.exists(self._body_path(key)):
+            return None
+        return meta
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """生成条件请求头"""
+        meta = self.lookup(url)
+        if not meta:
+            return {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def body_path(self, url: str) -> str:
+        """返回URL对应的缓存内容文件路径"""
+        return self._body_path(self._key(url))
+
+    def load(self, url: str) -> Optional[bytes]:
+        """读取缓存内容，并更新最近使用时间"""
+        meta = self.lookup(url)
+        if not meta:
+            return None
+        key = self._key(url)
+        try:
+            with open(self._body_path(key), 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        self.touch(url)
+        return body
+
+    def touch(self, url: str) -> None:
+        """更新缓存条目的最近使用时间"""
+        meta = self.lookup(url)
+        if meta:
+            meta['last_used'] = time.time()
+            self._write_meta(self._key(url), meta)
+
+    def store(self, url: str, body: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """保存响应内容及其校验信息"""
+        if len(body) > self.max_bytes:
+            logger.info(f"{url} 的内容超过缓存上限，不写入缓存")
+            return
+        tmp_path = self.temp_path(url)
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        self.store_file(url, tmp_path, hashlib.sha256(body).hexdigest(), etag, last_modified)
+
+    def temp_path(self, url: str) -> str:
+        """返回写入URL内容时使用的临时文件路径"""
+        return self._body_path(self._key(url)) + '.tmp'
+
+    def store_file(self, url: str, tmp_path: str, sha256: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """将已写入临时文件的响应内容移入缓存
+
+        用于流式下载：内容边读边写入 temp_path，读完后再登记
+        """
+        size = os.path.getsize(tmp_path)
+        if size > self.max_bytes:
+            logger.info(f"{url} 的内容超过缓存上限，不写入缓存")
+            os.remove(tmp_path)
+            return
+        key = self._key(url)
+        os.replace(tmp_path, self._body_path(key))
+        self._write_meta(key, {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'size': size,
+            'sha256': sha256,
+            'last_used': time.time(),
+        })
+        self.evict()
+
+    def evict(self) -> None:
+        """缓存总大小超过上限时，按最近使用时间淘汰旧条目"""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith('.json'):
+                    continue
+                key = name[:-len('.json')]
+                meta = self._read_meta(key)
+                if meta:
+                    entries.append((meta.get('last_used', 0), meta.get('size', 0), key))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                for path in (self._body_path(key), self._meta_path(key)):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                logger.info(f"从HTTP缓存中淘汰了 {key}（{size} 字节）")
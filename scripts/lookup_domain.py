@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+域名路由查询工具
+按 AdGuard Home 的后缀匹配规则（最具体的 [/域名/] 规则生效，自定义DNS规则同样参与匹配）
+查询域名实际使用的上游DNS。默认直接在 mmap 打开的二进制索引上二分查找，不需要把规则载入内存；
+解析分流配置时路由表只加载一次，之后每次查询只需沿上级域名做几次字典查找，
+两者的查询结果都带缓存，适合批量审计查询日志中的大量域名
+
+用法：
+    python lookup_domain.py www.example.com
+    cut -f1 domains.txt | python lookup_domain.py --mode blacklist --summary
+输出每行为 域名<TAB>上游DNS<TAB>命中的规则（未命中任何规则时为 -，使用默认上游）
+"""
+
+import os
+import sys
+import logging
+import argparse
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import upstream_format
+from domain_index import BLACKLIST, INDEX_NAME, WHITELIST, DomainIndex
+from domain_trie import parent_domains
+
+logger = logging.getLogger('lookup_domain')
+
+MODE_FILES = {WHITELIST: 'whitelist_mode.txt', BLACKLIST: 'blacklist_mode.txt'}
+CACHE_SIZE = 1 << 16
+
+class RoutingTable:
+    """域名 -> 上游DNS 的路由表，查询结果带 LRU 缓存（查询日志中的域名重复率很高）"""
+
+    def __init__(self, rules: Dict[str, str], default: str):
+        self.rules = rules
+        self.default = default
+        self.route = lru_cache(maxsize=CACHE_SIZE)(self._route)
+
+    @classmethod
+    def from_config(cls, file_path: str) -> 'RoutingTable':
+        """从生成的分流配置（whitelist_mode.txt/blacklist_mode.txt）加载，即 AdGuard Home 实际加载的内容"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            defaults, rules = upstream_format.parse_upstream_config(f)
+        return cls(rules, ' '.join(defaults))
+
+    def _route(self, domain: str) -> Tuple[Optional[str], str]:
+        """返回 (命中的规则域名或 None, 实际使用的上游DNS)"""
+        domain = domain.rstrip('.').lower()
+        rules = self.rules
+        upstream = rules.get(domain)
+        if upstream is not None:
+            return domain, upstream
+        for parent in parent_domains(domain):
+            upstream = rules.get(parent)
+            if upstream is not None:
+                return parent, upstream
+        return None, self.default
+
+    def close(self) -> None:
+        """规则全部在内存中，不需要释放资源"""
+
+class IndexRoutingTable:
+    """直接在二进制索引（dist/domain_index.bin）上查询的路由表，打开时只读取文件头，规则不载入内存"""
+
+    def __init__(self, file_path: str, mode: str = WHITELIST):
+        self.index = DomainIndex(file_path)
+        self.mode = mode
+        self.route = lru_cache(maxsize=CACHE_SIZE)(self._route)
+
+    def _route(self, domain: str) -> Tuple[Optional[str], str]:
+        """返回 (命中的规则域名或 None, 实际使用的上游DNS)"""
+        return self.index.route(domain, self.mode)
+
+    def close(self) -> None:
+        self.index.close()
+
+def load_routing_table(dist_dir: str, mode: str, source: str = 'auto') -> Union[RoutingTable, IndexRoutingTable]:
+    """加载路由表：source 为 index 时打开二进制索引，config 时解析分流配置，auto 时优先使用索引"""
+    index_path = os.path.join(dist_dir, INDEX_NAME)
+    if source == 'index' or (source == 'auto' and os.path.exists(index_path)):
+        return IndexRoutingTable(index_path, mode)
+    return RoutingTable.from_config(os.path.join(dist_dir, MODE_FILES[mode]))
+
+def iter_domains(lines: Iterable[str]) -> Iterator[str]:
+    """从输入行中取出域名，跳过空行和注释；每行只取第一列，可以直接接收 `域名 其他字段` 形式的日志"""
+    for line in lines:
+        fields = line.split(None, 1)
+        if fields and not fields[0].startswith('#'):
+            yield fields[0]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按 AdGuard Home 的匹配规则查询域名实际使用的上游DNS')
+    parser.add_argument('domains', nargs='*', help='要查询的域名，不指定时从标准输入逐行读取')
+    parser.add_argument('--dist', default='dist', help='生成结果所在目录（默认 dist）')
+    parser.add_argument('--mode', choices=sorted(MODE_FILES), default=WHITELIST, help='分流模式（默认 whitelist）')
+    parser.add_argument('--source', choices=('auto', 'index', 'config'), default='auto',
+                        help='路由表来源：二进制索引或分流配置文件，默认优先使用索引')
+    parser.add_argument('--summary', action='store_true', help='结束时在标准错误输出各上游的命中次数')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                        stream=sys.stderr)
+
+    try:
+        table = load_routing_table(args.dist, args.mode, args.source)
+    except (OSError, ValueError) as e:
+        logger.error(f"加载路由表失败：{e}")
+        sys.exit(1)
+
+    counter: Counter = Counter()
+    out = sys.stdout
+    try:
+        for domain in iter_domains(args.domains or sys.stdin):
+            matched, upstream = table.route(domain)
+            counter[upstream] += 1
+            out.write(f"{domain}\t{upstream}\t{matched or '-'}\n")
+        out.flush()
+    finally:
+        table.close()
+
+    if args.summary:
+        total = sum(counter.values())
+        info = table.route.cache_info()
+        logger.info(f"共查询 {total} 个域名，缓存命中 {info.hits} 次")
+        for upstream, count in counter.most_common():
+            logger.info(f"{count}\t{count / total:.1%}\t{upstream}")
+
+if __name__ == "__main__":
+    main()
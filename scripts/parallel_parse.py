@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多进程解析
+把各源的解析交给进程池，dnsmasq-china-list 这类逐行独立解析的大文件再按行切成若干块并行解析。
+子进程把域名用换行拼接成一个 UTF-8 字节串返回，避免逐个序列化几十万个字符串对象；
+格式在主进程中按完整内容识别，各块结果的并集与顺序解析的结果完全相同
+"""
+
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+import extract_domains
+from run_metrics import read_peak_rss, reset_peak_rss
+
+logger = logging.getLogger('parallel_parse')
+
+# 每行单独分类、不依赖上下文的格式可以按行切块；YAML 需要整体解析，GFWList 需要整体 Base64 解码
+CHUNKABLE_FORMATS = ('dnsmasq', 'adblock', 'blackmatrix7', 'plain')
+MIN_CHUNK_BYTES = 256 * 1024
+
+def available_cpus() -> int:
+    """本进程可以使用的 CPU 数（考虑 CPU 亲和性限制，如容器或 taskset）"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS、Windows
+        return os.cpu_count() or 1
+
+def split_lines(content: str, parts: int, min_bytes: int = MIN_CHUNK_BYTES) -> List[str]:
+    """在换行处把内容切成最多 parts 块，每块至少 min_bytes 个字符"""
+    size = max(min_bytes, -(-len(content) // max(parts, 1)))
+    chunks = []
+    start = 0
+    while len(content) - start > size:
+        end = content.find('\n', start + size)
+        if end < 0:
+            break
+        chunks.append(content[start:end + 1])
+        start = end + 1
+    chunks.append(content[start:])
+    return chunks
+
+def encode_domains(domains: Set[str]) -> bytes:
+    return '\n'.join(domains).encode('utf-8')
+
+def decode_domains(data: bytes) -> Set[str]:
+    return set(data.decode('utf-8').split('\n')) if data else set()
+
+def _parse_chunk(content: str, fmt: str) -> Tuple[bytes, float, Optional[int]]:
+    """在子进程中解析一块内容，返回 (编码后的域名, 耗时, 子进程解析期间的内存峰值)"""
+    reset_peak_rss()
+    start = time.perf_counter()
+    data = encode_domains(extract_domains.FORMAT_PARSERS[fmt][0](content))
+    return data, time.perf_counter() - start, read_peak_rss()
+
+def parse_contents(tasks: List[Tuple[str, str, Optional[str]]], workers: int,
+                   min_chunk_bytes: int = MIN_CHUNK_BYTES) -> Dict[str, Tuple[Set[str], float, Optional[int]]]:
+    """用进程池解析 [(url, 内容, 配置指定的格式)]，返回 url -> (域名集合, 各块解析耗时之和, 解析各块的子进程内存峰值的最大值)"""
+    formats = {}
+    jobs: List[Tuple[str, str]] = []
+    for url, content, fmt in tasks:
+        fmt, _ = extract_domains.resolve_format(content, url, fmt)
+        formats[url] = fmt
+        chunks = split_lines(content, workers, min_chunk_bytes) if fmt in CHUNKABLE_FORMATS else [content]
+        if len(chunks) > 1:
+            logger.info(f"{url} 切分为 {len(chunks)} 块并行解析")
+        jobs.extend((url, chunk) for chunk in chunks)
+
+    results: Dict[str, Tuple[Set[str], float, Optional[int]]] = {url: (set(), 0.0, None) for url in formats}
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as executor:
+        # 按大小从大到小提交，避免最大的块最后才开始
+        order = sorted(range(len(jobs)), key=lambda i: len(jobs[i][1]), reverse=True)
+        futures = {i: executor.submit(_parse_chunk, jobs[i][1], formats[jobs[i][0]]) for i in order}
+        for i, (url, _) in enumerate(jobs):
+            data, seconds, peak = futures[i].result()
+            domains, total, url_peak = results[url]
+            domains.update(decode_domains(data))
+            if peak is not None and (url_peak is None or peak > url_peak):
+                url_peak = peak
+            results[url] = (domains, total + seconds, url_peak)
+
+    for url, (domains, _, _) in results.items():
+        logger.info(f"从{extract_domains.FORMAT_PARSERS[formats[url]][1]}中提取到 {len(domains)} 个域名")
+    return results
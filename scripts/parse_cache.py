@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+解析结果缓存
+按 源URL + 内容哈希 + 解析器版本 缓存每个源提取出的域名集合，
+内容未变化时直接加载缓存，跳过耗时的解析（尤其是 YAML）
+每个源只保留最近一次成功解析的结果，下载失败时可作为最后可用结果使用
+"""
+
+import os
+import json
+import zlib
+import hashlib
+import logging
+from typing import Optional, Set
+
+logger = logging.getLogger('parse_cache')
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'parsed')
+
+def content_hash(content: str) -> str:
+    """计算源内容的哈希值"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+class ParseCache:
+    """按源保存解析结果的磁盘缓存
+
+    文件格式：第一行为JSON头部（url、内容哈希、解析器版本、域名数），
+    其后是按行排序的域名列表经 zlib 压缩后的数据
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.domains")
+
+    def _read(self, url: str, with_domains: bool = True):
+        try:
+            with open(self._path(url), 'rb') as f:
+                header = json.loads(f.readline().decode('utf-8'))
+                if header.get('url') != url:
+                    return None, None
+                if not with_domains:
+                    return header, None
+                data = zlib.decompress(f.read()).decode('utf-8')
+        except (OSError, ValueError, zlib.error) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"读取 {url} 的解析缓存失败：{e}")
+            return None, None
+        domains = set(data.split('\n')) if data else set()
+        return header, domains
+
+    def get(self, url: str, digest: str, parser_version: str) -> Optional[Set[str]]:
+        """内容哈希和解析器版本都匹配时返回缓存的域名集合"""
+        header, _ = self._read(url, with_domains=False)
+        if not header or header.get('content_sha256') != digest or header.get('parser_version') != parser_version:
+            return None
+        _, domains = self._read(url)
+        return domains
+
+    def put(self, url: str, digest: str, parser_version: str, domains: Set[str]) -> None:
+        """保存解析结果"""
+        header = {
+            'url': url,
+            'content_sha256': digest,
+            'parser_version': parser_version,
+            'count': len(domains),
+        }
+        path = self._path(url)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n')
+            f.write(zlib.compress('\n'.join(sorted(domains)).encode('utf-8')))
+        os.replace(tmp_path, path)
+
+    def last_known_good(self, url: str) -> Optional[Set[str]]:
+        """返回该源最近一次成功解析的结果，不校验内容哈希"""
+        header, domains = self._read(url)
+        if header is None:
+            return None
+        return domains
+
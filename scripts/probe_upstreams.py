@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+上游DNS探测
+对 cn_dns.txt/foreign_dns.txt 中的每个上游并发发送若干次 A 记录查询，统计 p50/p95 延迟和失败率，
+据此重新排列上游顺序（按延迟从低到高），并剔除失败率过高的上游，供生成配置时使用。
+支持 DoH（https://，RFC 8484 POST）、普通 DNS（udp://、tcp:// 或不带协议的 地址[:端口]）；
+其他协议（tls://、quic://、sdns:// 等）不探测，保留在已探测的可用上游之后
+
+延迟按 probe.bucket_ms 分桶后再排序，桶内保持原有顺序，避免延迟的小幅波动导致每次生成的规则都不同
+
+用法：
+    python scripts/probe_upstreams.py                  # 探测 config/ 中的国内外上游并输出结果
+    python scripts/probe_upstreams.py udp://127.0.0.1:5353 https://127.0.0.1:8443/dns-query --domain example.com
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import struct
+import logging
+import argparse
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from run_metrics import DISABLED, RunMetrics
+
+logger = logging.getLogger('probe_upstreams')
+
+DEFAULT_QUERIES = 10
+DEFAULT_CONCURRENCY = 2
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_MAX_ERROR_RATE = 0.5
+DEFAULT_BUCKET_MS = 20
+DEFAULT_CN_DOMAINS = ['www.baidu.com', 'www.qq.com', 'www.taobao.com']
+DEFAULT_FOREIGN_DOMAINS = ['www.google.com', 'www.youtube.com', 'www.wikipedia.org']
+
+DOH = 'doh'
+UDP = 'udp'
+TCP = 'tcp'
+
+class ProbeError(Exception):
+    """单次探测查询失败"""
+
+class ProbeResult(NamedTuple):
+    """单个上游的探测结果，延迟单位为毫秒；kind 为 None 表示不支持探测该协议"""
+    upstream: str
+    kind: Optional[str]
+    queries: int
+    errors: int
+    p50_ms: Optional[float]
+    p95_ms: Optional[float]
+    error: Optional[str] = None
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.queries if self.queries else 0.0
+
+def build_query(domain: str, query_id: int, qtype: int = 1) -> bytes:
+    """构造 DNS 查询报文（RD 置位，IN 类）"""
+    qname = b''.join(bytes([len(label)]) + label for label in (part.encode('idna') for part in domain.rstrip('.').split('.')))
+    return struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0) + qname + b'\x00' + struct.pack('!HH', qtype, 1)
+
+def check_response(data: bytes, query_id: int) -> None:
+    """检查响应报文：ID 一致、为应答，且返回码为 NOERROR 或 NXDOMAIN"""
+    if len(data) < 12:
+        raise ProbeError(f"响应过短（{len(data)} 字节）")
+    response_id, flags = struct.unpack_from('!HH', data)
+    if response_id != query_id or not flags & 0x8000:
+        raise ProbeError("响应与查询不匹配")
+    rcode = flags & 0x000F
+    if rcode not in (0, 3):
+        raise ProbeError(f"返回码 {rcode}")
+
+def parse_upstream(upstream: str) -> Tuple[Optional[str], Any]:
+    """解析上游地址，返回 (协议, 目标)：DoH 为 URL，UDP/TCP 为 (主机, 端口)，不支持的协议为 (None, None)
+
+    http:// 按不加密的 DoH 处理，只用于本地模拟的上游（AdGuard Home 本身不支持）
+    """
+    if upstream.startswith(('https://', 'http://')):
+        return DOH, upstream
+    scheme, _, rest = upstream.rpartition('://')
+    if scheme not in ('', UDP, TCP):
+        return None, None
+    if rest.count(':') > 1 and not rest.startswith('['):
+        # 不带方括号（也就不带端口）的 IPv6 地址
+        return scheme or UDP, (rest, 53)
+    parts = urllib.parse.urlsplit(f"//{rest}")
+    try:
+        port = parts.port or 53
+    except ValueError:
+        return None, None
+    if not parts.hostname:
+        return None, None
+    return scheme or UDP, (parts.hostname, port)
+
+class _DohConnection:
+    """DoH 查询连接，同一线程内的查询复用连接"""
+
+    def __init__(self, url: str, timeout: float):
+        parts = urllib.parse.urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+        self._path = parts.path or '/dns-query'
+
+    def query(self, data: bytes) -> bytes:
+        headers = {'Content-Type': 'application/dns-message', 'Accept': 'application/dns-message'}
+        try:
+            self._connection.request('POST', self._path, body=data, headers=headers)
+            response = self._connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            self._connection.close()
+            raise
+        if response.status != 200:
+            raise ProbeError(f"HTTP {response.status}")
+        return body
+
+    def close(self) -> None:
+        self._connection.close()
+
+def _udp_query(target: Tuple[str, int], data: bytes, timeout: float) -> bytes:
+    family = socket.AF_INET6 if ':' in target[0] else socket.AF_INET
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.sendto(data, target)
+        return sock.recv(4096)
+
+def _tcp_query(target: Tuple[str, int], data: bytes, timeout: float) -> bytes:
+    with socket.create_connection(target, timeout=timeout) as sock:
+        sock.sendall(struct.pack('!H', len(data)) + data)
+        header = sock.recv(2, socket.MSG_WAITALL)
+        if len(header) < 2:
+            raise ProbeError("连接被关闭")
+        length, = struct.unpack('!H', header)
+        return sock.recv(length, socket.MSG_WAITALL)
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近秩法计算百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+def _probe_worker(kind: str, target: Any, domains: List[str], count: int, timeout: float) -> Tuple[List[float], List[str]]:
+    """顺序发送 count 次查询，返回 (成功查询的延迟毫秒数, 失败原因)
+
+    DoH 先发一次不计入统计的预热查询，建立连接（含 TLS 握手）的耗时不算在查询延迟里
+    """
+    latencies: List[float] = []
+    errors: List[str] = []
+    connection = _DohConnection(target, timeout) if kind == DOH else None
+    rng = random.Random()
+    try:
+        if connection is not None:
+            try:
+                connection.query(build_query(domains[0], 0))
+            except (OSError, http.client.HTTPException, ProbeError):
+                pass
+        for i in range(count):
+            query_id = rng.randrange(1 << 16)
+            data = build_query(domains[i % len(domains)], query_id)
+            start = time.perf_counter()
+            try:
+                if kind == DOH:
+                    response = connection.query(data)
+                elif kind == TCP:
+                    response = _tcp_query(target, data, timeout)
+                else:
+                    response = _udp_query(target, data, timeout)
+                check_response(response, query_id)
+            except (OSError, http.client.HTTPException, ProbeError, struct.error) as e:
+                errors.append(str(e) or type(e).__name__)
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        if connection is not None:
+            connection.close()
+    return latencies, errors
+
+def probe_upstream(upstream: str, domains: List[str], queries: int = DEFAULT_QUERIES,
+                   concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT) -> ProbeResult:
+    """探测单个上游：concurrency 个连接并发查询，共 queries 次"""
+    kind, target = parse_upstream(upstream)
+    if kind is None:
+        return ProbeResult(upstream, None, 0, 0, None, None, "不支持探测该协议")
+    concurrency = max(1, min(concurrency, queries))
+    shares = [queries // concurrency + (1 if i < queries % concurrency else 0) for i in range(concurrency)]
+    latencies: List[float] = []
+    errors: List[str] = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='probe') as executor:
+        futures = [executor.submit(_probe_worker, kind, target, domains, share, timeout) for share in shares]
+        for future in futures:
+            worker_latencies, worker_errors = future.result()
+            latencies.extend(worker_latencies)
+            errors.extend(worker_errors)
+    total = len(latencies) + len(errors)
+    return ProbeResult(upstream, kind, total, len(errors),
+                       percentile(latencies, 50), percentile(latencies, 95), errors[-1] if errors else None)
+
+def probe_upstreams(upstreams: List[str], domains: List[str], queries: int = DEFAULT_QUERIES,
+                    concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT) -> List[ProbeResult]:
+    """并发探测多个上游，结果顺序与 upstreams 相同"""
+    if not upstreams:
+        return []
+    with ThreadPoolExecutor(max_workers=len(upstreams), thread_name_prefix='probe-upstream') as executor:
+        futures = [executor.submit(probe_upstream, upstream, domains, queries, concurrency, timeout) for upstream in upstreams]
+        return [future.result() for future in futures]
+
+def rank_upstreams(results: List[ProbeResult], max_error_rate: float = DEFAULT_MAX_ERROR_RATE,
+                   bucket_ms: float = DEFAULT_BUCKET_MS, prune: bool = True) -> List[str]:
+    """按探测结果排列上游：可用的上游按延迟分桶从低到高（桶内保持原顺序），其后是未探测的上游，最后是不可用的上游；
+    prune 为 True 时去掉不可用的上游，但全部不可用时保留原列表"""
+    def is_dead(result: ProbeResult) -> bool:
+        return result.kind is not None and (result.p50_ms is None or result.error_rate > max_error_rate)
+
+    def sort_key(item: Tuple[int, ProbeResult]) -> Tuple:
+        index, result = item
+        if result.kind is None:
+            return (1, 0, index)
+        if is_dead(result):
+            return (2, 0, index)
+        return (0, int(result.p50_ms // max(bucket_ms, 1e-9)), index)
+
+    ranked = [result for _, result in sorted(enumerate(results), key=sort_key)]
+    if prune:
+        alive = [result for result in ranked if not is_dead(result)]
+        if not alive and results:
+            logger.warning("所有上游均探测失败，保留原有顺序")
+            return [result.upstream for result in results]
+        ranked = alive
+    return [result.upstream for result in ranked]
+
+def format_result(result: ProbeResult) -> str:
+    if result.kind is None:
+        return f"{result.upstream}: 未探测（{result.error}）"
+    latency = f"p50 {result.p50_ms:.1f} ms，p95 {result.p95_ms:.1f} ms" if result.p50_ms is not None else "无成功查询"
+    detail = f"，最近错误：{result.error}" if result.error else ''
+    return f"{result.upstream}: {latency}，失败率 {result.error_rate:.0%}（{result.errors}/{result.queries}）{detail}"
+
+def rank_configured_upstreams(probe_config: Dict[str, Any], cn_dns: List[str], foreign_dns: List[str],
+                              results_file: Optional[str] = None, metrics: RunMetrics = DISABLED) -> Tuple[List[str], List[str]]:
+    """按 probe 配置探测国内外上游，返回重新排列（并剔除不可用上游）后的 (国内DNS, 国外DNS)；
+    提供 results_file 时把探测结果写入该文件"""
+    queries = int(probe_config.get('queries', DEFAULT_QUERIES))
+    concurrency = int(probe_config.get('concurrency', DEFAULT_CONCURRENCY))
+    timeout = float(probe_config.get('timeout', DEFAULT_TIMEOUT))
+    max_error_rate = float(probe_config.get('max_error_rate', DEFAULT_MAX_ERROR_RATE))
+    bucket_ms = float(probe_config.get('bucket_ms', DEFAULT_BUCKET_MS))
+    prune = bool(probe_config.get('prune', True))
+    groups = {'cn': (cn_dns, probe_config.get('cn_domains', DEFAULT_CN_DOMAINS)),
+              'foreign': (foreign_dns, probe_config.get('foreign_domains', DEFAULT_FOREIGN_DOMAINS))}
+
+    ranked: Dict[str, List[str]] = {}
+    report: Dict[str, Any] = {'time': round(time.time())}
+    with metrics.stage('probe') as record:
+        with ThreadPoolExecutor(max_workers=len(groups), thread_name_prefix='probe-group') as executor:
+            futures = {name: executor.submit(probe_upstreams, upstreams, domains, queries, concurrency, timeout)
+                       for name, (upstreams, domains) in groups.items()}
+            results = {name: future.result() for name, future in futures.items()}
+        for name, group_results in results.items():
+            for result in group_results:
+                logger.info(f"[{name}] {format_result(result)}")
+            ranked[name] = rank_upstreams(group_results, max_error_rate, bucket_ms, prune)
+            if ranked[name] != groups[name][0]:
+                logger.info(f"[{name}] 按探测结果调整上游为: {ranked[name]}")
+            report[name] = {'results': [dict(result._asdict(), error_rate=result.error_rate) for result in group_results],
+                            'ranked': ranked[name]}
+        record['queries'] = sum(result.queries for group_results in results.values() for result in group_results)
+
+    if results_file:
+        try:
+            os.makedirs(os.path.dirname(results_file) or '.', exist_ok=True)
+            with open(results_file + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            os.replace(results_file + '.tmp', results_file)
+        except OSError as e:
+            logger.warning(f"写入探测结果失败: {e}")
+    return ranked['cn'], ranked['foreign']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='探测上游DNS的延迟和失败率')
+    parser.add_argument('upstreams', nargs='*', help='要探测的上游，不指定时探测 config/cn_dns.txt 和 config/foreign_dns.txt 中的上游')
+    parser.add_argument('--domain', action='append', help='查询的域名（可重复，仅在指定上游时使用）')
+    parser.add_argument('--queries', type=int, help=f'每个上游的查询次数（默认读取 probe.queries，未配置时为 {DEFAULT_QUERIES}）')
+    parser.add_argument('--concurrency', type=int, help=f'每个上游的并发连接数（默认 {DEFAULT_CONCURRENCY}）')
+    parser.add_argument('--timeout', type=float, help=f'单次查询超时秒数（默认 {DEFAULT_TIMEOUT}）')
+    parser.add_argument('--config', default=os.path.join('config', 'config.json'), help='配置文件（读取 probe 配置）')
+    parser.add_argument('--json', help='将探测结果保存为 JSON 文件')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                        stream=sys.stdout)
+
+    probe_config: Dict[str, Any] = {}
+    if os.path.exists(args.config):
+        with open(args.config, 'r', encoding='utf-8') as f:
+            probe_config = json.load(f).get('probe', {})
+    for key in ('queries', 'concurrency', 'timeout'):
+        if getattr(args, key) is not None:
+            probe_config[key] = getattr(args, key)
+
+    if args.upstreams:
+        results = probe_upstreams(args.upstreams, args.domain or DEFAULT_FOREIGN_DOMAINS,
+                                  int(probe_config.get('queries', DEFAULT_QUERIES)),
+                                  int(probe_config.get('concurrency', DEFAULT_CONCURRENCY)),
+                                  float(probe_config.get('timeout', DEFAULT_TIMEOUT)))
+        for result in results:
+            print(format_result(result))
+        ranked = rank_upstreams(results, float(probe_config.get('max_error_rate', DEFAULT_MAX_ERROR_RATE)),
+                                float(probe_config.get('bucket_ms', DEFAULT_BUCKET_MS)), bool(probe_config.get('prune', True)))
+        print("排序结果: " + ' '.join(ranked))
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump([dict(result._asdict(), error_rate=result.error_rate) for result in results], f, ensure_ascii=False, indent=2)
+        return
+
+    import extract_domains
+    cn_dns = extract_domains.read_dns_servers(os.path.join('config', 'cn_dns.txt'), [])
+    foreign_dns = extract_domains.read_dns_servers(os.path.join('config', 'foreign_dns.txt'), [])
+    rank_configured_upstreams(probe_config, cn_dns, foreign_dns, args.json)
+
+if __name__ == "__main__":
+    main()
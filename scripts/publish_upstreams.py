@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+上游DNS推送工具
+把生成的分流配置（dist/<模式>_mode.txt 中的规则行）通过 AdGuard Home 的 HTTP API（POST /control/dns_config）
+直接应用到多个实例，不需要各实例再自行下载和重新加载。
+多个实例并发推送，每个实例的请求复用同一个 keep-alive 连接；推送前先读取实例当前的上游配置（GET /control/dns_info），
+与要推送的内容哈希相同时跳过
+
+实例在 config.json 的 publish.instances 中配置，如
+{"url": "http://192.168.1.1:3000", "username": "admin", "password_env": "ADGUARD_PASSWORD", "mode": "whitelist"}
+注意：实例配置了 upstream_dns_file 时，AdGuard Home 会忽略通过 API 设置的上游
+
+用法：
+    python scripts/publish_upstreams.py
+    python scripts/publish_upstreams.py --instance http://127.0.0.1:3000 --mode blacklist --dry-run
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+import logging
+import argparse
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from domain_index import BLACKLIST, WHITELIST
+from lookup_domain import MODE_FILES
+
+logger = logging.getLogger('publish_upstreams')
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_WORKERS = 8
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+DRY_RUN = 'dry-run'
+
+class PublishError(Exception):
+    """AdGuard Home API 请求失败"""
+
+class PublishResult(NamedTuple):
+    """单个实例的推送结果"""
+    url: str
+    status: str
+    seconds: float
+    upstream_hash: Optional[str] = None
+    error: Optional[str] = None
+
+def read_upstream_lines(file_path: str) -> List[str]:
+    """读取分流配置中的上游行（跳过注释和空行），即 AdGuard Home upstream_dns 的内容"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+def upstream_hash(lines: List[str]) -> str:
+    return hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()
+
+def normalize_instances(entries: List[Any], default_mode: str = WHITELIST) -> List[Dict[str, Any]]:
+    """规范化实例配置：可以是URL字符串或对象；password_env 指定从环境变量读取密码"""
+    instances = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"url": entry}
+        if not isinstance(entry, dict) or not entry.get("url"):
+            logger.warning(f"忽略无效的实例配置: {entry}")
+            continue
+        instance = dict(entry)
+        instance.setdefault("mode", default_mode)
+        if instance["mode"] not in MODE_FILES:
+            logger.warning(f"{instance['url']} 配置了未知的模式 {instance['mode']}，改为 {default_mode}")
+            instance["mode"] = default_mode
+        if instance.get("password_env"):
+            instance["password"] = os.environ.get(instance["password_env"], "")
+        instances.append(instance)
+    return instances
+
+class AdGuardClient:
+    """单个 AdGuard Home 实例的 API 客户端，请求之间复用同一个 keep-alive 连接"""
+
+    def __init__(self, url: str, username: Optional[str] = None, password: Optional[str] = None,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.url = url
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"无效的实例地址: {url}")
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+        self._base_path = parts.path.rstrip('/')
+        self._headers = {'Accept': 'application/json'}
+        if username:
+            token = base64.b64encode(f"{username}:{password or ''}".encode('utf-8')).decode('ascii')
+            self._headers['Authorization'] = f"Basic {token}"
+
+    def _request(self, method: str, path: str, payload: Any = None) -> bytes:
+        body = None
+        headers = dict(self._headers)
+        if payload is not None:
+            body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            try:
+                self._connection.request(method, self._base_path + path, body=body, headers=headers)
+                response = self._connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # 空闲连接可能已被服务端关闭，此时重新连接再试一次
+                self._connection.close()
+                if attempt == 2:
+                    raise
+            except (OSError, http.client.HTTPException):
+                # 超时等错误后连接停在请求已发出的状态，不关闭的话之后的请求都会失败，下次请求重新连接
+                self._connection.close()
+                raise
+        if response.status >= 400:
+            raise PublishError(f"{method} {path} 返回 HTTP {response.status}: {data[:200].decode('utf-8', errors='replace')}")
+        return data
+
+    def upstreams(self) -> List[str]:
+        """实例当前的 upstream_dns"""
+        info = json.loads(self._request('GET', '/control/dns_info') or b'{}')
+        return info.get('upstream_dns') or []
+
+    def set_upstreams(self, lines: List[str]) -> None:
+        self._request('POST', '/control/dns_config', {'upstream_dns': lines})
+
+    def close(self) -> None:
+        self._connection.close()
+
+class Publisher:
+    """向多个实例并发推送上游配置；客户端（及其连接）在多次推送之间保留，供常驻进程重复使用"""
+
+    def __init__(self, instances: List[Dict[str, Any]], workers: int = DEFAULT_WORKERS, timeout: float = DEFAULT_TIMEOUT):
+        self.instances = instances
+        self.workers = workers
+        self.timeout = timeout
+        self._clients: Dict[str, AdGuardClient] = {}
+
+    def _client(self, instance: Dict[str, Any]) -> AdGuardClient:
+        client = self._clients.get(instance["url"])
+        if client is None:
+            client = self._clients[instance["url"]] = AdGuardClient(
+                instance["url"], instance.get("username"), instance.get("password"), float(instance.get("timeout", self.timeout)))
+        return client
+
+    def _publish_one(self, instance: Dict[str, Any], lines: List[str], digest: str, force: bool, dry_run: bool) -> PublishResult:
+        url = instance["url"]
+        start = time.perf_counter()
+        try:
+            client = self._client(instance)
+            if not force and upstream_hash(client.upstreams()) == digest:
+                return PublishResult(url, UNCHANGED, time.perf_counter() - start, digest)
+            if dry_run:
+                return PublishResult(url, DRY_RUN, time.perf_counter() - start, digest)
+            client.set_upstreams(lines)
+            return PublishResult(url, UPDATED, time.perf_counter() - start, digest)
+        except (OSError, ValueError, http.client.HTTPException, PublishError) as e:
+            return PublishResult(url, FAILED, time.perf_counter() - start, error=str(e))
+
+    def publish(self, dist_dir: str = 'dist', force: bool = False, dry_run: bool = False) -> List[PublishResult]:
+        """推送各实例对应模式的分流配置，返回各实例的结果（顺序与配置相同）"""
+        if not self.instances:
+            return []
+        lines_by_mode, digests = {}, {}
+        for mode in sorted({instance["mode"] for instance in self.instances}):
+            lines_by_mode[mode] = read_upstream_lines(os.path.join(dist_dir, MODE_FILES[mode]))
+            digests[mode] = upstream_hash(lines_by_mode[mode])
+            logger.info(f"{mode} 模式共 {len(lines_by_mode[mode])} 行上游配置（{digests[mode][:12]}）")
+
+        start = time.perf_counter()
+        workers = max(1, min(self.workers, len(self.instances)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='publish') as executor:
+            futures = [executor.submit(self._publish_one, instance, lines_by_mode[instance["mode"]], digests[instance["mode"]],
+                                       force, dry_run)
+                       for instance in self.instances]
+            results = [future.result() for future in futures]
+
+        for result in results:
+            if result.status == FAILED:
+                logger.error(f"推送到 {result.url} 失败：{result.error}")
+            else:
+                logger.info(f"{result.url}: {result.status}（{result.seconds:.2f} 秒）")
+        counts = {status: sum(1 for result in results if result.status == status) for status in (UPDATED, UNCHANGED, DRY_RUN, FAILED)}
+        logger.info(f"推送完成，用时 {time.perf_counter() - start:.2f} 秒：更新 {counts[UPDATED]} 个，未变化 {counts[UNCHANGED]} 个，"
+                    f"失败 {counts[FAILED]} 个" + (f"，待更新 {counts[DRY_RUN]} 个（未实际推送）" if dry_run else ''))
+        return results
+
+    def close(self) -> None:
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
+
+def create_publisher(config: Dict[str, Any]) -> Optional[Publisher]:
+    """根据 publish 配置创建推送器，未配置实例时返回 None"""
+    publish_config = config.get('publish', {})
+    instances = normalize_instances(publish_config.get('instances', []), publish_config.get('mode', WHITELIST))
+    if not instances:
+        return None
+    return Publisher(instances, int(publish_config.get('workers', DEFAULT_WORKERS)),
+                     float(publish_config.get('timeout', DEFAULT_TIMEOUT)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='通过 AdGuard Home 的 HTTP API 推送生成的上游DNS配置')
+    parser.add_argument('--dist', default='dist', help='生成结果所在目录（默认 dist）')
+    parser.add_argument('--config', default=os.path.join('config', 'config.json'), help='配置文件（读取 publish 配置）')
+    parser.add_argument('--instance', action='append', help='只推送到指定的实例地址（可重复），不读取配置中的实例')
+    parser.add_argument('--mode', choices=(WHITELIST, BLACKLIST), help='通过 --instance 指定实例时使用的模式（默认 whitelist）')
+    parser.add_argument('--username', help='通过 --instance 指定实例时使用的用户名，密码从环境变量 ADGUARD_PASSWORD 读取')
+    parser.add_argument('--force', action='store_true', help='不比较哈希，总是推送')
+    parser.add_argument('--dry-run', action='store_true', help='只检查哪些实例需要更新，不实际推送')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                        stream=sys.stdout)
+
+    config: Dict[str, Any] = {}
+    if os.path.exists(args.config):
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    if args.instance:
+        instances = [{"url": url, "username": args.username, "password_env": "ADGUARD_PASSWORD"} for url in args.instance]
+        config['publish'] = dict(config.get('publish', {}), instances=instances, mode=args.mode or WHITELIST)
+    publisher = create_publisher(config)
+    if publisher is None:
+        logger.error("没有配置要推送的 AdGuard Home 实例（publish.instances 或 --instance）")
+        sys.exit(1)
+
+    try:
+        results = publisher.publish(args.dist, args.force, args.dry_run)
+    except OSError as e:
+        logger.error(f"读取分流配置失败：{e}")
+        sys.exit(1)
+    finally:
+        publisher.close()
+    if any(result.status == FAILED for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+域名源刷新守护进程
+常驻运行并在内存中保留各源的解析结果。每个源按自己的刷新间隔（加随机抖动，避免所有源同时请求）重新下载，
+内容未变化（HTTP 304 或内容哈希相同）时不重新解析；只有合并后的国内外域名或 config/ 中的本地文件确实变化时才重新生成产物，
+生成时内容未变的文件不会被重写（见 artifact_writer）
+
+源的刷新间隔在 config.json 中按源配置，如 {"url": "https://...", "interval": "30m"}，未配置时使用 daemon.interval；
+收到 SIGHUP 时立即刷新所有源，收到 SIGINT/SIGTERM 时在当前一轮结束后退出。修改 config.json 后需要重启。
+probe.enabled 为 true 时，每次生成前先探测上游DNS（见 probe_upstreams）；
+publish.auto 为 true 时，每次生成后通过 AdGuard Home 的 API 推送到 publish.instances 中的实例（见 publish_upstreams）
+
+用法：
+    python scripts/refresh_daemon.py
+    python scripts/refresh_daemon.py --once    # 刷新所有源并生成一次后退出
+"""
+
+import os
+import sys
+import time
+import random
+import signal
+import logging
+import argparse
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import generate_config
+import extract_domains
+import parallel_parse
+import publish_upstreams
+from domain_set import DomainSet
+from parse_cache import content_hash
+from run_metrics import PROFILERS, RunMetrics
+
+logger = logging.getLogger('refresh_daemon')
+
+DEFAULT_INTERVAL = '1h'
+DEFAULT_JITTER = 0.1
+# 即使没有源到期，也按此间隔检查 config/ 中的本地文件是否变化
+LOCAL_CHECK_SECONDS = 60
+
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+LOCAL_FILES = ('cn_dns.txt', 'foreign_dns.txt', 'custom_domain_dns.txt', 'custom_cn_domains.txt', 'custom_foreign_domains.txt')
+GROUPS = ('cn_domains', 'foreign_domains')
+
+def parse_interval(value: Any) -> float:
+    """把刷新间隔转换为秒数：数字为秒，字符串可带 s/m/h/d 后缀（如 30m、6h）"""
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        text = str(value).strip().lower()
+        unit = INTERVAL_UNITS.get(text[-1:])
+        seconds = float(text[:-1]) * unit if unit else float(text)
+    if seconds <= 0:
+        raise ValueError(f"刷新间隔必须大于 0: {value}")
+    return seconds
+
+class SourceState:
+    """单个源的调度和解析状态"""
+
+    def __init__(self, source: Dict[str, Any], interval: float):
+        self.url: str = source["url"]
+        self.timeout: float = source["timeout"]
+        self.format: Optional[str] = source.get("format")
+        self.interval = interval
+        self.groups = set()
+        self.next_due = 0.0
+        self.digest: Optional[str] = None
+        self.domains: Optional[DomainSet] = None
+
+class RefreshDaemon:
+    """按各源的刷新间隔增量刷新，并在合并结果变化时重新生成产物"""
+
+    def __init__(self, config: Dict[str, Any], args, output_dir: str = 'dist'):
+        self.config = config
+        self.args = args
+        self.output_dir = output_dir
+        fetch_config = config.get('fetch', {})
+        daemon_config = config.get('daemon', {})
+        timeout = float(fetch_config.get('timeout', extract_domains.DEFAULT_TIMEOUT))
+        self.workers = int(fetch_config.get('workers', extract_domains.DEFAULT_WORKERS))
+        self.parse_workers = int(fetch_config.get('parse_workers', 1))
+        if self.parse_workers <= 0:
+            self.parse_workers = parallel_parse.available_cpus()
+        self.jitter = float(daemon_config.get('jitter', DEFAULT_JITTER))
+        default_interval = parse_interval(daemon_config.get('interval', DEFAULT_INTERVAL))
+        self.http_cache = generate_config.create_http_cache(config)
+        self.parse_cache = generate_config.create_parse_cache(config)
+        self.options = generate_config.output_options(config, args.no_prune, args.grouped)
+        self._random = random.Random()
+
+        self.sources: Dict[str, SourceState] = {}
+        for group in GROUPS:
+            for source in generate_config.normalize_sources(config.get('sources', {}).get(group, []), timeout):
+                try:
+                    interval = parse_interval(source.get('interval', default_interval))
+                except ValueError as e:
+                    logger.warning(f"{source['url']} 的刷新间隔无效（{e}），使用默认间隔")
+                    interval = default_interval
+                state = self.sources.get(source["url"])
+                if state is None:
+                    state = self.sources[source["url"]] = SourceState(source, interval)
+                else:
+                    # 同一URL出现在两组中时按较短的间隔刷新
+                    state.interval = min(state.interval, interval)
+                    state.timeout = max(state.timeout, source["timeout"])
+                state.groups.add(group)
+
+        self._local_signature: Optional[Tuple] = None
+        self._built: Optional[Tuple] = None
+        # 上一轮刷新或生成失败时，下一次唤醒即使没有源到期也重新生成
+        self._rebuild_pending = False
+        self._stop = threading.Event()
+        self._refresh_all = threading.Event()
+        self._wake = threading.Event()
+        # publish.auto 为 true 时每次生成后推送到 publish.instances 中的实例
+        self.publisher = publish_upstreams.create_publisher(config) if config.get('publish', {}).get('auto') else None
+        self._publish_pending = False
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def request_refresh(self) -> None:
+        """下一轮立即刷新所有源"""
+        self._refresh_all.set()
+        self._wake.set()
+
+    def _schedule(self, state: SourceState, now: float) -> None:
+        state.next_due = now + state.interval * (1 + self._random.uniform(-self.jitter, self.jitter))
+
+    def _local_files_signature(self) -> Tuple:
+        signature = []
+        for name in LOCAL_FILES:
+            try:
+                stat = os.stat(os.path.join('config', name))
+                signature.append((name, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((name, None, None))
+        return tuple(signature)
+
+    def refresh(self, states: List[SourceState], metrics: RunMetrics) -> bool:
+        """下载并按需重新解析这些源，返回是否有源的域名发生变化"""
+        with metrics.stage('fetch') as record:
+            contents = extract_domains.download_files(((state.url, state.timeout) for state in states),
+                                                      self.workers, self.http_cache, metrics)
+            record['bytes'] = sum(len(content) for content in contents.values())
+
+        changed = False
+        modified: List[SourceState] = []
+        digests: Dict[str, str] = {}
+        for state in states:
+            content = contents.get(state.url, "")
+            if not content:
+                logger.warning(f"下载 {state.url} 失败或内容为空，保留上一次的结果")
+                if state.domains is None and self.parse_cache:
+                    domains = self.parse_cache.last_known_good(state.url)
+                    if domains:
+                        logger.warning(f"使用 {state.url} 最近一次成功解析的结果（{len(domains)} 个域名）")
+                        state.domains = DomainSet(domains)
+                        changed = True
+                continue
+            digest = content_hash(content)
+            if digest == state.digest:
+                logger.info(f"{state.url} 内容未变化")
+                continue
+            digests[state.url] = digest
+            modified.append(state)
+        if not modified:
+            return changed
+
+        with metrics.stage('parse') as record:
+            if self.parse_workers > 1 and len(modified) > 1:
+                sources = [{"url": state.url, "format": state.format} for state in modified]
+                parsed = generate_config.parse_sources({'modified': sources}, contents, self.parse_workers,
+                                                       self.parse_cache, metrics)
+            else:
+                parsed = {state.url: generate_config.extract_source_domains(state.url, contents[state.url], self.parse_cache,
+                                                                            state.format, metrics)
+                          for state in modified}
+            for state in modified:
+                domains = DomainSet(parsed[state.url] or ())
+                if not domains:
+                    # 解析不出域名时按下载失败处理：保留上一次的结果，还没有结果时才使用最近一次成功解析的结果，
+                    # 都没有时该源仍算作未下载成功；不记录内容哈希，下一次刷新会重新解析
+                    logger.warning(f"没有从 {state.url} 中提取到任何域名，按下载失败处理")
+                    if state.domains is not None or not self.parse_cache:
+                        continue
+                    domains = DomainSet(self.parse_cache.last_known_good(state.url) or ())
+                    if not domains:
+                        continue
+                    logger.warning(f"使用 {state.url} 最近一次成功解析的结果（{len(domains)} 个域名）")
+                if domains != state.domains:
+                    logger.info(f"{state.url} 的域名发生变化（{len(state.domains or ())} -> {len(domains)} 个）")
+                    state.domains = domains
+                    changed = True
+                # 解析成功后才记录内容哈希，解析失败时下一次刷新会重新解析
+                state.digest = digests[state.url]
+            record['domains'] = sum(len(state.domains or ()) for state in modified)
+        return changed
+
+    def rebuild(self, metrics: RunMetrics) -> bool:
+        """合并各源的结果，结果或本地配置变化时重新生成产物，返回是否生成"""
+        if not any(state.domains for state in self.sources.values()):
+            logger.warning("还没有任何源下载成功，暂不生成")
+            return False
+        cn_dns, foreign_dns, custom_domain_dns = generate_config.read_dns_config()
+        cn_dns, foreign_dns = generate_config.probe_dns_config(self.config, cn_dns, foreign_dns, self.args.probe, metrics)
+        merged = {}
+        for group in GROUPS:
+            domain_sets = [state.domains for state in self.sources.values() if group in state.groups and state.domains]
+            custom_file = os.path.join('config', f"custom_{group}.txt")
+            domain_sets.append(DomainSet(extract_domains.read_custom_domains(custom_file)))
+            merged[group] = DomainSet().union(*domain_sets)
+        built = (merged['cn_domains'], merged['foreign_domains'], cn_dns, foreign_dns, custom_domain_dns)
+        if built == self._built:
+            logger.info("合并后的域名和本地配置均未变化，跳过生成")
+            return False
+
+        manifest, resolution = generate_config.build_outputs(merged['cn_domains'], merged['foreign_domains'], cn_dns, foreign_dns,
+                                                             custom_domain_dns, self.config, self.options, self.output_dir, metrics)
+        self._built = built
+        metrics.extra['generation'] = manifest['generation']
+        logger.info(f"已生成产物批次 {manifest['generation'][:12]}：{len(resolution.cn_domains)} 个国内域名，"
+                    f"{len(resolution.foreign_domains)} 个国外域名")
+        return True
+
+    def run_cycle(self, states: List[SourceState], local_changed: bool) -> None:
+        """刷新并按需生成一轮；出错时记录日志并保留上一次的产物，下一次唤醒时重试，守护进程继续运行"""
+        metrics = generate_config.create_run_metrics(self.config, self.args)
+        try:
+            changed = self.refresh(states, metrics) if states else False
+            if changed or local_changed or self._rebuild_pending or self._built is None:
+                self._rebuild_pending = True
+                if self.rebuild(metrics):
+                    generate_config.write_run_metrics(self.config, self.args, metrics)
+                    self._publish_pending = self.publisher is not None
+                self._rebuild_pending = False
+        except Exception:
+            logger.exception("本轮刷新或生成失败，保留上一次的产物，下一次唤醒时重试")
+        if self._publish_pending:
+            self.publish()
+
+    def publish(self) -> None:
+        """把新生成的配置推送到 AdGuard Home 实例；有实例失败时下一轮再次推送（已是最新的实例会按哈希跳过）"""
+        try:
+            results = self.publisher.publish(self.output_dir)
+        except OSError as e:
+            logger.error(f"读取分流配置失败：{e}")
+            return
+        self._publish_pending = any(result.status == publish_upstreams.FAILED for result in results)
+
+    def run(self, once: bool = False) -> None:
+        logger.info(f"共 {len(self.sources)} 个源，刷新间隔：" +
+                    '，'.join(f"{state.url} {state.interval:.0f} 秒" for state in self.sources.values()))
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if self._refresh_all.is_set():
+                self._refresh_all.clear()
+                logger.info("收到刷新请求，刷新所有源")
+                due = list(self.sources.values())
+            else:
+                due = [state for state in self.sources.values() if state.next_due <= now]
+            signature = self._local_files_signature()
+            local_changed = self._local_signature is not None and signature != self._local_signature
+            if local_changed:
+                logger.info("config/ 中的本地文件发生变化")
+            self._local_signature = signature
+
+            if due or local_changed or self._rebuild_pending:
+                self.run_cycle(due, local_changed)
+                now = time.monotonic()
+                for state in due:
+                    self._schedule(state, now)
+            if once:
+                break
+
+            next_due = min((state.next_due for state in self.sources.values()), default=now + LOCAL_CHECK_SECONDS)
+            wait = max(0.0, min(next_due - time.monotonic(), LOCAL_CHECK_SECONDS))
+            self._wake.wait(wait)
+            self._wake.clear()
+        if self.publisher is not None:
+            self.publisher.close()
+        logger.info("刷新守护进程已退出")
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='按各源的刷新间隔持续更新 AdGuard Home 分流配置')
+    parser.add_argument('--once', action='store_true', help='刷新所有源并生成一次后退出')
+    parser.add_argument('--no-prune', action='store_true', help='保留被上级域名覆盖的子域名规则')
+    parser.add_argument('--grouped', action='store_true', help='将上游相同的域名合并到同一行输出')
+    parser.add_argument('--probe', action='store_true', help='每次生成前探测上游DNS，按延迟排列并剔除不可用的上游')
+    parser.add_argument('--metrics-file', help='运行指标 JSON 文件（默认 .cache/run_metrics.json），每次生成后更新')
+    parser.add_argument('--prometheus-file', help='同时写出 Prometheus textfile collector 格式的指标文件')
+    parser.add_argument('--profile', choices=PROFILERS, help='按阶段做性能分析（cProfile 或 tracemalloc）')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = generate_config.load_config()
+    try:
+        daemon = RefreshDaemon(config, args)
+    except ValueError as e:
+        logger.error(f"刷新守护进程配置无效：{e}")
+        sys.exit(1)
+
+    signal.signal(signal.SIGINT, lambda signum, frame: daemon.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: daemon.request_refresh())
+    daemon.run(once=args.once)
+
+if __name__ == "__main__":
+    main()
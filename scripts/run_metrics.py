@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+运行指标
+按阶段（fetch 下载、decode 解码、parse 解析、merge 合并、prune 剔除、emit 输出、compress 压缩）
+和源记录耗时、字节数、域名数、每秒域名数以及该阶段内的内存峰值，写入 JSON 指标文件，
+也可以写成 Prometheus node_exporter textfile collector 读取的文本格式。
+可选地按阶段保存 cProfile 或 tracemalloc 分析结果，用于定位拖慢构建的源或阶段
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import cProfile
+import logging
+import threading
+import tracemalloc
+import contextlib
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger('run_metrics')
+
+PROFILERS = ('cprofile', 'tracemalloc')
+PROMETHEUS_PREFIX = 'adguard_divert'
+TRACEMALLOC_TOP = 30
+
+def _rusage_peak() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _read_hwm() -> Optional[int]:
+    """Linux 上 /proc/self/status 中的 VmHWM（RSS 高水位，可重置），不可用时返回 None"""
+    try:
+        with open('/proc/self/status', 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def reset_peak_rss() -> bool:
+    """重置本进程的 RSS 高水位（向 /proc/self/clear_refs 写入 5），返回是否成功"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def read_peak_rss() -> Optional[int]:
+    """本进程上次重置以来的内存峰值（VmHWM），不支持重置的平台上为进程启动以来的峰值（ru_maxrss）"""
+    peak = _read_hwm()
+    return peak if peak is not None else _rusage_peak()
+
+class PeakRssTracker:
+    """按阶段统计内存峰值
+
+    Linux 上每个阶段开始时重置进程的 RSS 高水位，结束时读取 VmHWM；重置前的读数先计入所有尚未结束的阶段，
+    因此嵌套或在多个线程中并发的阶段得到的都是各自期间的峰值。不支持重置时回退为进程启动以来的峰值 ru_maxrss
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Dict[int, int] = {}
+        self._next_token = 0
+        self._lifetime = 0
+        self._resettable: Optional[bool] = None
+
+    def begin(self) -> int:
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            current = _read_hwm() if self._resettable is not False else None
+            if current is not None:
+                for active in self._active:
+                    self._active[active] = max(self._active[active], current)
+                self._lifetime = max(self._lifetime, current)
+                self._resettable = reset_peak_rss()
+            self._active[token] = 0
+            return token
+
+    def end(self, token: int) -> Optional[int]:
+        """返回 begin 以来的内存峰值"""
+        with self._lock:
+            before = self._active.pop(token, 0)
+            current = _read_hwm() if self._resettable else None
+            if current is None:
+                return _rusage_peak()
+            self._lifetime = max(self._lifetime, current)
+            return max(before, current)
+
+    def lifetime(self) -> Optional[int]:
+        """进程启动以来的内存峰值（重置后 ru_maxrss 也会变小，因此需要自行累计）"""
+        with self._lock:
+            current = _read_hwm() if self._resettable else None
+            if current is None:
+                return _rusage_peak()
+            self._lifetime = max(self._lifetime, current)
+            return self._lifetime
+
+PEAK_RSS = PeakRssTracker()
+
+def peak_rss_bytes() -> Optional[int]:
+    """进程启动以来的内存占用峰值（RSS），无法获取时返回 None"""
+    return PEAK_RSS.lifetime()
+
+def _slug(text: str) -> str:
+    """把源URL转换为可作为文件名的字符串"""
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', text.split('://', 1)[-1]).strip('_')[:120]
+
+def _prometheus_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class RunMetrics:
+    """收集一次运行中各阶段的指标，线程安全，可在并发下载的线程中记录单个源的指标
+
+    enabled 为 False 时不记录任何内容，供不需要指标的调用方使用（见 DISABLED）
+    """
+
+    def __init__(self, enabled: bool = True, profiler: Optional[str] = None, profile_dir: Optional[str] = None):
+        if profiler and profiler not in PROFILERS:
+            raise ValueError(f"未知的性能分析方式: {profiler}")
+        self.enabled = enabled
+        self.profiler = profiler if enabled else None
+        self.profile_dir = profile_dir
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.sources: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.extra: Dict[str, Any] = {}
+        self._profiling = False
+
+    @contextlib.contextmanager
+    def stage(self, name: str, source: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """记录一个阶段（指定 source 时为该源在此阶段的记录）
+
+        产出的字典可由调用方填入 bytes、domains 及其他附加字段，退出时补上耗时和本阶段期间的内存峰值
+        """
+        record: Dict[str, Any] = {}
+        if not self.enabled:
+            yield record
+            return
+        token = PEAK_RSS.begin()
+        with self._profile(name, source):
+            start = time.perf_counter()
+            try:
+                yield record
+            finally:
+                seconds = time.perf_counter() - start
+                peak = PEAK_RSS.end(token)
+        self.add(name, record, seconds, source, peak)
+
+    def add(self, name: str, record: Dict[str, Any], seconds: float, source: Optional[str] = None,
+            peak_rss: Optional[int] = None) -> None:
+        """记录在别处计时的阶段，如在子进程中完成的解析；peak_rss 为该阶段的内存峰值（如子进程报告的峰值），
+        未提供时使用本进程当前的高水位"""
+        if not self.enabled:
+            return
+        record['seconds'] = round(seconds, 4)
+        if record.get('domains') and seconds > 0:
+            record['domains_per_s'] = round(record['domains'] / seconds)
+        record['peak_rss_bytes'] = peak_rss if peak_rss is not None else read_peak_rss()
+        with self._lock:
+            if source is None:
+                self.stages[name] = record
+            else:
+                self.sources.setdefault(name, {})[source] = record
+
+    @contextlib.contextmanager
+    def _profile(self, name: str, source: Optional[str]) -> Iterator[None]:
+        """按配置对阶段做性能分析；只分析主线程中的阶段，且不嵌套（外层阶段的结果已包含内层）"""
+        if not self.profiler or threading.current_thread() is not threading.main_thread() or self._profiling:
+            yield
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, name if source is None else f"{name}-{_slug(source)}")
+        self._profiling = True
+        try:
+            if self.profiler == 'cprofile':
+                profile = cProfile.Profile()
+                profile.enable()
+                try:
+                    yield
+                finally:
+                    profile.disable()
+                    profile.dump_stats(base + '.prof')
+            else:
+                started = not tracemalloc.is_tracing()
+                if started:
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+                try:
+                    yield
+                finally:
+                    _, peak = tracemalloc.get_traced_memory()
+                    snapshot = tracemalloc.take_snapshot()
+                    if started:
+                        tracemalloc.stop()
+                    with open(base + '.tracemalloc.txt', 'w', encoding='utf-8') as f:
+                        f.write(f"# {name}{' ' + source if source else ''} Python 堆内存峰值 {peak} 字节，阶段结束时按行统计的前 {TRACEMALLOC_TOP} 项\n")
+                        for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                            f.write(f"{stat}\n")
+        finally:
+            self._profiling = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        stages: Dict[str, Any] = {}
+        for name in list(self.stages) + [name for name in self.sources if name not in self.stages]:
+            entry = dict(self.stages.get(name, {}))
+            if name in self.sources:
+                entry['sources'] = dict(sorted(self.sources[name].items()))
+            stages[name] = entry
+        return dict(self.extra, started=round(self.started), total_seconds=round(time.perf_counter() - self._start, 4),
+                    peak_rss_bytes=peak_rss_bytes(), stages=stages)
+
+    def log_summary(self, slowest: int = 3) -> None:
+        """在日志中输出各阶段耗时和最慢的几个源"""
+        for name, record in self.stages.items():
+            detail = f"，{record['domains']} 个域名" if record.get('domains') is not None else ''
+            logger.info(f"阶段 {name}：{record['seconds']:.2f} 秒{detail}")
+        for name, records in self.sources.items():
+            ranked = sorted(records.items(), key=lambda item: item[1]['seconds'], reverse=True)[:slowest]
+            logger.info(f"阶段 {name} 最慢的源：" + '，'.join(f"{source} {record['seconds']:.2f} 秒" for source, record in ranked))
+
+    def write_json(self, file_path: str) -> None:
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        with open(file_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(file_path + '.tmp', file_path)
+
+    def iter_prometheus(self) -> Iterator[str]:
+        """逐行生成 Prometheus 文本格式的指标"""
+        records: List[tuple] = [(name, '', record) for name, record in self.stages.items()]
+        records += [(name, source, record) for name, by_source in self.sources.items() for source, record in sorted(by_source.items())]
+        for field, kind, help_text in (('seconds', 'gauge', '阶段耗时（秒）'), ('bytes', 'gauge', '阶段处理的字节数'),
+                                       ('domains', 'gauge', '阶段产出的域名数'), ('peak_rss_bytes', 'gauge', '阶段期间的内存峰值')):
+            metric = f"{PROMETHEUS_PREFIX}_stage_{field}"
+            yield f"# HELP {metric} {help_text}"
+            yield f"# TYPE {metric} {kind}"
+            for name, source, record in records:
+                if record.get(field) is not None:
+                    yield f'{metric}{{stage="{_prometheus_label(name)}",source="{_prometheus_label(source)}"}} {record[field]}'
+        yield f"# TYPE {PROMETHEUS_PREFIX}_run_seconds gauge"
+        yield f"{PROMETHEUS_PREFIX}_run_seconds {time.perf_counter() - self._start:.4f}"
+        yield f"# TYPE {PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge"
+        yield f"{PROMETHEUS_PREFIX}_last_run_timestamp_seconds {round(self.started)}"
+
+    def write_prometheus(self, file_path: str) -> None:
+        """原子写入 textfile collector 文件，避免采集到写了一半的内容"""
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        with open(file_path + '.tmp', 'w', encoding='utf-8') as f:
+            for line in self.iter_prometheus():
+                f.write(f"{line}\n")
+        os.replace(file_path + '.tmp', file_path)
+
+DISABLED = RunMetrics(enabled=False)
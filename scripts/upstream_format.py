@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AdGuard Home 上游配置格式处理
+AdGuard Home 支持在一行中为多个域名指定同一组上游：[/a.com/b.com/c.com/]dns1 dns2，
+这里提供将同一上游的域名打包为分组规则、解析上游配置以及校验两份配置路由是否一致的工具
+"""
+
+import re
+import logging
+from itertools import zip_longest
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger('upstream_format')
+
+DEFAULT_MAX_LINE_LENGTH = 4096
+
+UPSTREAM_RULE_PATTERN = re.compile(r'^\[/(.+)/\](.*)$')
+
+def format_grouped_rules(domains: Iterable[str], upstream: str, max_line_length: int = DEFAULT_MAX_LINE_LENGTH) -> Iterator[str]:
+    """将使用同一组上游的域名按顺序打包为若干行，每行不超过 max_line_length（单个域名过长时独占一行）"""
+    suffix = f"/]{upstream}"
+    budget = max_line_length - len(suffix) - 1
+    group: List[str] = []
+    length = 0
+    for domain in domains:
+        if group and length + len(domain) + 1 > budget:
+            yield f"[/{'/'.join(group)}{suffix}"
+            group, length = [], 0
+        group.append(domain)
+        length += len(domain) + 1
+    if group:
+        yield f"[/{'/'.join(group)}{suffix}"
+
+def iter_upstream_config(lines: Iterable[str]) -> Iterator[Tuple[Optional[str], str]]:
+    """逐条解析上游配置，默认上游产出 (None, 上游)，域名规则按域名展开为 (域名, 上游)"""
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        match = UPSTREAM_RULE_PATTERN.match(line)
+        if not match:
+            yield None, line
+            continue
+        upstream = ' '.join(match.group(2).split())
+        for domain in match.group(1).split('/'):
+            yield domain.lower(), upstream
+
+def parse_upstream_config(lines: Iterable[str]) -> Tuple[List[str], Dict[str, str]]:
+    """解析上游配置，返回 (默认上游列表, 域名 -> 上游)
+
+    同一域名出现多次时以第一次为准
+    """
+    defaults: List[str] = []
+    rules: Dict[str, str] = {}
+    for domain, upstream in iter_upstream_config(lines):
+        if domain is None:
+            defaults.append(upstream)
+        else:
+            rules.setdefault(domain, upstream)
+    return defaults, rules
+
+def same_rule_sequence(expected: Iterable[str], actual: Iterable[str]) -> bool:
+    """逐条比较两份配置展开后的规则序列，不需要把规则载入内存
+
+    分组输出保持了规则顺序，序列相同即说明路由完全一致；序列不同时调用方应再用 routes_equivalent 判断
+    """
+    for left, right in zip_longest(iter_upstream_config(expected), iter_upstream_config(actual)):
+        if left != right:
+            logger.warning(f"规则顺序不一致: {left} != {right}")
+            return False
+    return True
+
+def routes_equivalent(expected: Iterable[str], actual: Iterable[str]) -> bool:
+    """校验两份上游配置的路由是否完全一致
+
+    默认上游相同、且每个域名规则指向相同上游时，任何查询在两份配置下都会命中同一条最具体的规则
+    """
+    expected_defaults, expected_rules = parse_upstream_config(expected)
+    actual_defaults, actual_rules = parse_upstream_config(actual)
+    if expected_defaults != actual_defaults:
+        logger.error(f"默认上游不一致: {expected_defaults} != {actual_defaults}")
+        return False
+    if expected_rules != actual_rules:
+        missing = expected_rules.keys() - actual_rules.keys()
+        extra = actual_rules.keys() - expected_rules.keys()
+        changed = [d for d in expected_rules.keys() & actual_rules.keys() if expected_rules[d] != actual_rules[d]]
+        logger.error(f"域名规则不一致：缺少 {len(missing)} 个，多出 {len(extra)} 个，上游不同 {len(changed)} 个")
+        return False
+    return True
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if len(sys.argv) != 3:
+        print(f"用法: {sys.argv[0]} <逐域名配置> <分组配置>")
+        sys.exit(2)
+    with open(sys.argv[1], 'r', encoding='utf-8') as f1, open(sys.argv[2], 'r', encoding='utf-8') as f2:
+        equivalent = routes_equivalent(f1, f2)
+    logger.info("两份配置路由一致" if equivalent else "两份配置路由不一致")
+    sys.exit(0 if equivalent else 1)
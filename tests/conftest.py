@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+PARSER_FIXTURES = os.path.join(FIXTURES, 'parsers')
+EXPECTED_PARSERS = os.path.join(ROOT, 'tests', 'expected', 'parsers')
+
+CN_FIXTURES = ('ChinaDomain.yaml', 'ChinaMax_Domain.yaml', 'accelerated-domains.china.conf', 'cn_plain.list')
+FOREIGN_FIXTURES = ('Proxy_Domain.txt', 'gfwlist.txt', 'adblock.txt')
+
+CN_DNS = ['https://223.5.5.5/dns-query', 'https://doh.pub/dns-query']
+FOREIGN_DNS = ['https://1.1.1.1/dns-query', 'https://8.8.8.8/dns-query']
+# 自定义规则覆盖了两个列表中的域名，并嵌套在国内/国外规则之间
+CUSTOM_DOMAIN_DNS = {
+    'github.com': ['https://101.101.101.101/dns-query'],
+    'openai.com': ['https://1.1.1.1/dns-query', 'https://208.67.222.222/dns-query'],
+    'api.openai.com': ['https://8.8.8.8/dns-query'],
+    'baidu.com': ['119.29.29.29'],
+}
+
+def fixture_domains(names):
+    """各夹具期望提取出的域名（见 tests/expected/parsers）的并集"""
+    domains = set()
+    for name in names:
+        with open(os.path.join(EXPECTED_PARSERS, f"{name}.txt"), 'r', encoding='utf-8') as f:
+            domains.update(line.strip() for line in f if line.strip())
+    return domains
+
+@pytest.fixture(scope='session')
+def routing_inputs():
+    """用夹具域名处理冲突后得到的 write_artifacts 输入"""
+    import conflicts
+    resolution = conflicts.resolve_conflicts(fixture_domains(CN_FIXTURES), fixture_domains(FOREIGN_FIXTURES),
+                                             CUSTOM_DOMAIN_DNS.keys())
+    return dict(cn_domains=resolution.cn_domains, foreign_domains=resolution.foreign_domains, cn_dns=CN_DNS,
+                foreign_dns=FOREIGN_DNS, custom_domain_dns=CUSTOM_DOMAIN_DNS,
+                whitelist_overrides=resolution.whitelist_overrides, blacklist_overrides=resolution.blacklist_overrides)
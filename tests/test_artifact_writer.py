@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import artifact_writer
+
+def snapshot(output_dir):
+    """产物目录中每个文件的 (内容, 修改时间, inode)"""
+    files = {}
+    for root, _, names in os.walk(output_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, output_dir)] = (f.read(), stat.st_mtime_ns, stat.st_ino)
+    return files
+
+def contents(files):
+    return {name: data for name, (data, _, _) in files.items()}
+
+@pytest.mark.parametrize('grouped', [False, True])
+def test_same_inputs_give_identical_bytes(tmp_path, routing_inputs, grouped):
+    first = artifact_writer.write_artifacts(str(tmp_path / 'a'), grouped=grouped, **routing_inputs)
+    second = artifact_writer.write_artifacts(str(tmp_path / 'b'), grouped=grouped, **routing_inputs)
+    assert first == second
+    assert contents(snapshot(tmp_path / 'a')) == contents(snapshot(tmp_path / 'b'))
+
+def test_rerun_leaves_unchanged_files_untouched(tmp_path, routing_inputs):
+    first = artifact_writer.write_artifacts(str(tmp_path), **routing_inputs)
+    before = snapshot(tmp_path)
+    second = artifact_writer.write_artifacts(str(tmp_path), **routing_inputs)
+    assert snapshot(tmp_path) == before
+    assert second['generation'] == first['generation']
+
+def test_generation_changes_only_with_content(tmp_path, routing_inputs):
+    first = artifact_writer.write_artifacts(str(tmp_path), **routing_inputs)
+    before = snapshot(tmp_path)
+    changed_inputs = dict(routing_inputs, cn_domains=set(routing_inputs['cn_domains']) | {'new-site.example.cn'})
+    second = artifact_writer.write_artifacts(str(tmp_path), **changed_inputs)
+    after = snapshot(tmp_path)
+
+    assert second['generation'] != first['generation']
+    for name in ('whitelist_mode.txt', 'cn_domains.txt', artifact_writer.MANIFEST_NAME):
+        assert after[name][0] != before[name][0]
+    # 只含国外域名的文件不受影响，未被替换
+    for name in ('blacklist_mode.txt', 'foreign_domains.txt', 'blacklist_mode.txt.gz'):
+        assert after[name] == before[name]
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import random
+
+import pytest
+
+import artifact_writer
+import conflicts
+from conftest import CN_DNS, CN_FIXTURES, CUSTOM_DOMAIN_DNS, FIXTURES, FOREIGN_DNS, FOREIGN_FIXTURES, fixture_domains
+from domain_index import BLACKLIST, WHITELIST
+from domain_trie import parent_domains
+from lookup_domain import MODE_FILES, RoutingTable
+
+def reference_route(name, cn, foreign, custom, tie_breaker):
+    """按最具体者优先逐级查找上级域名的参考实现，不命中任何规则时返回 None"""
+    for candidate in (name, *parent_domains(name)):
+        if candidate in custom:
+            return ' '.join(custom[candidate])
+        in_cn, in_foreign = candidate in cn, candidate in foreign
+        if in_cn and in_foreign:
+            return ' '.join(CN_DNS if tie_breaker == conflicts.CN else FOREIGN_DNS)
+        if in_cn:
+            return ' '.join(CN_DNS)
+        if in_foreign:
+            return ' '.join(FOREIGN_DNS)
+    return None
+
+def querylog_names():
+    with open(os.path.join(FIXTURES, 'querylog.json'), 'r', encoding='utf-8') as f:
+        return [json.loads(line)['QH'] for line in f if line.strip()]
+
+@pytest.mark.parametrize('tie_breaker', [conflicts.FOREIGN, conflicts.CN])
+def test_both_modes_route_most_specific_wins(tmp_path, tie_breaker):
+    cn, foreign = fixture_domains(CN_FIXTURES), fixture_domains(FOREIGN_FIXTURES)
+    # 额外构造国内外规则互相嵌套的情况
+    cn |= {'nested.example', 'deep.api.nested.example'}
+    foreign |= {'api.nested.example', 'openai.com'}
+    resolution = conflicts.resolve_conflicts(cn, foreign, CUSTOM_DOMAIN_DNS.keys(), tie_breaker)
+    artifact_writer.write_artifacts(str(tmp_path), resolution.cn_domains, resolution.foreign_domains, CN_DNS, FOREIGN_DNS,
+                                    CUSTOM_DOMAIN_DNS, resolution.whitelist_overrides, resolution.blacklist_overrides,
+                                    compression=())
+    tables = {mode: RoutingTable.from_config(str(tmp_path / MODE_FILES[mode])) for mode in (WHITELIST, BLACKLIST)}
+    defaults = {WHITELIST: ' '.join(FOREIGN_DNS), BLACKLIST: ' '.join(CN_DNS)}
+
+    rng = random.Random(5)
+    both = sorted(cn & foreign)
+    names = querylog_names() + both + [f"www.{name}" for name in both]
+    names += rng.sample(sorted(cn), 1000) + rng.sample(sorted(foreign), 1000)
+    names += ['x.deep.api.nested.example', 'x.api.nested.example', 'x.nested.example', 'x.api.openai.com', 'unlisted.invalid']
+    for name in names:
+        expected = reference_route(name, cn, foreign, CUSTOM_DOMAIN_DNS, tie_breaker)
+        for mode, table in tables.items():
+            assert table.route(name)[1] == (expected or defaults[mode]), (mode, name)
+
+def test_conflict_report_lists_overlaps():
+    resolution = conflicts.resolve_conflicts({'a.com', 'b.com', 'x.c.com'}, {'a.com', 'c.com'}, {'b.com'})
+    assert ('exact', 'a.com', conflicts.CN, conflicts.FOREIGN) in {(c.kind, c.domain, c.source, c.winner)
+                                                                   for c in resolution.conflicts}
+    assert 'b.com' not in resolution.cn_domains
+    assert resolution.blacklist_overrides == {'x.c.com'}
+    assert resolution.whitelist_overrides == set()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import shutil
+
+import apply_delta
+import artifact_writer
+import delta
+
+DELTA_FILES = ('whitelist_mode.txt', 'blacklist_mode.txt', 'cn_domains.txt', 'foreign_domains.txt')
+
+def read_text(path):
+    with open(path, 'r', encoding='utf-8', newline='\n') as f:
+        return f.read()
+
+def generations(routing_inputs, count, seed=1):
+    """在夹具域名上逐批增删一些域名，产出每一批的 write_artifacts 参数"""
+    rng = random.Random(seed)
+    cn, foreign = set(routing_inputs['cn_domains']), set(routing_inputs['foreign_domains'])
+    for generation in range(count):
+        yield dict(routing_inputs, cn_domains=set(cn), foreign_domains=set(foreign))
+        cn -= set(rng.sample(sorted(cn), 50))
+        cn |= {f"new{generation}-{i}.example.cn" for i in range(30)}
+        foreign -= set(rng.sample(sorted(foreign), 20))
+        foreign |= {f"new{generation}-{i}.example.com" for i in range(40)}
+
+def test_apply_delta_roundtrip(tmp_path, routing_inputs):
+    dist, base = tmp_path / 'dist', tmp_path / 'base'
+    manifests = []
+    for generation, inputs in enumerate(generations(routing_inputs, 4)):
+        manifests.append(artifact_writer.write_artifacts(str(dist), compression=(), **inputs))
+        if generation == 0:
+            shutil.copytree(dist, base)
+    deltas = manifests[-1]['deltas']
+    assert [d['from'] for d in deltas] == [m['generation'] for m in manifests[:-1]]
+
+    generation = apply_delta.apply_deltas(str(base), [str(dist / d['file']) for d in deltas], str(tmp_path / 'out'))
+    assert generation == manifests[-1]['generation']
+    for name in DELTA_FILES:
+        assert read_text(tmp_path / 'out' / name) == read_text(dist / name)
+
+def test_delta_keep_caps_delta_files(tmp_path, routing_inputs):
+    dist = tmp_path / 'dist'
+    for inputs in generations(routing_inputs, 5):
+        manifest = artifact_writer.write_artifacts(str(dist), compression=(), delta_keep=2, **inputs)
+    assert len(manifest['deltas']) == 2
+    assert sorted(os.listdir(dist / delta.DELTA_DIR)) == sorted(os.path.basename(d['file']) for d in manifest['deltas'])
+
+def test_file_delta_roundtrip_random_edits():
+    rng = random.Random(7)
+    old = [f"line{i}" for i in range(500)]
+    for _ in range(20):
+        new = list(old)
+        for _ in range(rng.randint(1, 30)):
+            position = rng.randrange(len(new) + 1)
+            if rng.random() < 0.5 and position < len(new):
+                del new[position]
+            else:
+                new.insert(position, f"added{rng.random()}")
+        old_text, new_text = '\n'.join(old), '\n'.join(new)
+        lines = list(delta.iter_file_delta('f.txt', apply_delta.sha256_text(old_text), apply_delta.sha256_text(new_text),
+                                           old, new))
+        parsed = apply_delta.parse_delta([delta.DELTA_HEADER, 'from a', 'to b', *lines, 'end'])
+        assert apply_delta.apply_file_delta(old_text, parsed.files[0]) == new_text
+        old = new
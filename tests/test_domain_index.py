@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+import artifact_writer
+from domain_index import BLACKLIST, INDEX_NAME, WHITELIST, DomainIndex
+from lookup_domain import MODE_FILES, RoutingTable
+
+@pytest.fixture(scope='module')
+def dist(tmp_path_factory, routing_inputs):
+    output_dir = tmp_path_factory.mktemp('dist')
+    artifact_writer.write_artifacts(str(output_dir), compression=(), **routing_inputs)
+    return output_dir
+
+def sample_names(routing_inputs, count=3000, seed=3):
+    """规则本身、规则的子域名和上级域名，以及不命中任何规则的域名"""
+    rng = random.Random(seed)
+    rules = sorted(set(routing_inputs['cn_domains']) | set(routing_inputs['foreign_domains'])
+                   | set(routing_inputs['custom_domain_dns']))
+    names = rng.sample(rules, count)
+    names += [f"www.{name}" for name in rng.sample(rules, count)]
+    names += [name.split('.', 1)[1] for name in rng.sample(rules, count)]
+    names += [f"unlisted{i}.invalid" for i in range(100)]
+    names += ['api.openai.com', 'x.api.openai.com', 'openai.com', 'WWW.GitHub.com.', 'com']
+    return names
+
+@pytest.mark.parametrize('mode', [WHITELIST, BLACKLIST])
+def test_index_routes_like_config(dist, routing_inputs, mode):
+    config_table = RoutingTable.from_config(str(dist / MODE_FILES[mode]))
+    with DomainIndex(str(dist / INDEX_NAME)) as index:
+        for name in sample_names(routing_inputs):
+            assert index.route(name, mode)[1] == config_table.route(name)[1], name
+
+def test_index_contains_every_rule(dist, routing_inputs):
+    with DomainIndex(str(dist / INDEX_NAME)) as index:
+        groups = index.groups()
+        rules = {domain: groups[group] for domain, group in index.iter_rules()}
+    assert len(rules) == (len(routing_inputs['cn_domains']) + len(routing_inputs['foreign_domains'])
+                          + len(routing_inputs['custom_domain_dns']))
+    for domain, dns_list in routing_inputs['custom_domain_dns'].items():
+        assert rules[domain] == ' '.join(dns_list)
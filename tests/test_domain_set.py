@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+import random
+
+import pytest
+
+from conftest import CN_FIXTURES, FOREIGN_FIXTURES, fixture_domains
+from domain_set import DomainSet, decode_key, iter_with_parent
+from domain_trie import parent_domains
+
+LABELS = ('a', 'b', 'a-b', 'ab', 'www', 'api', 'x1', '0')
+
+def random_domains(rng, count):
+    """标签取自很小的集合，产生大量互为上下级、只差一个连字符的域名"""
+    return {'.'.join(rng.choice(LABELS) for _ in range(rng.randint(1, 4))) + rng.choice(('.com', '.cn', '.com.cn'))
+            for _ in range(count)}
+
+@pytest.mark.parametrize('seed', range(5))
+def test_operations_match_set(seed):
+    rng = random.Random(seed)
+    a, b, c = random_domains(rng, 400), random_domains(rng, 300), random_domains(rng, 50)
+    da, db, dc = DomainSet(a), DomainSet(b), DomainSet(c)
+    assert len(da) == len(a) and set(da) == a
+    assert set(da | db) == a | b
+    assert set(da.union(db, dc)) == a | b | c
+    assert set(da - db) == a - b
+    assert set(da & db) == a & b
+    assert set(a - db) == a - b
+    assert (da == DomainSet(sorted(a, reverse=True))) and da == a
+    for name in a | b | {'', 'com', 'missing.invalid'}:
+        assert (name in da) == (name in a)
+    assert pickle.loads(pickle.dumps(da)) == da
+
+def test_fixture_domains_match_set():
+    cn, foreign = fixture_domains(CN_FIXTURES), fixture_domains(FOREIGN_FIXTURES)
+    dcn, dforeign = DomainSet(cn), DomainSet(foreign)
+    assert set(dcn | dforeign) == cn | foreign
+    assert set(dcn - dforeign) == cn - foreign
+    assert set(dcn & dforeign) == cn & foreign
+    # 每个域名只占其长度加 4 字节的偏移（另有一个结尾偏移）
+    assert dcn.nbytes <= sum(len(domain) + 4 for domain in cn) + 4
+
+@pytest.mark.parametrize('seed', range(3))
+def test_iter_with_parent_finds_nearest_parent(seed):
+    domains = DomainSet(random_domains(random.Random(seed), 500))
+    for key, _, ancestor in iter_with_parent((key, None) for key in domains.iter_keys()):
+        domain = decode_key(key)
+        expected = next((parent for parent in parent_domains(domain) if parent in domains), None)
+        assert (decode_key(ancestor[0]) if ancestor else None) == expected, domain
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+import generate_config
+from parse_cache import ParseCache
+
+URL = 'https://example.com/list.txt'
+
+def test_empty_parse_falls_back_to_last_known_good(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    good = generate_config.process_sources([URL], contents={URL: 'a.example.com\nb.example.com\n'}, parse_cache=cache)
+    assert set(good) == {'a.example.com', 'b.example.com'}
+
+    # 200 但内容是错误页面，解析不出域名
+    broken = generate_config.process_sources([URL], contents={URL: '<html><body>502 Bad Gateway</body></html>\n'},
+                                             parse_cache=cache)
+    assert set(broken) == set(good)
+
+def test_empty_parse_without_cache_is_empty():
+    assert not generate_config.process_sources([URL], contents={URL: '<html></html>\n'})
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+import pytest
+
+import artifact_writer
+import hot_set
+from conftest import CUSTOM_DOMAIN_DNS, FIXTURES
+from lookup_domain import MODE_FILES, RoutingTable
+
+QUERYLOG = os.path.join(FIXTURES, 'querylog.json')
+
+def log_lines(names, day=14):
+    return ''.join(json.dumps({'T': f"2023-11-{day:02d}T08:00:00.123456789+08:00", 'QH': f"{name}.", 'QT': 'A'}) + '\n'
+                   for name in names)
+
+@pytest.fixture
+def observed(tmp_path, routing_inputs):
+    """夹具查询日志，加上命中国内外规则、其子域名、自定义规则和不命中任何规则的查询"""
+    cn, foreign = sorted(routing_inputs['cn_domains'])[:50], sorted(routing_inputs['foreign_domains'])[:50]
+    names = cn + foreign + [f"www.{name}" for name in cn + foreign] + list(CUSTOM_DOMAIN_DNS)
+    names += ['gist.github.com', 'x.api.openai.com', 'unlisted.example', 'localhost']
+    extra = tmp_path / 'querylog.json'
+    extra.write_text(log_lines(names, day=14), encoding='utf-8')
+    return hot_set.load_observed([QUERYLOG, str(extra)], window_days=36500)
+
+@pytest.mark.parametrize('mode', sorted(MODE_FILES))
+def test_hot_rules_route_logged_queries_like_full_config(tmp_path, routing_inputs, observed, mode):
+    manifest = artifact_writer.write_artifacts(str(tmp_path / 'dist'), compression=(), hot_names=observed, **routing_inputs)
+    name = MODE_FILES[mode]
+    full = RoutingTable.from_config(str(tmp_path / 'dist' / name))
+    hot = RoutingTable.from_config(str(tmp_path / 'dist' / hot_set.HOT_FILES[name]))
+
+    assert len(hot.rules) < len(full.rules)
+    routed = 0
+    for query in observed:
+        assert hot.route(query) == full.route(query), query
+        routed += full.route(query)[0] is not None
+    assert routed > len(CUSTOM_DOMAIN_DNS)
+    assert manifest['hot_set']['files'][hot_set.HOT_FILES[name]]['rules'] == len(hot.rules)
+
+def test_match_rules_prefers_most_specific_rule():
+    rules = {'openai.com', 'api.openai.com', 'example.com'}
+    observed = {'x.api.openai.com': 2, 'chat.openai.com': 3, 'openai.com': 1, 'unlisted.example': 4}
+    assert hot_set.match_rules(observed, rules.__contains__) == ({'api.openai.com', 'openai.com'}, 6)
+
+def test_read_log_continues_from_offset(tmp_path):
+    log = tmp_path / 'querylog.json'
+    log.write_text(log_lines(['a.example.com', 'b.example.com']), encoding='utf-8')
+    index = hot_set.QueryIndex()
+    assert index.read_log(str(log)) == 2
+
+    # 最后一行不完整时留到下次再读
+    with open(log, 'a', encoding='utf-8') as f:
+        line = log_lines(['c.example.com'])
+        f.write(line[:10])
+    assert index.read_log(str(log)) == 0
+    with open(log, 'a', encoding='utf-8') as f:
+        f.write(line[10:])
+    assert index.read_log(str(log)) == 1
+    assert index.observed(1) == {'a.example.com': 1, 'b.example.com': 1, 'c.example.com': 1}
+
+def test_rotated_log_is_read_from_start(tmp_path):
+    log = tmp_path / 'querylog.json'
+    log.write_text(log_lines(['a.example.com', 'b.example.com']), encoding='utf-8')
+    index_file = str(tmp_path / 'index.json')
+    hot_set.update_index([str(log)], index_file)
+
+    # 轮转：原文件改名为 .1（inode 不变，不会重复计数），新文件从头读取
+    os.rename(log, tmp_path / 'querylog.json.1')
+    log.write_text(log_lines(['c.example.com']), encoding='utf-8')
+    index = hot_set.update_index([str(tmp_path / 'querylog.json*')], index_file)
+    assert index.observed(1) == {'a.example.com': 1, 'b.example.com': 1, 'c.example.com': 1}
+
+    # 已读完的内容在重新加载索引后也不会重复计数
+    index = hot_set.update_index([str(tmp_path / 'querylog.json*')], index_file)
+    assert index.observed(1) == {'a.example.com': 1, 'b.example.com': 1, 'c.example.com': 1}
+
+def test_truncated_log_is_read_from_start(tmp_path):
+    log = tmp_path / 'querylog.json'
+    log.write_text(log_lines(['a.example.com', 'b.example.com', 'c.example.com']), encoding='utf-8')
+    index_file = str(tmp_path / 'index.json')
+    hot_set.update_index([str(log)], index_file)
+    inode = os.stat(log).st_ino
+
+    with open(log, 'w', encoding='utf-8') as f:
+        f.write(log_lines(['d.example.com']))
+    assert os.stat(log).st_ino == inode
+    index = hot_set.update_index([str(log)], index_file)
+    assert index.observed(1) == {'a.example.com': 1, 'b.example.com': 1, 'c.example.com': 1, 'd.example.com': 1}
+
+def test_window_uses_latest_logged_day(tmp_path):
+    log = tmp_path / 'querylog.json'
+    log.write_text(log_lines(['old.example.com'], day=1) + log_lines(['new.example.com'], day=14), encoding='utf-8')
+    assert hot_set.load_observed([str(log)], window_days=7) == {'new.example.com': 1}
+    assert hot_set.load_observed([str(log)], window_days=14) == {'old.example.com': 1, 'new.example.com': 1}
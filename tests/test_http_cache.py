@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import extract_domains
+import http_cache
+from http_cache import HttpCache
+
+BODY = b"a.example.com\nb.example.com\n"
+ETAG = '"v1"'
+LAST_MODIFIED = 'Wed, 01 Jan 2025 00:00:00 GMT'
+
+class ConditionalHandler(BaseHTTPRequestHandler):
+    """返回带 ETag/Last-Modified 的固定内容，校验信息一致时返回 304；server.requests 记录每次请求的条件头"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        conditions = (self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since'))
+        self.server.requests.append(conditions)
+        if conditions == (ETAG, LAST_MODIFIED):
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+@pytest.fixture
+def url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ConditionalHandler)
+    server.daemon_threads = True
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/list.txt", server.requests
+    server.shutdown()
+    server.server_close()
+
+def test_download_reuses_cached_body_on_304(url, tmp_path):
+    url, requests = url
+    cache = HttpCache(str(tmp_path))
+    assert extract_domains.download_file(url, cache=cache) == BODY.decode()
+    assert cache.lookup(url)['etag'] == ETAG
+
+    assert extract_domains.download_file(url, cache=cache) == BODY.decode()
+    assert requests == [(None, None), (ETAG, LAST_MODIFIED)]
+
+def test_stream_reuses_cached_body_on_304(url, tmp_path):
+    url, requests = url
+    cache = HttpCache(str(tmp_path))
+    with extract_domains.SourceStream(url, cache=cache) as stream:
+        assert b''.join(stream) == BODY
+    with extract_domains.SourceStream(url, cache=cache) as stream:
+        assert b''.join(stream) == BODY
+        assert stream.from_cache
+    assert requests == [(None, None), (ETAG, LAST_MODIFIED)]
+
+def test_download_without_cache_is_unconditional(url):
+    url, requests = url
+    extract_domains.download_file(url)
+    extract_domains.download_file(url)
+    assert requests == [(None, None), (None, None)]
+
+def test_evicts_least_recently_used_first(tmp_path, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(http_cache, 'time', types.SimpleNamespace(time=lambda: next(clock)))
+    cache = HttpCache(str(tmp_path), max_bytes=25)
+    cache.store('https://example.com/a', b'a' * 10)
+    cache.store('https://example.com/b', b'b' * 10)
+    # a 比 b 更早写入，但最近被使用过
+    assert cache.load('https://example.com/a') == b'a' * 10
+    cache.store('https://example.com/c', b'c' * 10)
+
+    assert cache.lookup('https://example.com/b') is None
+    assert cache.load('https://example.com/a') == b'a' * 10
+    assert cache.load('https://example.com/c') == b'c' * 10
+
+def test_body_larger_than_limit_is_not_cached(tmp_path):
+    cache = HttpCache(str(tmp_path), max_bytes=4)
+    cache.store('https://example.com/a', b'a' * 10)
+    assert cache.lookup('https://example.com/a') is None
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+import artifact_writer
+import lookup_domain
+from domain_index import BLACKLIST, WHITELIST
+
+def test_index_table_does_not_load_rules(tmp_path, routing_inputs):
+    artifact_writer.write_artifacts(str(tmp_path), compression=(), **routing_inputs)
+    table = lookup_domain.load_routing_table(str(tmp_path), WHITELIST)
+    assert isinstance(table, lookup_domain.IndexRoutingTable)
+    config_table = lookup_domain.load_routing_table(str(tmp_path), WHITELIST, 'config')
+    try:
+        for name in ('www.baidu.com', 'api.openai.com', 'unlisted.invalid'):
+            assert table.route(name)[1] == config_table.route(name)[1]
+        assert table.route('x.api.openai.com') == ('api.openai.com', 'https://8.8.8.8/dns-query')
+    finally:
+        table.close()
+
+def test_main_reads_index(tmp_path, routing_inputs, capsys):
+    artifact_writer.write_artifacts(str(tmp_path), compression=(), **routing_inputs)
+    lookup_domain.main(['--dist', str(tmp_path), '--mode', BLACKLIST, 'x.github.com', 'unlisted.invalid'])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines == ['x.github.com\thttps://101.101.101.101/dns-query\tgithub.com',
+                     f"unlisted.invalid\t{' '.join(routing_inputs['cn_dns'])}\t-"]
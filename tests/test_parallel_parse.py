@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import extract_domains
+import generate_config
+import parallel_parse
+from conftest import PARSER_FIXTURES
+
+def fixture_contents():
+    contents = {}
+    for name in sorted(os.listdir(PARSER_FIXTURES)):
+        with open(os.path.join(PARSER_FIXTURES, name), 'r', encoding='utf-8') as f:
+            contents[f"https://example.com/{name}"] = f.read()
+    return contents
+
+def test_parse_sources_matches_sequential():
+    contents = fixture_contents()
+    sources = generate_config.normalize_sources(list(contents))
+    parsed = generate_config.parse_sources({'sources': sources}, contents, workers=2)
+    for url, content in contents.items():
+        assert set(parsed[url]) == extract_domains.extract_domains_from_file(content, url), url
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_chunked_parse_matches_sequential(workers):
+    contents = fixture_contents()
+    tasks = [(url, content, None) for url, content in contents.items()]
+    # 用很小的块强制把逐行格式切成多块
+    results = parallel_parse.parse_contents(tasks, workers, min_chunk_bytes=4096)
+    for url, content in contents.items():
+        assert results[url][0] == extract_domains.extract_domains_from_file(content, url), url
+
+def test_split_lines_keeps_content_and_line_boundaries():
+    content = ''.join(f"server=/d{i}.example.com/114.114.114.114\n" for i in range(2000))
+    chunks = parallel_parse.split_lines(content, 4, min_bytes=1000)
+    assert len(chunks) == 4
+    assert ''.join(chunks) == content
+    assert all(chunk.endswith('\n') for chunk in chunks)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import extract_domains
+import generate_config
+from parse_cache import ParseCache, content_hash
+
+URL = 'https://example.com/list.txt'
+CONTENT = 'a.example.com\nb.example.com\n'
+DOMAINS = {'a.example.com', 'b.example.com'}
+
+@pytest.fixture
+def parses(monkeypatch):
+    """记录真正执行解析的次数"""
+    calls = []
+    parse = extract_domains.extract_domains_from_file
+
+    def counting_parse(content, file_url, fmt=None):
+        calls.append(file_url)
+        return parse(content, file_url, fmt)
+
+    monkeypatch.setattr(extract_domains, 'extract_domains_from_file', counting_parse)
+    return calls
+
+def test_unchanged_content_skips_parsing(tmp_path, parses):
+    cache = ParseCache(str(tmp_path))
+    assert generate_config.extract_source_domains(URL, CONTENT, cache) == DOMAINS
+    assert generate_config.extract_source_domains(URL, CONTENT, cache) == DOMAINS
+    assert parses == [URL]
+
+    assert generate_config.extract_source_domains(URL, CONTENT + 'c.example.com\n', cache) == DOMAINS | {'c.example.com'}
+    assert parses == [URL, URL]
+
+def test_parser_version_bump_invalidates(tmp_path, parses, monkeypatch):
+    cache = ParseCache(str(tmp_path))
+    generate_config.extract_source_domains(URL, CONTENT, cache)
+    monkeypatch.setattr(extract_domains, 'PARSER_VERSION', extract_domains.PARSER_VERSION + '-next')
+    assert generate_config.extract_source_domains(URL, CONTENT, cache) == DOMAINS
+    assert parses == [URL, URL]
+
+def test_configured_format_is_part_of_the_key(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    cache.put(URL, content_hash(CONTENT), generate_config.parser_key(), DOMAINS)
+    assert cache.get(URL, content_hash(CONTENT), generate_config.parser_key()) == DOMAINS
+    assert cache.get(URL, content_hash(CONTENT), generate_config.parser_key('plain')) is None
+
+@pytest.mark.parametrize('damage', [
+    lambda data: data[:-5],
+    lambda data: data[:data.index(b'\n') + 1] + b'not zlib',
+    lambda data: b'{"url": ',
+])
+def test_corrupt_entry_is_a_miss(tmp_path, parses, damage):
+    cache = ParseCache(str(tmp_path))
+    cache.put(URL, content_hash(CONTENT), generate_config.parser_key(), DOMAINS)
+    path = cache._path(URL)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(damage(data))
+
+    assert cache.get(URL, content_hash(CONTENT), generate_config.parser_key()) is None
+    assert cache.last_known_good(URL) is None
+    assert generate_config.extract_source_domains(URL, CONTENT, cache) == DOMAINS
+    assert parses == [URL]
+    # 重新解析后写回了完好的缓存
+    assert cache.get(URL, content_hash(CONTENT), generate_config.parser_key()) == DOMAINS
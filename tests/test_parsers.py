@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""
+解析器的期望输出测试
+tests/expected/parsers/<夹具>.txt 是 benchmarks/fixtures/parsers 中各夹具应提取出的域名（排序后每行一个），
+解析规则变化时需要同时更新期望文件，使新增和删除的域名出现在 diff 中：
+    python tests/test_parsers.py --update
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from conftest import PARSER_FIXTURES
+import extract_domains
+
+EXPECTED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'expected', 'parsers')
+FIXTURE_NAMES = sorted(os.listdir(PARSER_FIXTURES))
+
+def parse_fixture(name: str):
+    with open(os.path.join(PARSER_FIXTURES, name), 'r', encoding='utf-8') as f:
+        return extract_domains.extract_domains_from_file(f.read(), f"https://example.com/{name}")
+
+def read_expected(name: str):
+    with open(os.path.join(EXPECTED_DIR, f"{name}.txt"), 'r', encoding='utf-8') as f:
+        return set(line.strip() for line in f if line.strip())
+
+@pytest.mark.parametrize('name', FIXTURE_NAMES)
+def test_fixture_expected_output(name):
+    domains = parse_fixture(name)
+    expected = read_expected(name)
+    assert not domains - expected, f"新增了期望之外的域名: {sorted(domains - expected)[:10]}"
+    assert not expected - domains, f"缺少期望的域名: {sorted(expected - domains)[:10]}"
+
+@pytest.mark.parametrize('line, expected', [
+    # Clash 规则，允许后跟策略
+    ("  - DOMAIN-SUFFIX,example.com", ('rule', 'example.com')),
+    ("  - 'DOMAIN,www.example.com'", ('rule', 'www.example.com')),
+    ("DOMAIN-SUFFIX,example.com,Proxy", ('rule', 'example.com')),
+    ("server=/example.com/114.114.114.114", ('dnsmasq', 'example.com')),
+    # blackmatrix7 的 +.example.com 和 .example.com，不保留前缀
+    ("  - '+.example.com'", ('domain', 'example.com')),
+    (".example.com", ('domain', 'example.com')),
+    # GFWList/AdBlock 规则，^ 可以省略
+    ("||example.com^", ('adblock', 'example.com')),
+    ("||example.com", ('adblock', 'example.com')),
+    ("||example.com/path", ('adblock', 'example.com')),
+    ("@@||example.com^", ('exception', '')),
+    # 行尾注释
+    ("example.com  # comment", ('domain', 'example.com')),
+    ("|http://example.com/path", ('url', 'example.com')),
+    # 注释、IPv4 和无法识别的行
+    ("# example.com", None),
+    ("! Homepage: https://example.invalid", None),
+    ("[Adblock Plus 2.0]", None),
+    ("1.2.3.4", None),
+    ("payload:", None),
+])
+def test_classify_line(line, expected):
+    assert extract_domains.classify_line(line) == expected
+
+@pytest.mark.parametrize('domain, valid', [
+    ("example.com", True),
+    ("a-b.example.com", True),
+    (".example.com", False),
+    ("example", False),
+    ("1.2.3.4", False),
+])
+def test_is_valid_domain(domain, valid):
+    assert extract_domains.is_valid_domain(domain) is valid
+
+def test_read_custom_domains_strips_leading_dot(tmp_path):
+    path = tmp_path / 'custom.txt'
+    path.write_text("# 注释\n.example.com\nexample.org\ncn\n", encoding='utf-8')
+    assert extract_domains.read_custom_domains(str(path)) == {'example.com', 'example.org', 'cn'}
+
+def update_expected() -> None:
+    os.makedirs(EXPECTED_DIR, exist_ok=True)
+    for name in FIXTURE_NAMES:
+        domains = parse_fixture(name)
+        with open(os.path.join(EXPECTED_DIR, f"{name}.txt"), 'w', encoding='utf-8') as f:
+            f.write(''.join(f"{domain}\n" for domain in sorted(domains)))
+        print(f"{name}: {len(domains)} 个域名")
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ['--update']:
+        sys.exit("用法: python tests/test_parsers.py --update")
+    update_expected()
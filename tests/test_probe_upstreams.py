@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import socketserver
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import probe_upstreams
+from probe_upstreams import DOH, TCP, UDP, ProbeError, ProbeResult
+
+DOMAINS = ['example.com', 'example.org']
+
+def answer(query: bytes, server) -> bytes:
+    """按模拟上游的设置构造响应（无应答记录）；silent 时不应答，返回 b''"""
+    time.sleep(server.delay)
+    if server.silent:
+        return b''
+    query_id, flags = struct.unpack_from('!HH', query)
+    return struct.pack('!HHHHHH', query_id, 0x8000 | (flags & 0x0100) | 0x0080 | server.rcode, 1, 0, 0, 0) + query[12:]
+
+class UdpHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        response = answer(data, self.server)
+        if response:
+            sock.sendto(response, self.client_address)
+
+class TcpHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            header = self.rfile.read(2)
+            if len(header) < 2:
+                return
+            response = answer(self.rfile.read(struct.unpack('!H', header)[0]), self.server)
+            if not response:
+                return
+            self.wfile.write(struct.pack('!H', len(response)) + response)
+
+class DohHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        response = answer(self.rfile.read(int(self.headers['Content-Length'])), self.server)
+        self.send_response(200 if response else 502)
+        self.send_header('Content-Type', 'application/dns-message')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+class ThreadingUdpServer(socketserver.ThreadingMixIn, socketserver.UDPServer):
+    daemon_threads = True
+
+class ThreadingTcpServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+
+@pytest.fixture
+def stand_in():
+    """启动本机模拟上游，返回 start(协议, delay=秒, rcode=返回码, silent=是否不应答) -> 上游地址"""
+    servers = []
+
+    def start(kind, delay=0.0, rcode=0, silent=False):
+        if kind == DOH:
+            server = ThreadingHTTPServer(('127.0.0.1', 0), DohHandler)
+            server.daemon_threads = True
+        elif kind == TCP:
+            server = ThreadingTcpServer(('127.0.0.1', 0), TcpHandler)
+        else:
+            server = ThreadingUdpServer(('127.0.0.1', 0), UdpHandler)
+        server.delay, server.rcode, server.silent = delay, rcode, silent
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        port = server.server_address[1]
+        return {DOH: f"http://127.0.0.1:{port}/dns-query", TCP: f"tcp://127.0.0.1:{port}", UDP: f"127.0.0.1:{port}"}[kind]
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.mark.parametrize('kind', [UDP, TCP, DOH])
+def test_probe_healthy_upstream(stand_in, kind):
+    result = probe_upstreams.probe_upstream(stand_in(kind), DOMAINS, queries=6, concurrency=2, timeout=1.0)
+    assert (result.kind, result.queries, result.errors, result.error) == (kind, 6, 0, None)
+    assert 0 < result.p50_ms <= result.p95_ms
+
+@pytest.mark.parametrize('kind, options, error', [
+    (UDP, dict(silent=True), 'timed out'),
+    (TCP, dict(silent=True), '连接被关闭'),
+    (DOH, dict(silent=True), 'HTTP 502'),
+    (UDP, dict(rcode=2), '返回码 2'),
+], ids=['udp-timeout', 'tcp-closed', 'doh-502', 'udp-servfail'])
+def test_probe_failing_upstream(stand_in, kind, options, error):
+    result = probe_upstreams.probe_upstream(stand_in(kind, **options), DOMAINS, queries=4, concurrency=2, timeout=0.2)
+    assert (result.queries, result.errors, result.p50_ms) == (4, 4, None)
+    assert error in result.error
+
+def test_healthy_upstreams_ranked_first_and_dead_pruned(stand_in):
+    dead = stand_in(UDP, silent=True)
+    slow = stand_in(UDP, delay=0.15)
+    servfail = stand_in(UDP, rcode=2)
+    healthy = [stand_in(TCP), stand_in(DOH), stand_in(UDP)]
+    upstreams = [dead, slow, servfail] + healthy + ['tls://dns.example']
+
+    results = probe_upstreams.probe_upstreams(upstreams, DOMAINS, queries=4, concurrency=2, timeout=0.5)
+    assert [result.upstream for result in results] == upstreams
+    # 本机上游的延迟都落在第一个 100 ms 的桶内，桶内保持原顺序；不支持探测的上游排在可用上游之后
+    assert probe_upstreams.rank_upstreams(results, bucket_ms=100) == healthy + [slow, 'tls://dns.example']
+    assert probe_upstreams.rank_upstreams(results, bucket_ms=100, prune=False) == \
+        healthy + [slow, 'tls://dns.example', dead, servfail]
+
+def result(upstream, p50_ms, errors=0, queries=10, kind=UDP):
+    return ProbeResult(upstream, kind, queries, errors, p50_ms, p50_ms, None)
+
+def test_rank_buckets_keep_configured_order():
+    results = [result('a', 35.0), result('b', 21.0), result('c', 4.0), result('d', 19.9)]
+    assert probe_upstreams.rank_upstreams(results, bucket_ms=20) == ['c', 'd', 'a', 'b']
+    assert probe_upstreams.rank_upstreams(results, bucket_ms=1) == ['c', 'd', 'b', 'a']
+    assert probe_upstreams.rank_upstreams(results, bucket_ms=1000) == ['a', 'b', 'c', 'd']
+
+def test_rank_prunes_by_max_error_rate():
+    results = [result('flaky', 1.0, errors=6), result('ok', 50.0, errors=2), result('down', None, errors=10)]
+    assert probe_upstreams.rank_upstreams(results, max_error_rate=0.5) == ['ok']
+    assert probe_upstreams.rank_upstreams(results, max_error_rate=0.7) == ['flaky', 'ok']
+    # 全部不可用时保留原列表
+    assert probe_upstreams.rank_upstreams(results, max_error_rate=0.1) == ['flaky', 'ok', 'down']
+
+def test_percentile():
+    values = [float(value) for value in range(20, 0, -1)]
+    assert probe_upstreams.percentile(values, 50) == 10.0
+    assert probe_upstreams.percentile(values, 95) == 19.0
+    assert probe_upstreams.percentile([7.0], 95) == 7.0
+    assert probe_upstreams.percentile([], 50) is None
+
+def test_check_response():
+    query = probe_upstreams.build_query('example.com', 0x1234)
+    response = struct.pack('!HH', 0x1234, 0x8180) + query[4:]
+    probe_upstreams.check_response(response, 0x1234)
+    # NXDOMAIN 也说明上游可用
+    probe_upstreams.check_response(struct.pack('!HH', 0x1234, 0x8183) + query[4:], 0x1234)
+    with pytest.raises(ProbeError, match='不匹配'):
+        probe_upstreams.check_response(response, 0x4321)
+    with pytest.raises(ProbeError, match='不匹配'):
+        probe_upstreams.check_response(query, 0x1234)
+    with pytest.raises(ProbeError, match='返回码 2'):
+        probe_upstreams.check_response(struct.pack('!HH', 0x1234, 0x8182) + query[4:], 0x1234)
+    with pytest.raises(ProbeError, match='过短'):
+        probe_upstreams.check_response(response[:6], 0x1234)
+
+@pytest.mark.parametrize('upstream, parsed', [
+    ('https://dns.example/dns-query', (DOH, 'https://dns.example/dns-query')),
+    ('8.8.8.8', (UDP, ('8.8.8.8', 53))),
+    ('udp://127.0.0.1:5353', (UDP, ('127.0.0.1', 5353))),
+    ('tcp://[2001:db8::1]:53', (TCP, ('2001:db8::1', 53))),
+    ('2001:db8::1', (UDP, ('2001:db8::1', 53))),
+    ('tls://dns.example', (None, None)),
+])
+def test_parse_upstream(upstream, parsed):
+    assert probe_upstreams.parse_upstream(upstream) == parsed
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import publish_upstreams
+from domain_index import WHITELIST
+from lookup_domain import MODE_FILES
+
+class SlowAdGuardHandler(BaseHTTPRequestHandler):
+    """模拟 AdGuard Home，server.delays 中的延迟依次用于之后的请求"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, body: bytes = b'') -> None:
+        with self.server.lock:
+            delay = self.server.delays.pop(0) if self.server.delays else 0
+        time.sleep(delay)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply(json.dumps({'upstream_dns': self.server.upstream_dns}).encode())
+
+    def do_POST(self):
+        self.server.upstream_dns = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['upstream_dns']
+        self._reply()
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowAdGuardHandler)
+    server.daemon_threads = True
+    server.delays = []
+    server.upstream_dns = ['https://dns10.quad9.net/dns-query']
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / MODE_FILES[WHITELIST]).write_text("# 注释\n1.1.1.1\n[/example.cn/]223.5.5.5\n", encoding='utf-8')
+    return tmp_path
+
+def test_publish_recovers_after_timeout(server, dist):
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    publisher = publish_upstreams.Publisher([{"url": url, "mode": WHITELIST}], timeout=0.2)
+    try:
+        server.delays = [1.0]
+        first = publisher.publish(str(dist))
+        assert first[0].status == publish_upstreams.FAILED
+        assert 'timed out' in first[0].error
+
+        second = publisher.publish(str(dist))
+        assert second[0].status == publish_upstreams.UPDATED, second[0].error
+        assert server.upstream_dns == ['1.1.1.1', '[/example.cn/]223.5.5.5']
+        assert publisher.publish(str(dist))[0].status == publish_upstreams.UNCHANGED
+    finally:
+        publisher.close()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import extract_domains
+import generate_config
+import refresh_daemon
+from run_metrics import DISABLED
+
+CN_URL = 'https://example.com/cn.txt'
+FOREIGN_URL = 'https://example.com/foreign.txt'
+CN_CONTENT = 'baidu.com\nqq.com\n'
+FOREIGN_CONTENT = 'google.com\nyoutube.com\n'
+ERROR_PAGE = '<html><body>502 Bad Gateway</body></html>\n'
+
+class Responses(dict):
+    """代替网络下载：url -> 内容，缺少或为 None 的 url 视为下载失败；downloads 记录每轮请求的 url"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.downloads = []
+
+    def download_files(self, sources, workers=extract_domains.DEFAULT_WORKERS, cache=None, metrics=DISABLED):
+        urls = [url for url, _ in sources]
+        self.downloads.append(urls)
+        return {url: self.get(url) or "" for url in urls}
+
+@pytest.fixture
+def responses(monkeypatch):
+    responses = Responses({CN_URL: CN_CONTENT, FOREIGN_URL: FOREIGN_CONTENT})
+    monkeypatch.setattr(extract_domains, 'download_files', responses.download_files)
+    return responses
+
+@pytest.fixture
+def parses(monkeypatch):
+    """记录重新解析的源"""
+    calls = []
+    extract_source_domains = generate_config.extract_source_domains
+
+    def counting_extract(url, content, *args, **kwargs):
+        calls.append(url)
+        return extract_source_domains(url, content, *args, **kwargs)
+
+    monkeypatch.setattr(generate_config, 'extract_source_domains', counting_extract)
+    return calls
+
+def make_daemon(tmp_path, monkeypatch, cache=True):
+    monkeypatch.chdir(tmp_path)
+    config = {
+        'cache': {'enabled': cache, 'dir': str(tmp_path / '.cache')},
+        'sources': {'cn_domains': [{'url': CN_URL, 'interval': '30m'}], 'foreign_domains': [FOREIGN_URL]},
+        'daemon': {'interval': '2h', 'jitter': 0.1},
+        'output': {'compression': []},
+    }
+    return refresh_daemon.RefreshDaemon(config, refresh_daemon.parse_args([]), str(tmp_path / 'dist'))
+
+def manifest_path(daemon):
+    return os.path.join(daemon.output_dir, 'manifest.json')
+
+@pytest.mark.parametrize('value, seconds', [(90, 90.0), ('45s', 45.0), ('30m', 1800.0), ('6h', 21600.0), ('1d', 86400.0)])
+def test_parse_interval(value, seconds):
+    assert refresh_daemon.parse_interval(value) == seconds
+
+@pytest.mark.parametrize('value', ['0', '-1m', 'soon'])
+def test_parse_interval_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        refresh_daemon.parse_interval(value)
+
+def test_per_source_intervals_with_jitter(tmp_path, monkeypatch, responses):
+    daemon = make_daemon(tmp_path, monkeypatch)
+    cn, foreign = daemon.sources[CN_URL], daemon.sources[FOREIGN_URL]
+    assert (cn.interval, foreign.interval) == (1800.0, 7200.0)
+
+    daemon.run(once=True)
+    assert responses.downloads == [[CN_URL, FOREIGN_URL]]
+    assert os.path.exists(manifest_path(daemon))
+    for _ in range(100):
+        daemon._schedule(cn, 1000.0)
+        assert 1000.0 + 1800 * 0.9 <= cn.next_due <= 1000.0 + 1800 * 1.1
+    due = set()
+    for _ in range(20):
+        daemon._schedule(foreign, 0.0)
+        due.add(foreign.next_due)
+    assert len(due) > 1
+
+def test_only_changed_sources_are_reparsed(tmp_path, monkeypatch, responses, parses):
+    daemon = make_daemon(tmp_path, monkeypatch)
+    states = list(daemon.sources.values())
+    assert daemon.refresh(states, DISABLED)
+    assert sorted(parses) == [CN_URL, FOREIGN_URL]
+
+    assert not daemon.refresh(states, DISABLED)
+    assert sorted(parses) == [CN_URL, FOREIGN_URL]
+
+    responses[CN_URL] = CN_CONTENT + 'taobao.com\n'
+    assert daemon.refresh(states, DISABLED)
+    assert sorted(parses) == [CN_URL, CN_URL, FOREIGN_URL]
+    assert set(daemon.sources[CN_URL].domains) == {'baidu.com', 'qq.com', 'taobao.com'}
+
+@pytest.mark.parametrize('failure', [None, ERROR_PAGE], ids=['download', 'empty-parse'])
+def test_failed_source_keeps_previous_domains(tmp_path, monkeypatch, responses, failure):
+    daemon = make_daemon(tmp_path, monkeypatch)
+    states = list(daemon.sources.values())
+    daemon.refresh(states, DISABLED)
+    previous = daemon.sources[CN_URL].domains
+
+    if failure is None:
+        del responses[CN_URL]
+    else:
+        responses[CN_URL] = failure
+    assert not daemon.refresh(states, DISABLED)
+    assert daemon.sources[CN_URL].domains == previous
+
+@pytest.mark.parametrize('cache', [False, True])
+@pytest.mark.parametrize('failure', [None, ERROR_PAGE], ids=['download', 'empty-parse'])
+def test_first_failure_without_previous_result_is_not_a_change(tmp_path, monkeypatch, responses, failure, cache):
+    daemon = make_daemon(tmp_path, monkeypatch, cache)
+    responses[CN_URL] = responses[FOREIGN_URL] = failure
+    assert not daemon.refresh(list(daemon.sources.values()), DISABLED)
+    assert all(state.domains is None for state in daemon.sources.values())
+
+    daemon.run_cycle(list(daemon.sources.values()), False)
+    assert not os.path.exists(manifest_path(daemon))
+
+    # 之后恢复正常时照常解析和生成
+    responses[CN_URL], responses[FOREIGN_URL] = CN_CONTENT, FOREIGN_CONTENT
+    daemon.run_cycle(list(daemon.sources.values()), False)
+    assert os.path.exists(manifest_path(daemon))
+
+def test_first_empty_parse_uses_last_known_good(tmp_path, monkeypatch, responses):
+    daemon = make_daemon(tmp_path, monkeypatch)
+    daemon.refresh(list(daemon.sources.values()), DISABLED)
+
+    # 重启后第一次下载到的是错误页面
+    restarted = make_daemon(tmp_path, monkeypatch)
+    responses[CN_URL] = ERROR_PAGE
+    assert restarted.refresh(list(restarted.sources.values()), DISABLED)
+    assert set(restarted.sources[CN_URL].domains) == {'baidu.com', 'qq.com'}
+
+def test_run_cycle_survives_build_failure(tmp_path, monkeypatch, responses):
+    daemon = make_daemon(tmp_path, monkeypatch)
+    build_outputs = generate_config.build_outputs
+
+    def failing_build_outputs(*args, **kwargs):
+        raise RuntimeError("磁盘已满")
+
+    monkeypatch.setattr(generate_config, 'build_outputs', failing_build_outputs)
+    daemon.run_cycle(list(daemon.sources.values()), False)
+    assert daemon._rebuild_pending
+    assert not os.path.exists(manifest_path(daemon))
+
+    # 没有源到期时，下一次唤醒也会重新生成
+    monkeypatch.setattr(generate_config, 'build_outputs', build_outputs)
+    daemon.run_cycle([], False)
+    assert not daemon._rebuild_pending
+    assert os.path.exists(manifest_path(daemon))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import artifact_writer
+import upstream_format
+
+def read_lines(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().splitlines()
+
+def test_grouped_output_routes_like_flat_output(tmp_path, routing_inputs):
+    flat_dir, grouped_dir = tmp_path / 'flat', tmp_path / 'grouped'
+    artifact_writer.write_artifacts(str(flat_dir), compression=(), **routing_inputs)
+    manifest = artifact_writer.write_artifacts(str(grouped_dir), grouped=True, max_line_length=512, compression=(),
+                                               **routing_inputs)
+    for name in ('whitelist_mode.txt', 'blacklist_mode.txt'):
+        assert manifest['files'][name]['grouped']
+        flat, grouped = read_lines(flat_dir / name), read_lines(grouped_dir / name)
+        assert len(grouped) < len(flat)
+        assert all(len(line) <= 512 for line in grouped)
+        assert upstream_format.same_rule_sequence(flat, grouped)
+        assert upstream_format.routes_equivalent(flat, grouped)
+
+def test_reordered_rules_are_still_equivalent():
+    flat = ['1.1.1.1', '[/a.com/]dns1', '[/b.com/]dns2', '[/c.com/]dns1']
+    grouped = ['1.1.1.1', '[/a.com/c.com/]dns1', '[/b.com/]dns2']
+    assert not upstream_format.same_rule_sequence(flat, grouped)
+    assert upstream_format.routes_equivalent(flat, grouped)
+
+def test_changed_upstream_is_not_equivalent():
+    flat = ['1.1.1.1', '[/a.com/]dns1', '[/b.com/]dns2']
+    assert not upstream_format.routes_equivalent(flat, ['1.1.1.1', '[/a.com/b.com/]dns1'])
+    assert not upstream_format.routes_equivalent(flat, ['8.8.8.8', '[/a.com/]dns1', '[/b.com/]dns2'])
+
+def test_format_grouped_rules_splits_long_lines():
+    domains = [f"d{i}.example.com" for i in range(100)]
+    lines = list(upstream_format.format_grouped_rules(domains, 'dns1', max_line_length=100))
+    assert all(len(line) <= 100 for line in lines)
+    assert [domain for domain, _ in upstream_format.iter_upstream_config(lines)] == domains
+
+def test_write_artifacts_checks_routes_when_sequence_differs(tmp_path, routing_inputs, monkeypatch):
+    monkeypatch.setattr(upstream_format, 'same_rule_sequence', lambda expected, actual: False)
+    manifest = artifact_writer.write_artifacts(str(tmp_path), grouped=True, compression=(), **routing_inputs)
+    assert manifest['files']['whitelist_mode.txt']['grouped']
+
+    monkeypatch.setattr(upstream_format, 'routes_equivalent', lambda expected, actual: False)
+    manifest = artifact_writer.write_artifacts(str(tmp_path), grouped=True, compression=(), **routing_inputs)
+    assert not manifest['files']['whitelist_mode.txt']['grouped']
+    flat_dir = tmp_path / 'flat'
+    artifact_writer.write_artifacts(str(flat_dir), compression=(), **routing_inputs)
+    assert read_lines(tmp_path / 'whitelist_mode.txt') == read_lines(flat_dir / 'whitelist_mode.txt')
+
+def test_grouped_output_builds_each_config_once(tmp_path, routing_inputs, monkeypatch):
+    calls = []
+    iter_mode_config = artifact_writer.iter_mode_config
+
+    def counting_iter_mode_config(**kwargs):
+        calls.append((kwargs['text'], kwargs.get('grouped', False)))
+        return iter_mode_config(**kwargs)
+
+    monkeypatch.setattr(artifact_writer, 'iter_mode_config', counting_iter_mode_config)
+    artifact_writer.write_artifacts(str(tmp_path), grouped=True, compression=(), **routing_inputs)
+    # 每个模式的逐域名配置和分组配置各生成一次
+    assert len(calls) == len(set(calls)) == 4